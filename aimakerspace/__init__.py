@@ -1,14 +1,47 @@
-from .text_utils import TextFileLoader, CharacterTextSplitter, PDFLoader
-from .vectordatabase import VectorDatabase
+from .text_utils import (
+    TextFileLoader,
+    CharacterTextSplitter,
+    RecursiveTokenTextSplitter,
+    PDFLoader,
+    shutdown_process_pool,
+)
+from .vectordatabase import VectorDatabase, MetadataFilter
+from .ann import IVFIndex, recall_at_k, sweep_nprobe, tune_nprobe
+from .quantization import ScalarQuantizer, ProductQuantizer, quantizer_from_name
 from .openai_utils.embedding import EmbeddingModel
+from .openai_utils.embedding_batcher import EmbeddingBatcher
+from .openai_utils.embedding_cache import (
+    EmbeddingCache,
+    LRUEmbeddingCache,
+    SQLiteEmbeddingCache,
+    TieredEmbeddingCache,
+    embedding_cache_from_env,
+)
 from .openai_utils.chatmodel import ChatOpenAI
+from .openai_utils.clients import get_async_client, get_sync_client, aclose_clients
 from .websearch import TavilySearch
+from .query_cache import QueryExpansionCache, query_expansion_cache_from_env
+from .response_cache import RetrievedContext, SemanticResponseCache
+from .registry import PipelineRegistry
+from .chunk_store import ChunkStore, chunk_key
+from .lexical_index import BM25Index
+from .metrics import PipelineMetrics, metrics_from_env, tenant_label
+from .structured_logging import configure_logging, get_logger, shutdown_logging
 
 # RAG Pipeline
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
 import asyncio
-from openai import OpenAI, AsyncOpenAI
+import hashlib
+import os
+import time
+from openai import AsyncOpenAI
+
+log = get_logger("aimakerspace.pipeline")
+
+# Fixed footprint of an empty pipeline (objects, locks, empty indexes and
+# caches), measured with tracemalloc at ~7.5 KB and rounded up
+_PIPELINE_BASE_BYTES = 8 * 1024
 
 # Optional LangSmith tracing; if unavailable, provide a no-op decorator
 try:
@@ -27,120 +60,528 @@ class RAGPipeline:
     Retrieval-Augmented Generation pipeline for PDF documents
     """
     
-    def __init__(self, api_key: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(
+        self,
+        api_key: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        vector_index: Optional[IVFIndex] = None,
+        vector_quantizer=None,
+        rerank: int = 0,
+        expansion_cache: Optional[QueryExpansionCache] = None,
+        response_cache: Optional[SemanticResponseCache] = None,
+        lexical_index: Optional[BM25Index] = None,
+        text_splitter=None,
+        metrics: Optional[PipelineMetrics] = None,
+    ):
         """
         Initialize RAG pipeline
         
         :param api_key: OpenAI API key
         :param chunk_size: Size of text chunks for processing
         :param chunk_overlap: Overlap between chunks
+        :param embedding_cache: Embedding cache (defaults to the process-wide
+            cache sized by EMBEDDING_CACHE_MB, backed by SQLite when
+            EMBEDDING_CACHE_PATH is set)
+        :param vector_index: Optional ANN index; exact search when None
+        :param vector_quantizer: Optional ScalarQuantizer/ProductQuantizer to
+            store compact codes instead of float32 vectors
+        :param rerank: Quantized candidates re-scored exactly (keeps float32
+            originals alongside the codes when > 0)
+        :param expansion_cache: Cache for query reformulations (defaults to the
+            process-wide cache configured by QUERY_EXPANSION_CACHE_*)
+        :param response_cache: Semantic cache for generated answers; cleared
+            whenever the corpus changes
+        :param lexical_index: BM25 index over chunk text, fused with vector
+            rankings in ``rag_fusion``
+        :param text_splitter: Chunker exposing ``iter_spans`` (e.g. a
+            RecursiveTokenTextSplitter); defaults to fixed-size character
+            chunks of ``chunk_size``/``chunk_overlap``
+        :param metrics: Stage timings and usage histograms (defaults to the
+            process-wide instance, enabled by RAG_METRICS=1)
         """
         self.api_key = api_key
         
-        # Initialize embedding model with API key
-        self.embedding_model = EmbeddingModel(api_key=api_key)
+        # Initialize embedding model with API key; repeated texts hit the cache
+        self.embedding_model = EmbeddingModel(
+            api_key=api_key,
+            cache=embedding_cache if embedding_cache is not None else embedding_cache_from_env(),
+        )
         
-        self.vector_db = VectorDatabase(embedding_model=self.embedding_model)
-        self.text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.vector_db = VectorDatabase(
+            embedding_model=self.embedding_model,
+            index=vector_index,
+            quantizer=vector_quantizer,
+            keep_originals=rerank > 0,
+            rerank=rerank,
+            # k-means for PQ / IVF runs on a worker thread (see _schedule_training)
+            auto_train=False,
+        )
+        self._training_task: Optional[asyncio.Task] = None
+        self.text_splitter = text_splitter or CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         self.pdf_loader = PDFLoader()
         self.web_search = TavilySearch()
         
         # Initialize chat model with API key
         self.chat_model = ChatOpenAI(api_key=api_key)
         
-        # In-memory storage for documents
-        self.documents: Dict[str, str] = {}  # filename -> full text
-        self.chunks: Dict[str, List[str]] = {}  # filename -> list of chunks
+        # Reformulations are cached per tenant (namespaced by key hash, never the key)
+        self.expansion_cache = expansion_cache if expansion_cache is not None else query_expansion_cache_from_env()
+        self.tenant = tenant_label(api_key)
+        self._cache_namespace = self.tenant
+        # This tenant's own lookups; the shared cache's counters span every tenant
+        self._expansion_hits = 0
+        self._expansion_misses = 0
+        self.response_cache = response_cache if response_cache is not None else SemanticResponseCache()
+        
+        # Per-stage timings and per-tenant usage, labelled by key hash
+        self.metrics = metrics if metrics is not None else metrics_from_env()
+        
+        # Pooled async client is looked up per call; set to inject a custom one
+        self._async_client: Optional[AsyncOpenAI] = None
         
+        # In-memory storage for documents; chunks are offsets into their text
+        self.chunk_store = ChunkStore()
+        # Keyword index keyed like the vectors, so both rankings fuse directly
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        # Serializes asave() so snapshots reach disk in the order they were taken
+        self._save_lock = asyncio.Lock()
+        
+    @property
+    def documents(self) -> Dict[str, str]:
+        """Filename -> full text of every loaded document"""
+        return {filename: self.chunk_store.document_text(filename) for filename in self.chunk_store.filenames}
+
+    @property
+    def chunks(self) -> Dict[str, List[str]]:
+        """Filename -> chunk texts (sliced on access; prefer ``chunk_store`` in hot paths)"""
+        return {
+            filename: list(self.chunk_store.iter_document_chunks(filename))
+            for filename in self.chunk_store.filenames
+        }
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Shared keep-alive async client for this API key on the running loop"""
+        return self._async_client or get_async_client(self.api_key)
+
+    @async_client.setter
+    def async_client(self, client: AsyncOpenAI) -> None:
+        self._async_client = client
+
     @traceable(name="rag.add_pdf")
-    async def add_pdf(self, filename: str, pdf_bytes: bytes) -> Dict[str, Any]:
+    async def add_pdf(self, filename: str, pdf_bytes: bytes, tags: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Add a PDF document to the RAG pipeline
         
         :param filename: Name of the PDF file
         :param pdf_bytes: PDF file content as bytes
+        :param tags: Optional tags to filter searches by (``{"tag": ...}``)
         :return: Status information
         """
+        return await self._ingest_pdf(filename, pdf_bytes, tags=tags)
+
+    async def add_text(self, filename: str, text: str, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Add an already extracted text document (e.g. a ``.txt`` file)
+        
+        :param filename: Name to store the document under
+        :param text: Document text
+        :param tags: Optional tags to filter searches by
+        :return: Status information
+        """
+        if not text.strip():
+            return {"status": "error", "filename": filename, "message": "No text to index"}
         try:
-            # Extract text from PDF
-            text = self.pdf_loader.load_from_bytes(pdf_bytes)
+            return await self._ingest_text(filename, text, tags=tags)
+        except Exception as e:
+            return {"status": "error", "filename": filename, "message": f"Error processing text: {str(e)}"}
+
+    async def add_pdfs(
+        self,
+        files: List[Tuple[str, bytes]],
+        tags: Optional[List[str]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ingest several PDFs with overlapping stages: while one file is being
+        embedded, others are still being extracted and chunked. Results are
+        yielded per file as soon as that file finishes, so total time tracks
+        the slowest file rather than the sum of all of them. In-flight
+        embedding requests are capped by the embedding model's batcher
+        (``EMBEDDING_MAX_CONCURRENCY``), shared by every upload.
+        
+        :param files: ``(filename, pdf_bytes)`` pairs
+        :param tags: Optional tags applied to every file
+        :return: Async iterator of status dicts, each including ``filename``
+        """
+        tasks = [
+            asyncio.create_task(self._ingest_pdf(filename, pdf_bytes, tags=tags))
+            for filename, pdf_bytes in files
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # Consumer stopped early: don't leave ingestion running in the background
+            for task in tasks:
+                task.cancel()
+
+    async def _ingest_pdf(
+        self,
+        filename: str,
+        pdf_bytes: bytes,
+        tags: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Extract, chunk, embed and index one PDF"""
+        try:
+            # Extract text from PDF off the event loop (page-parallel for large files)
+            with self.metrics.stage("pdf_extraction", self.tenant):
+                text, page_starts = await self.pdf_loader.aload_with_pages(pdf_bytes)
             
             if not text.strip():
-                return {"status": "error", "message": "No text could be extracted from the PDF"}
-            
-            # Store full document
-            self.documents[filename] = text
-            
-            # Split text into chunks
-            chunks = self.text_splitter.split(text)
-            self.chunks[filename] = chunks
-            
-            # Create embeddings and store in vector database
-            chunk_keys = [f"{filename}__chunk_{i}" for i in range(len(chunks))]
-            embeddings = await self.embedding_model.async_get_embeddings(chunks)
-            
-            for key, chunk, embedding in zip(chunk_keys, chunks, embeddings):
-                self.vector_db.insert(key, np.array(embedding))
-            
-            return {
-                "status": "success", 
-                "message": f"Successfully processed {filename}",
-                "chunks_created": len(chunks),
-                "total_characters": len(text)
-            }
-            
+                return {"status": "error", "filename": filename, "message": "No text could be extracted from the PDF"}
+            return await self._ingest_text(filename, text, page_starts, tags)
         except Exception as e:
-            return {"status": "error", "message": f"Error processing PDF: {str(e)}"}
+            return {"status": "error", "filename": filename, "message": f"Error processing PDF: {str(e)}"}
+
+    async def _ingest_text(
+        self,
+        filename: str,
+        text: str,
+        page_starts: Optional[List[int]] = None,
+        tags: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Chunk, embed and index one document's text"""
+        # Split text into chunk spans; vectors are keyed by chunk content
+        with self.metrics.stage("splitting", self.tenant):
+            spans = list(self.text_splitter.iter_spans(text))
+            digests = [self._chunk_digest(text[start:end]) for start, end in spans]
+            keys = [chunk_key(digest) for digest in digests]
     
+        # Only embed chunks whose text is not indexed yet (new, edited, or
+        # not already present in another file)
+        embedded: Dict[str, List[float]] = {}
+        missing = self._unindexed_chunks(keys, spans, text)
+        while missing:
+            # Create embeddings (the batcher bounds requests in flight)
+            embeddings = await self._aembed_chunks(list(missing.values()))
+            embedded.update(zip(missing, embeddings))
+            # A concurrent re-upload may have dropped a vector we meant to share
+            missing = {
+                key: chunk
+                for key, chunk in self._unindexed_chunks(keys, spans, text).items()
+                if key not in embedded
+            }
+    
+        # Store the document only once it is fully embedded
+        previous_keys = self.chunk_store.add_document(
+            filename, text, spans, digests, page_starts,
+            metadata={"uploaded_at": time.time(), "tags": list(tags or [])},
+        )
+        self.vector_db.insert_many(list(embedded), list(embedded.values()))
+        self._schedule_training()
+        self._index_lexical(keys, spans, text)
+        removed = self._sync_vectors(keys + previous_keys)
+        if keys != previous_keys:
+            self.response_cache.clear()
+        self.metrics.count("documents_ingested", self.tenant)
+        self.metrics.observe_items("chunks_per_document", self.tenant, len(spans))
+    
+        return {
+            "filename": filename,
+            "status": "success", 
+            "message": f"Successfully processed {filename}",
+            "chunks_created": len(spans),
+            "chunks_embedded": len(embedded),
+            "stale_vectors_removed": removed,
+            "total_characters": len(text)
+        }
+    
+    def _schedule_training(self) -> None:
+        """
+        Start training the vector quantizer / ANN index in the background once
+        they are due. Until it finishes, searches scan the float32 vectors.
+        """
+        if not self.vector_db.needs_training:
+            return
+        if self._training_task is None or self._training_task.done():
+            self._training_task = asyncio.get_running_loop().create_task(self._atrain_vectors())
+
+    async def _atrain_vectors(self) -> None:
+        try:
+            with self.metrics.stage("vector_training", self.tenant):
+                await self.vector_db.atrain()
+        except Exception:
+            log.exception("vector_training.failed", tenant=self.tenant)
+
+    async def _aembed_chunks(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunk texts, recording the call's duration, size and tokens"""
+        with self.metrics.stage("embedding", self.tenant):
+            embeddings, tokens = await self.embedding_model.async_get_embeddings_with_usage(texts)
+        self.metrics.observe_items("embedding_inputs", self.tenant, len(texts))
+        if tokens is None:
+            self.metrics.observe_tokens("embedding", self.tenant, texts)
+        else:
+            self.metrics.observe_token_count("embedding", self.tenant, tokens)
+        return embeddings
+
     @traceable(name="rag.search_documents")
-    def search_documents(self, query: str, k: int = 3) -> List[str]:
+    def search_documents(self, query: str, k: int = 3, filter: Optional[MetadataFilter] = None) -> List[str]:
         """
         Search for relevant document chunks
         
         :param query: Search query
         :param k: Number of chunks to retrieve
+        :param filter: Optional metadata filter, e.g. ``{"filename": ["a.pdf"]}``
+            or ``{"tag": "contracts"}``; fields are filename, page, uploaded_at, tag
         :return: List of relevant text chunks
         """
-        # Increase k to get more potential matches, then we'll return the top k
-        search_k = min(k * 2, len(self.vector_db.vectors))  # Get more candidates
-        
-        # Get search results with similarity scores
-        results_with_scores = self.vector_db.search_by_text(query, k=search_k, return_as_text=False)
+        return self.retrieve(query, k=k, filter=filter).chunks
+
+    @traceable(name="rag.asearch_documents")
+    async def asearch_documents(self, query: str, k: int = 3, filter: Optional[MetadataFilter] = None) -> List[str]:
+        """Async variant of ``search_documents``; awaits the query embedding"""
+        return (await self.aretrieve(query, k=k, filter=filter)).chunks
+
+    def retrieve(self, query: str, k: int = 3, filter: Optional[MetadataFilter] = None) -> RetrievedContext:
+        """
+        Search for relevant chunks, keeping the query embedding and chunk keys
+        so ``generate_rag_response`` can consult the answer cache
         
-        # Debug: Print similarity scores
-        print(f"Search results for '{query}':")
-        for i, (chunk_key, score) in enumerate(results_with_scores[:k]):
-            print(f"  Result {i+1}: Score={score:.4f}, Key={chunk_key}")
+        :param query: Search query
+        :param k: Number of chunks to retrieve
+        :param filter: Optional metadata filter (see ``search_documents``)
+        :return: Retrieval with ``.chunks`` holding the chunk text
+        """
+        generation = self.response_cache.generation
+        with self.metrics.stage("embedding", self.tenant):
+            query_vector = np.asarray(self.embedding_model.get_embedding(query))
+        return self._top_chunks(query, query_vector, k, generation, filter)
+
+    async def aretrieve(self, query: str, k: int = 3, filter: Optional[MetadataFilter] = None) -> RetrievedContext:
+        """Async variant of ``retrieve``; awaits the query embedding"""
+        self._schedule_training()
+        generation = self.response_cache.generation
+        with self.metrics.stage("embedding", self.tenant):
+            query_vector = np.asarray(await self.embedding_model.async_get_embedding(query))
+        return self._top_chunks(query, query_vector, k, generation, filter)
+
+    def _top_chunks(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        k: int,
+        generation: int,
+        filter: Optional[MetadataFilter] = None,
+    ) -> RetrievedContext:
+        """Rank chunks for the query vector and resolve the top-k keys to chunk text"""
+        # Increase k to get more potential matches, then we'll return the top k
+        search_k = min(k * 2, len(self.vector_db))  # Get more candidates
+        with self.metrics.stage("vector_search", self.tenant):
+            results_with_scores = self.vector_db.search(query_vector, k=search_k, filter=filter) if search_k else []
+        self.metrics.count("retrievals", self.tenant)
+        log.debug("search.results", tenant=self.tenant, query=query, results=results_with_scores[:k])
         
-        # Extract just the text chunks (top k results)
-        top_chunks = []
-        for chunk_key, score in results_with_scores[:k]:
-            # Get the actual chunk text from the key
-            filename, chunk_info = chunk_key.split('__chunk_')
-            chunk_idx = int(chunk_info)
-            if filename in self.chunks and chunk_idx < len(self.chunks[filename]):
-                top_chunks.append(self.chunks[filename][chunk_idx])
+        # Resolve the top k results to chunk rows: text plus where it came from
+        chunk_keys: List[str] = []
+        rows: List[int] = []
+        for key, _score in results_with_scores[:k]:
+            key_rows = self.chunk_store.rows_for_key(key)
+            if key_rows:
+                chunk_keys.append(key)
+                rows.append(key_rows[0])
+        return RetrievedContext(
+            query,
+            query_vector,
+            chunk_keys,
+            [self.chunk_store.text(row) for row in rows],
+            generation,
+            sources=[self.chunk_store.source(row) for row in rows],
+        )
+
+    def _chunks_for_keys(self, chunk_keys: List[str]) -> List[str]:
+        """Map vector keys to chunk text, skipping keys no document references"""
+        chunks: List[str] = []
+        for key in chunk_keys:
+            rows = self.chunk_store.rows_for_key(key)
+            if rows:
+                chunks.append(self.chunk_store.text(rows[0]))
+        return chunks
+
+    def _unindexed_chunks(self, keys: List[str], spans: List[Tuple[int, int]], text: str) -> Dict[str, str]:
+        """``key -> text`` for the chunks that have no vector yet, deduplicated"""
+        missing: Dict[str, str] = {}
+        for key, (start, end) in zip(keys, spans):
+            if key not in self.vector_db and key not in missing:
+                missing[key] = text[start:end]
+        return missing
+
+    def _index_lexical(self, keys: List[str], spans: List[Tuple[int, int]], text: str) -> None:
+        """Add chunks whose text the keyword index does not hold yet"""
+        for key, (start, end) in zip(keys, spans):
+            if key not in self.lexical_index:
+                self.lexical_index.add(key, text[start:end])
+
+    @staticmethod
+    def _chunk_digest(chunk: str) -> bytes:
+        """Content digest behind a chunk's vector key (identical text shares one vector)"""
+        return hashlib.sha256(chunk.encode("utf-8")).digest()[: ChunkStore.digest_size]
+
+    def _sync_vectors(self, candidates: List[str]) -> int:
+        """
+        Delete the vectors of any ``candidates`` no chunk references anymore
+        and refresh the filterable metadata of the rest
         
-        return top_chunks
+        :return: Number of stale vectors removed
+        """
+        stale = []
+        for key in set(candidates):
+            if not self.chunk_store.rows_for_key(key):
+                stale.append(key)
+            elif key in self.vector_db:
+                self.vector_db.set_metadata(key, self.chunk_store.key_metadata(key))
+        if not stale:
+            return 0
+        self.lexical_index.remove(stale)
+        return self.vector_db.delete(stale)
     
     @traceable(name="rag.generate_response")
-    def generate_rag_response(self, query: str, context_chunks: List[str], model: str = "gpt-4.1-mini") -> str:
+    def generate_rag_response(
+        self,
+        query: str,
+        context_chunks: List[str],
+        model: str = "gpt-4.1-mini",
+        retrieval: Optional[RetrievedContext] = None,
+    ) -> str:
         """
         Generate a response using retrieved context
         
         :param query: User query
         :param context_chunks: Retrieved context chunks
         :param model: Model to use for generation
+        :param retrieval: The ``retrieve`` result behind ``context_chunks``;
+            enables the semantic answer cache
         :return: Generated response
         """
-        context = "\n\n".join(context_chunks)
+        cached = self._cached_response(retrieval, model)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_rag_messages(query, context_chunks)
+        
+        # Reuse the pooled client for this API key
+        client = get_sync_client(self.api_key)
+        with self.metrics.stage("generation", self.tenant):
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7  # Add some creativity while staying factual
+            )
         
-        # Debug: Print the context being used
-        print(f"Context being used for query '{query}':")
-        print(f"Context length: {len(context)} characters")
-        print(f"Context preview: {context[:200]}...")
+        answer = response.choices[0].message.content
+        self._record_generation(messages, answer, getattr(response, "usage", None))
+        self._cache_response(retrieval, model, answer)
+        return answer
+
+    @traceable(name="rag.agenerate_response")
+    async def agenerate_rag_response(
+        self,
+        query: str,
+        context_chunks: List[str],
+        model: str = "gpt-4.1-mini",
+        retrieval: Optional[RetrievedContext] = None,
+    ) -> str:
+        """Async variant of ``generate_rag_response`` that does not block the event loop"""
+        cached = self._cached_response(retrieval, model)
+        if cached is not None:
+            return cached
+        messages = self._build_rag_messages(query, context_chunks)
+        with self.metrics.stage("generation", self.tenant):
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+            )
+        answer = response.choices[0].message.content
+        self._record_generation(messages, answer, getattr(response, "usage", None))
+        self._cache_response(retrieval, model, answer)
+        return answer
+
+    async def astream_rag_response(
+        self,
+        query: str,
+        context_chunks: List[str],
+        model: str = "gpt-4.1-mini",
+        retrieval: Optional[RetrievedContext] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer token by token as the model produces it
+        
+        :param query: User query
+        :param context_chunks: Retrieved context chunks
+        :param model: Model to use for generation
+        :param retrieval: The ``retrieve`` result behind ``context_chunks``;
+            a cached answer is yielded in one piece
+        :return: Async iterator of text deltas
+        """
+        cached = self._cached_response(retrieval, model)
+        if cached is not None:
+            yield cached
+            return
+        
+        messages = self._build_rag_messages(query, context_chunks)
+        started = time.perf_counter()
+        stream = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            stream=True,
+        )
+        parts: List[str] = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    if not parts:
+                        self.metrics.observe_stage("generation_ttft", self.tenant, time.perf_counter() - started)
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the HTTP connection even if the consumer stops early
+            await stream.close()
+        self.metrics.observe_stage("generation", self.tenant, time.perf_counter() - started)
+        self._record_generation(messages, "".join(parts))
+        # Only complete answers are cached
+        self._cache_response(retrieval, model, "".join(parts))
+
+    def _record_generation(self, messages: List[Dict[str, str]], answer: Optional[str], usage: Any = None) -> None:
+        """Count a generation and its tokens: the response's ``usage`` if any, else estimated"""
+        self.metrics.count("generations", self.tenant)
+        if usage is not None:
+            self.metrics.observe_token_count("prompt", self.tenant, usage.prompt_tokens)
+            self.metrics.observe_token_count("completion", self.tenant, usage.completion_tokens)
+            return
+        self.metrics.observe_tokens("prompt", self.tenant, [message["content"] for message in messages])
+        self.metrics.observe_tokens("completion", self.tenant, [answer or ""])
+
+    def _cached_response(self, retrieval: Optional[RetrievedContext], model: str) -> Optional[str]:
+        if retrieval is None or not retrieval.chunk_keys:
+            return None
+        return self.response_cache.lookup(retrieval.query_vector, retrieval.chunk_keys, model)
+
+    def _cache_response(self, retrieval: Optional[RetrievedContext], model: str, answer: Optional[str]) -> None:
+        if retrieval is None or not retrieval.chunk_keys or not answer:
+            return
+        self.response_cache.store(
+            retrieval.query_vector, retrieval.chunk_keys, model, answer, generation=retrieval.generation
+        )
+
+    def _build_rag_messages(self, query: str, context_chunks: List[str]) -> List[Dict[str, str]]:
+        """Chat messages asking the model to answer ``query`` from the given context"""
+        context = "\n\n".join(context_chunks)
+        log.debug("rag.context", tenant=self.tenant, query=query, characters=len(context), preview=context[:200])
         
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": "You are a helpful assistant that answers questions based on the provided context. Use the information from the context to answer questions as best as you can. If the context contains relevant information, use it to provide a helpful answer. If the context doesn't contain enough information to fully answer the question, provide what information you can from the context and mention what additional information might be needed."
@@ -150,56 +591,188 @@ class RAGPipeline:
                 "content": f"Based on the following context, please answer this question:\n\nContext:\n{context}\n\nQuestion: {query}\n\nAnswer:"
             }
         ]
-        
-        # Create a new OpenAI client with the API key for this request
-        client = OpenAI(api_key=self.api_key)
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7  # Add some creativity while staying factual
-        )
-        
-        return response.choices[0].message.content
 
     @traceable(name="rag.expand_queries")
     def expand_queries(self, query: str, num_queries: int = 3) -> List[str]:
         """
         Use the chat model to generate diverse reformulations for RAG-Fusion.
-        Returns the original query if expansion fails.
+        Returns the original query if expansion fails. Reformulations of
+        recently seen questions come from ``expansion_cache``.
         """
+        cached = self._cached_expansions(query, num_queries)
+        if cached is not None:
+            return cached
         try:
-            system = {
-                "role": "system",
-                "content": (
-                    "You generate diverse, high-quality reformulations of a user's question. "
-                    "Return each reformulated query on its own line, without numbering."
-                ),
-            }
-            user = {
-                "role": "user",
-                "content": (
-                    f"Question: {query}\n"
-                    f"Please provide {num_queries} distinct, concise reformulations."
-                ),
-            }
-            client = OpenAI(api_key=self.api_key)
-            resp = client.chat.completions.create(
+            client = get_sync_client(self.api_key)
+            with self.metrics.stage("query_expansion", self.tenant):
+                resp = client.chat.completions.create(
+                    model="gpt-4.1-mini",
+                    messages=self._expansion_messages(query, num_queries),
+                    temperature=0.7,
+                )
+            expansions = self._parse_expansions(resp.choices[0].message.content or "", query, num_queries)
+        except Exception:
+            return [query]
+        self._cache_expansions(query, num_queries, expansions)
+        return expansions
+
+    @traceable(name="rag.aexpand_queries")
+    async def aexpand_queries(self, query: str, num_queries: int = 3) -> List[str]:
+        """Async variant of ``expand_queries``"""
+        cached = self._cached_expansions(query, num_queries)
+        if cached is not None:
+            return cached
+        try:
+            with self.metrics.stage("query_expansion", self.tenant):
+                resp = await self.async_client.chat.completions.create(
+                    model="gpt-4.1-mini",
+                    messages=self._expansion_messages(query, num_queries),
+                    temperature=0.7,
+                )
+            expansions = self._parse_expansions(resp.choices[0].message.content or "", query, num_queries)
+        except Exception:
+            return [query]
+        self._cache_expansions(query, num_queries, expansions)
+        return expansions
+
+    def _cached_expansions(self, query: str, num_queries: int) -> Optional[List[str]]:
+        """Cached reformulations re-parsed around this exact ``query`` text, or None"""
+        reformulations = self.expansion_cache.get(self._cache_namespace, query, num_queries)
+        if reformulations is None:
+            self._expansion_misses += 1
+            return None
+        self._expansion_hits += 1
+        return self._parse_expansions("\n".join(reformulations), query, num_queries)
+
+    def _cache_expansions(self, query: str, num_queries: int, expansions: List[str]) -> None:
+        # Store only the model's reformulations; the original text differs per asker
+        reformulations = [q for q in expansions if q != query]
+        if reformulations:
+            self.expansion_cache.put(self._cache_namespace, query, num_queries, reformulations)
+
+    async def aiter_expansions(self, query: str, num_queries: int = 3) -> AsyncIterator[str]:
+        """
+        Stream the reformulations, yielding each one as soon as its line is
+        complete so callers can start retrieving before the model finishes.
+        Yields the same queries ``aexpand_queries`` would return, except the
+        original query, which is yielded first without waiting for the model.
+        """
+        cached = self._cached_expansions(query, num_queries)
+        if cached is not None:
+            for sub_query in cached:
+                yield sub_query
+            return
+
+        yield query
+        seen = {query}
+        remaining = max(1, num_queries) - 1
+        if remaining == 0:
+            return
+
+        reformulations: List[str] = []
+        started = time.perf_counter()
+        try:
+            stream = await self.async_client.chat.completions.create(
                 model="gpt-4.1-mini",
-                messages=[system, user],
+                messages=self._expansion_messages(query, num_queries),
                 temperature=0.7,
+                stream=True,
             )
-            text = resp.choices[0].message.content or ""
-            candidates = [q.strip("- •\n ") for q in text.split("\n") if q.strip()]
-            # Ensure uniqueness and include original query
-            unique: List[str] = []
-            for q in candidates:
-                if q not in unique:
-                    unique.append(q)
-            if query not in unique:
-                unique.insert(0, query)
-            return unique[: max(1, num_queries)]
+            try:
+                buffer = ""
+                async for chunk in stream:
+                    if not chunk.choices or chunk.choices[0].delta.content is None:
+                        continue
+                    buffer += chunk.choices[0].delta.content
+                    *lines, buffer = buffer.split("\n")
+                    for line in lines:
+                        candidate = line.strip("- •\n ")
+                        if candidate and candidate not in seen:
+                            seen.add(candidate)
+                            reformulations.append(candidate)
+                            yield candidate
+                            remaining -= 1
+                            if remaining == 0:
+                                break
+                    if remaining == 0:
+                        break
+                else:
+                    candidate = buffer.strip("- •\n ")
+                    if candidate and candidate not in seen:
+                        reformulations.append(candidate)
+                        yield candidate
+            finally:
+                # Breaking out early must not leave the response streaming in the background
+                await stream.close()
         except Exception:
-            return [query]
+            # Expansion is best-effort: the original query is already out
+            return
+        self.metrics.observe_stage("query_expansion", self.tenant, time.perf_counter() - started)
+        self._cache_expansions(query, num_queries, reformulations)
+
+    @staticmethod
+    def _expansion_messages(query: str, num_queries: int) -> List[Dict[str, str]]:
+        system = {
+            "role": "system",
+            "content": (
+                "You generate diverse, high-quality reformulations of a user's question. "
+                "Return each reformulated query on its own line, without numbering."
+            ),
+        }
+        user = {
+            "role": "user",
+            "content": (
+                f"Question: {query}\n"
+                f"Please provide {num_queries} distinct, concise reformulations."
+            ),
+        }
+        return [system, user]
+
+    @staticmethod
+    def _parse_expansions(text: str, query: str, num_queries: int) -> List[str]:
+        candidates = [q.strip("- •\n ") for q in text.split("\n") if q.strip()]
+        # Ensure uniqueness and include original query
+        unique: List[str] = []
+        for q in candidates:
+            if q not in unique:
+                unique.append(q)
+        if query not in unique:
+            unique.insert(0, query)
+        return unique[: max(1, num_queries)]
+
+    @staticmethod
+    def _fuse_rankings(per_query_rankings: List[List[str]], k: int) -> List[str]:
+        """Reciprocal Rank Fusion: top-k keys by summed ``1 / (60 + rank)``"""
+        rrf_scores: Dict[str, float] = {}
+        k_constant = 60.0
+        for ranking in per_query_rankings:
+            for rank_idx, key in enumerate(ranking):
+                # Reciprocal Rank Fusion score contribution
+                rrf_scores[key] = rrf_scores.get(key, 0.0) + 1.0 / (k_constant + (rank_idx + 1))
+
+        return [key for key, _ in sorted(rrf_scores.items(), key=lambda kv: kv[1], reverse=True)[:k]]
+
+    def _lexical_hits(self, query: str, k: int, filter: Optional[MetadataFilter] = None) -> List[Tuple[str, float]]:
+        """BM25 ``(key, score)`` hits for ``query``, restricted by a metadata filter"""
+        with self.metrics.stage("lexical_search", self.tenant):
+            keys = set(self.vector_db.filter_keys(filter)) if filter else None
+            return self.lexical_index.search(query, k=k, keys=keys)
+
+    async def _arank_many(
+        self, queries: List[str], k: int, filter: Optional[MetadataFilter] = None
+    ) -> List[List[str]]:
+        """Vector-ranked chunk keys for each query (one embedding call, one scan)"""
+        with self.metrics.stage("embedding", self.tenant):
+            query_vectors = await self.embedding_model.async_get_embeddings(queries)
+        with self.metrics.stage("vector_search", self.tenant):
+            return [
+                [key for key, _score in ranking]
+                for ranking in self.vector_db.search_many(query_vectors, k=k, filter=filter)
+            ]
+
+    async def _aweb_snippets(self, query: str, max_results: int) -> List[str]:
+        with self.metrics.stage("web_search", self.tenant):
+            return await self.web_search.asearch_snippets(query, max_results=max_results)
 
     @traceable(name="rag.rag_fusion")
     def rag_fusion(
@@ -209,63 +782,223 @@ class RAGPipeline:
         num_queries: int = 4,
         include_web: bool = False,
         web_results: int = 3,
+        filter: Optional[MetadataFilter] = None,
     ) -> List[str]:
         """
         RAG-Fusion with Reciprocal Rank Fusion (RRF):
-        - Expand the query into multiple reformulations
-        - Retrieve results per query from the local vector DB
+        - Rank chunks by BM25 keyword score; when the original query
+          singles out one chunk (an exact identifier or name), skip expansion
+        - Otherwise expand the query into multiple reformulations
+        - Retrieve results per query from the local vector DB and the keyword
+          index (optionally restricted by a metadata ``filter``)
         - Fuse rankings using RRF to select top-k chunks
         - Optionally pull in Tavily web snippets as extra context
         """
-        # 1) Expand queries
-        sub_queries = self.expand_queries(query, num_queries=num_queries)
+        search_k = max(k * 3, 10)
 
-        # 2) Retrieve candidates per query (collect ranked keys)
-        per_query_rankings: List[List[str]] = []
-        for sq in sub_queries:
-            results = self.vector_db.search_by_text(sq, k=max(k * 3, 10), return_as_text=False)
-            ranked_keys = [key for key, _score in results]
-            per_query_rankings.append(ranked_keys)
+        # 1) Keyword hits for the original query; expand only when they are weak
+        lexical_hits = self._lexical_hits(query, search_k, filter)
+        if self.lexical_index.strong_match(query, lexical_hits):
+            sub_queries = [query]
+        else:
+            sub_queries = self.expand_queries(query, num_queries=num_queries)
 
-        # 3) RRF fusion across rankings
-        rrf_scores: Dict[str, float] = {}
-        k_constant = 60.0
-        for ranking in per_query_rankings:
-            for rank_idx, key in enumerate(ranking):
-                # Reciprocal Rank Fusion score contribution
-                rrf_scores[key] = rrf_scores.get(key, 0.0) + 1.0 / (k_constant + (rank_idx + 1))
+        # 2) Retrieve candidates for all queries at once (one embedding call, one scan)
+        with self.metrics.stage("embedding", self.tenant):
+            query_vectors = self.embedding_model.get_embeddings(sub_queries)
+        with self.metrics.stage("vector_search", self.tenant):
+            per_query_rankings: List[List[str]] = [
+                [key for key, _score in ranking]
+                for ranking in self.vector_db.search_many(query_vectors, k=search_k, filter=filter)
+            ]
+        per_query_rankings.append([key for key, _ in lexical_hits])
+        for sub_query in sub_queries[1:]:
+            per_query_rankings.append([key for key, _ in self._lexical_hits(sub_query, search_k, filter)])
 
-        # 4) Select top-k keys by fused score
-        top_keys = [key for key, _ in sorted(rrf_scores.items(), key=lambda kv: kv[1], reverse=True)[:k]]
+        # 3) RRF fusion across rankings, then map keys to chunk text
+        fused_chunks = self._chunks_for_keys(self._fuse_rankings(per_query_rankings, k))
 
-        # 5) Map keys to chunk text
-        fused_chunks: List[str] = []
-        for chunk_key in top_keys:
-            try:
-                filename, chunk_info = chunk_key.split("__chunk_")
-                chunk_idx = int(chunk_info)
-                if filename in self.chunks and 0 <= chunk_idx < len(self.chunks[filename]):
-                    fused_chunks.append(self.chunks[filename][chunk_idx])
-            except Exception:
-                continue
-
-        # 6) Optionally append web snippets
+        # 4) Optionally append web snippets
         if include_web and self.web_search:
-            snippets = self.web_search.search_snippets(query, max_results=web_results)
+            with self.metrics.stage("web_search", self.tenant):
+                snippets = self.web_search.search_snippets(query, max_results=web_results)
             fused_chunks.extend(snippets)
 
         return fused_chunks
+
+    @traceable(name="rag.arag_fusion")
+    async def arag_fusion(
+        self,
+        query: str,
+        k: int = 5,
+        num_queries: int = 4,
+        include_web: bool = False,
+        web_results: int = 3,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[str]:
+        """
+        Async variant of ``rag_fusion`` that overlaps every network call.
+
+        The web search starts at the same moment as query expansion, and each
+        reformulation is keyword-ranked as soon as its line streams in. All
+        queries are then embedded in one request and ranked with one
+        ``search_many`` scan, like ``rag_fusion``. Latency is roughly
+        ``max(expansion, web search) + one retrieval`` instead of their sum,
+        and just ``one retrieval`` when keyword hits make expansion unnecessary.
+        """
+        self._schedule_training()
+        web_task = None
+        if include_web and self.web_search:
+            web_task = asyncio.create_task(self._aweb_snippets(query, web_results))
+
+        search_k = max(k * 3, 10)
+        lexical_hits = self._lexical_hits(query, search_k, filter)
+        if self.lexical_index.strong_match(query, lexical_hits):
+            sub_queries = self._single_query(query)
+        else:
+            sub_queries = self.aiter_expansions(query, num_queries=num_queries)
+
+        queries: List[str] = []
+        lexical_rankings: List[List[str]] = [[key for key, _ in lexical_hits]]
+        try:
+            async for sub_query in sub_queries:
+                queries.append(sub_query)
+                if sub_query != query:
+                    lexical_rankings.append([key for key, _ in self._lexical_hits(sub_query, search_k, filter)])
+            per_query_rankings = await self._arank_many(queries, search_k, filter) + lexical_rankings
+        except BaseException:
+            if web_task is not None:
+                web_task.cancel()
+            raise
+
+        fused_chunks = self._chunks_for_keys(self._fuse_rankings(per_query_rankings, k))
+
+        if web_task is not None:
+            fused_chunks.extend(await web_task)
+
+        return fused_chunks
     
+    @staticmethod
+    async def _single_query(query: str) -> AsyncIterator[str]:
+        yield query
+
     def get_document_info(self) -> Dict[str, Any]:
-        """Get information about loaded documents"""
+        """
+        Get information about loaded documents. Everything reported is this
+        tenant's own: the shared embedding cache's counters are left out, since
+        its hits would reveal which texts other tenants have embedded.
+        """
+        lookups = self._expansion_hits + self._expansion_misses
         return {
-            "loaded_documents": list(self.documents.keys()),
-            "total_chunks": sum(len(chunks) for chunks in self.chunks.values()),
-            "vector_count": len(self.vector_db.vectors)
+            "loaded_documents": self.chunk_store.filenames,
+            "total_chunks": len(self.chunk_store),
+            "vector_count": len(self.vector_db),  # unique chunks (duplicates share a vector)
+            "lexical_terms": self.lexical_index.vocabulary_size,
+            "embedding_requests": self.embedding_model.batch_stats(),
+            "query_expansion_cache": {
+                "hits": self._expansion_hits,
+                "misses": self._expansion_misses,
+                "hit_rate": self._expansion_hits / lookups if lookups else 0.0,
+            },
+            "response_cache": self.response_cache.stats(),
+            "memory_bytes": self.estimate_memory_bytes(),
         }
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Approximate memory held by this pipeline: a fixed per-pipeline overhead
+        plus its vectors, documents and chunks. The shared embedding and query
+        expansion caches are budgeted separately.
+        """
+        return (
+            _PIPELINE_BASE_BYTES
+            + self.vector_db.estimate_memory_bytes()
+            + self.chunk_store.estimate_memory_bytes()
+            + self.lexical_index.nbytes
+            + self.response_cache.nbytes
+        )
     
+    def delete_document(self, filename: str) -> bool:
+        """
+        Remove one document and the vectors of chunks no other document shares
+        
+        :param filename: Name the PDF was uploaded under
+        :return: True if the document existed
+        """
+        if filename not in self.chunk_store:
+            return False
+        self._sync_vectors(self.chunk_store.remove_document(filename))
+        self.response_cache.clear()
+        return True
+
     def clear_documents(self):
         """Clear all loaded documents and vectors"""
-        self.documents.clear()
-        self.chunks.clear()
-        self.vector_db.vectors.clear()
+        self.chunk_store.clear()
+        self.lexical_index.clear()
+        self.vector_db.clear()
+        self.response_cache.clear()
+
+    def save(self, directory: str) -> None:
+        """
+        Persist the vector index and document store so the pipeline can be
+        reattached after a restart without re-embedding anything.
+
+        :param directory: Target directory for this pipeline's files
+        """
+        self.snapshot()(directory)
+
+    async def asave(self, directory: str) -> None:
+        """
+        Like ``save``, but only the snapshot is taken on the event loop; the
+        files are written on a worker thread. Saves of one pipeline run one
+        at a time, so an older snapshot never overwrites a newer one.
+
+        :param directory: Target directory for this pipeline's files
+        """
+        async with self._save_lock:
+            write = self.snapshot()
+            await asyncio.to_thread(write, directory)
+
+    @property
+    def saving(self) -> bool:
+        """Whether an ``asave`` is in progress"""
+        return self._save_lock.locked()
+
+    def snapshot(self) -> Callable[[str], None]:
+        """
+        Capture the vectors, chunks and keyword index without modifying them
+        and return a ``write(directory)`` function that writes them out.
+        """
+        write_vectors = self.vector_db.snapshot()
+        write_chunks = self.chunk_store.snapshot()
+        write_lexical = self.lexical_index.snapshot()
+
+        def write(directory: str) -> None:
+            write_vectors(os.path.join(directory, "vectors"))
+            write_chunks(directory)
+            write_lexical(directory)
+
+        return write
+
+    def load(self, directory: str, mmap: bool = True) -> bool:
+        """
+        Reattach a pipeline previously written by ``save``.
+
+        :param directory: Directory passed to ``save``
+        :param mmap: Memory-map the vector matrix instead of reading it eagerly
+        :return: True if a saved index was found and loaded
+        """
+        if not ChunkStore.exists(directory):
+            return False
+        self.vector_db = VectorDatabase.load(
+            os.path.join(directory, "vectors"),
+            embedding_model=self.embedding_model,
+            mmap=mmap,
+            index=self.vector_db.index,
+            rerank=self.vector_db.rerank,
+            auto_train=self.vector_db.auto_train,
+        )
+        self.chunk_store = ChunkStore.load(directory)
+        self.lexical_index = BM25Index.load(directory)
+        self.response_cache.clear()
+        return True
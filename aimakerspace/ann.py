@@ -0,0 +1,315 @@
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit L2 norm (zero rows are left at zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norms > 0, vectors / norms, 0.0).astype(np.float32)
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: int = 0,
+    batch_size: int = 8192,
+    spherical: bool = True,
+) -> np.ndarray:
+    """
+    Lloyd's k-means. Spherical by default (cosine assignment, normalized
+    centroids); ``spherical=False`` gives plain Euclidean k-means.
+
+    :param vectors: ``(n, dim)`` vectors (unit vectors when spherical)
+    :param n_clusters: Number of centroids
+    :param n_iter: Lloyd iterations
+    :param seed: RNG seed for initialisation and empty-cluster reseeding
+    :param batch_size: Rows scored per step, to bound peak memory
+    :param spherical: Use cosine rather than Euclidean distance
+    :return: ``(n_clusters, dim)`` centroids
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    n_clusters = min(n_clusters, n)
+    centroids = vectors[rng.choice(n, size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids, batch_size=batch_size, spherical=spherical)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = vectors[rng.choice(n, size=empty.size, replace=False)]
+            counts[empty] = 1
+        centroids = normalize_rows(sums) if spherical else (sums / counts[:, None]).astype(np.float32)
+
+    return centroids
+
+
+def assign_to_centroids(
+    vectors: np.ndarray,
+    centroids: np.ndarray,
+    batch_size: int = 8192,
+    spherical: bool = True,
+) -> np.ndarray:
+    """Index of the closest centroid (by cosine, or Euclidean if not spherical) for every row."""
+    # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+    offset = 0.0 if spherical else 0.5 * np.sum(centroids * centroids, axis=1)
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(block @ centroids.T - offset, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over a VectorDatabase's rows.
+
+    Rows are bucketed by their nearest k-means centroid. A query only scores
+    the rows in its ``nprobe`` closest buckets, trading recall for speed. Until
+    enough rows exist to train the quantizer, the index reports no candidates
+    and the database falls back to an exact scan.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        nprobe_fraction: float = 0.2,
+        min_train_size: int = 1024,
+        retrain_growth: float = 4.0,
+        max_train_samples: int = 65536,
+        n_iter: int = 20,
+        seed: int = 0,
+    ):
+        """
+        :param nlist: Number of buckets; defaults to ``4 * sqrt(n)`` at train time
+        :param nprobe: Buckets scanned per query (higher = better recall,
+            slower); defaults to ``nprobe_fraction`` of the buckets, or set it
+            from measured recall with ``tune_nprobe``
+        :param nprobe_fraction: Share of buckets scanned when ``nprobe`` is
+            None. A fixed count does not scale with ``nlist``: 8 of the 282
+            buckets of a 5k-row index found under half of the true top 10
+        :param min_train_size: Rows needed before the quantizer is trained
+        :param retrain_growth: Retrain once the row count grows by this factor
+        :param max_train_samples: Cap on rows sampled for k-means
+        :param n_iter: k-means iterations
+        :param seed: RNG seed
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.nprobe_fraction = nprobe_fraction
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.max_train_samples = max_train_samples
+        self.n_iter = n_iter
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the quantizer and all bucket assignments."""
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int64)
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def needs_training(self, size: int) -> bool:
+        if size < self.min_train_size:
+            return False
+        if not self.trained:
+            return True
+        return size >= self._trained_size * self.retrain_growth
+
+    def train(self, unit_vectors: np.ndarray) -> None:
+        """
+        Fit the coarse quantizer and (re)assign every row.
+
+        :param unit_vectors: ``(n, dim)`` unit vectors for rows ``0..n-1``
+        """
+        self.set_buckets(*self.fit(unit_vectors))
+
+    def fit(self, unit_vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The expensive half of ``train``: k-means plus every row's bucket. Only
+        reads the index's settings, so it can run on a worker thread while
+        the index keeps serving; pass the result to ``set_buckets``.
+
+        :param unit_vectors: ``(n, dim)`` unit vectors for rows ``0..n-1``
+        :return: ``(centroids, assignments)``
+        """
+        n = unit_vectors.shape[0]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        rng = np.random.default_rng(self.seed)
+        sample = unit_vectors
+        if n > self.max_train_samples:
+            sample = unit_vectors[rng.choice(n, size=self.max_train_samples, replace=False)]
+        centroids = kmeans(sample, nlist, n_iter=self.n_iter, seed=self.seed)
+        return centroids, assign_to_centroids(unit_vectors, centroids)
+
+    def set_buckets(self, centroids: np.ndarray, assignments: np.ndarray, trained_size: Optional[int] = None) -> None:
+        """
+        Install centroids and the bucket of rows ``0..len(assignments)-1``.
+
+        :param trained_size: Row count the retraining schedule counts growth
+            from (default: the number of rows assigned)
+        """
+        assignments = np.asarray(assignments, dtype=np.int64)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=centroids.shape[0])
+        self.centroids = centroids
+        self._lists = [bucket.tolist() for bucket in np.split(order, np.cumsum(counts)[:-1])]
+        self._assignments = assignments.copy()
+        self._list_arrays = {}
+        self._trained_size = assignments.size if trained_size is None else trained_size
+
+    def compact(self, survivors: np.ndarray) -> None:
+        """
+        Renumber rows after the database dropped every row not in
+        ``survivors`` (old row ids, ascending), keeping the centroids.
+        """
+        if not self.trained:
+            return
+        if survivors.size and survivors[-1] >= self._assignments.size:
+            self.reset()  # rows the index never saw; retrain from scratch
+            return
+        self.set_buckets(self.centroids, self._assignments[survivors], self._trained_size)
+
+    def add(self, rows: Sequence[int], unit_vectors: np.ndarray) -> None:
+        """
+        Assign new or overwritten rows to buckets. A no-op before training.
+
+        :param rows: Row ids, aligned with ``unit_vectors``
+        :param unit_vectors: Unit vectors for those rows
+        """
+        if not self.trained or len(rows) == 0:
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        needed = int(rows.max()) + 1
+        if needed > self._assignments.size:
+            grown = np.full(max(needed, 2 * self._assignments.size), -1, dtype=np.int64)
+            grown[: self._assignments.size] = self._assignments
+            self._assignments = grown
+
+        buckets = assign_to_centroids(unit_vectors, self.centroids)
+        for row, bucket in zip(rows.tolist(), buckets.tolist()):
+            previous = int(self._assignments[row])
+            if previous == bucket:
+                continue
+            if previous >= 0:
+                self._lists[previous].remove(row)
+                self._list_arrays.pop(previous, None)
+            self._lists[bucket].append(row)
+            self._list_arrays.pop(bucket, None)
+            self._assignments[row] = bucket
+
+    def _bucket(self, bucket: int) -> np.ndarray:
+        array = self._list_arrays.get(bucket)
+        if array is None:
+            array = np.asarray(self._lists[bucket], dtype=np.int64)
+            self._list_arrays[bucket] = array
+        return array
+
+    def probes(self, nprobe: Optional[int] = None) -> int:
+        """Buckets a query scans: ``nprobe``, else the configured count or fraction"""
+        nlist = self.centroids.shape[0] if self.trained else 1
+        nprobe = nprobe or self.nprobe or math.ceil(self.nprobe_fraction * nlist)
+        return max(1, min(nprobe, nlist))
+
+    def candidates(self, unit_query: np.ndarray, nprobe: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Row ids in the ``nprobe`` buckets closest to the query, or None when
+        the index is untrained and the caller should scan everything.
+        """
+        if not self.trained:
+            return None
+        nprobe = self.probes(nprobe)
+        centroid_scores = self.centroids @ unit_query
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self._bucket(int(bucket)) for bucket in probed])
+
+
+def recall_at_k(db, query_vectors: Sequence[np.ndarray], k: int, **search_kwargs) -> float:
+    """
+    Mean fraction of the exact top-k that the database's index returns.
+
+    :param db: A VectorDatabase with an ANN index configured
+    :param query_vectors: Held-out query vectors
+    :param k: Cutoff
+    :param search_kwargs: Extra arguments for ``db.search`` (e.g. ``nprobe``)
+    """
+    recalls = []
+    for query in query_vectors:
+        exact = {key for key, _score in db.search(query, k, exact=True)}
+        if not exact:
+            continue
+        approx = {key for key, _score in db.search(query, k, **search_kwargs)}
+        recalls.append(len(exact & approx) / len(exact))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def sweep_nprobe(db, query_vectors: Sequence[np.ndarray], k: int, nprobe_values: Sequence[int]) -> List[Dict[str, float]]:
+    """
+    Measure recall@k and mean query latency for several ``nprobe`` settings,
+    so an operating point can be picked from data rather than guessed.
+    """
+    report = []
+    for nprobe in nprobe_values:
+        start = time.perf_counter()
+        for query in query_vectors:
+            db.search(query, k, nprobe=nprobe)
+        latency = (time.perf_counter() - start) / max(1, len(query_vectors))
+        report.append({
+            "nprobe": nprobe,
+            f"recall@{k}": recall_at_k(db, query_vectors, k, nprobe=nprobe),
+            "mean_latency_ms": latency * 1000,
+        })
+    return report
+
+
+def tune_nprobe(
+    db,
+    query_vectors: Sequence[np.ndarray],
+    k: int,
+    target_recall: float = 0.9,
+    nprobe_values: Optional[Sequence[int]] = None,
+) -> Dict[str, float]:
+    """
+    Set ``db.index.nprobe`` to the smallest value whose recall@k on
+    ``query_vectors`` (measured with ``sweep_nprobe``) reaches
+    ``target_recall``, or to the largest value tried if none does. Re-run
+    after the index retrains, since that changes the number of buckets.
+
+    :param db: A VectorDatabase with a trained IVF index
+    :param query_vectors: Representative queries
+    :param k: Cutoff
+    :param target_recall: Recall@k to reach
+    :param nprobe_values: Candidates, ascending (default: 1% to 100% of the buckets)
+    :return: The chosen ``sweep_nprobe`` row
+    """
+    index = db.index
+    if index is None or not index.trained:
+        raise ValueError("tune_nprobe needs a trained IVF index")
+    nlist = index.centroids.shape[0]
+    if nprobe_values is None:
+        fractions = (0.01, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0)
+        nprobe_values = sorted({max(1, math.ceil(fraction * nlist)) for fraction in fractions})
+    chosen: Dict[str, float] = {}
+    for nprobe in nprobe_values:
+        chosen = sweep_nprobe(db, query_vectors, k, [nprobe])[0]
+        if chosen[f"recall@{k}"] >= target_recall:
+            break
+    index.nprobe = int(chosen["nprobe"])
+    return chosen
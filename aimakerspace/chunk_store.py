@@ -0,0 +1,338 @@
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# On-disk layout written by ChunkStore.save
+_COLUMNS_FILE = "chunks.npz"
+_DOCUMENTS_FILE = "chunk_documents.json"
+
+_COLUMN_DTYPES = {
+    "doc_id": np.int32,   # owning document, -1 once the chunk is deleted
+    "offset": np.int64,   # first character in the document text
+    "length": np.int32,   # characters in the chunk
+    "page": np.int32,     # 1-based page the chunk starts on (0 = unknown)
+}
+
+
+def chunk_key(digest: bytes) -> str:
+    """Vector key for a chunk's content digest."""
+    return digest.hex()
+
+
+class ChunkStore:
+    """
+    Documents plus array-backed chunk rows that point into their text.
+
+    A chunk is an integer id addressing four growable columns (document id,
+    character offset, length and page) and a fixed-width content digest.
+    Chunk text is sliced out of the document on demand, so the store holds
+    each document's text once instead of a second copy per chunk.
+
+    Chunks with identical text share a digest and therefore one vector;
+    ``rows_for_key`` maps a vector key back to every chunk holding that text.
+    Removing a document tombstones its rows (``doc_id = -1``); they are
+    reclaimed by ``compact``, which renumbers chunk ids.
+    """
+
+    digest_size = 16
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = max(1, initial_capacity)
+        self._doc_names: List[Optional[str]] = []       # doc id -> filename (None = removed)
+        self._doc_texts: List[Optional[str]] = []       # doc id -> full text
+        self._doc_pages: List[np.ndarray] = []          # doc id -> page start offsets
+        self._doc_metadata: List[Dict[str, Any]] = []   # doc id -> e.g. uploaded_at, tags
+        self._doc_ids: Dict[str, int] = {}              # filename -> doc id
+        self._doc_rows: Dict[int, Tuple[int, int]] = {}  # doc id -> [start, stop) chunk rows
+        self._key_rows: Dict[str, List[int]] = {}       # vector key -> chunk rows
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros(0, dtype=dtype) for name, dtype in _COLUMN_DTYPES.items()
+        }
+        self._digests = np.zeros((0, self.digest_size), dtype=np.uint8)
+        self._capacity = 0
+        self._size = 0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        """Number of live chunks."""
+        return self._size - self._dead
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._doc_ids
+
+    @property
+    def filenames(self) -> List[str]:
+        return list(self._doc_ids)
+
+    def document_text(self, filename: str) -> Optional[str]:
+        doc_id = self._doc_ids.get(filename)
+        return None if doc_id is None else self._doc_texts[doc_id]
+
+    def document_metadata(self, filename: str) -> Dict[str, Any]:
+        doc_id = self._doc_ids.get(filename)
+        return {} if doc_id is None else self._doc_metadata[doc_id]
+
+    def document_chunk_count(self, filename: str) -> int:
+        start, stop = self._doc_rows.get(self._doc_ids.get(filename, -1), (0, 0))
+        return stop - start
+
+    def document_keys(self, filename: str) -> List[str]:
+        """Vector keys of a document's chunks, in chunk order."""
+        doc_id = self._doc_ids.get(filename)
+        if doc_id is None:
+            return []
+        start, stop = self._doc_rows[doc_id]
+        return self._keys_for_rows(start, stop)
+
+    def _keys_for_rows(self, start: int, stop: int) -> List[str]:
+        raw = self._digests[start:stop].tobytes()
+        return [chunk_key(raw[i:i + self.digest_size]) for i in range(0, len(raw), self.digest_size)]
+
+    def _ensure_capacity(self, extra_rows: int) -> None:
+        needed = self._size + extra_rows
+        if needed <= self._capacity:
+            return
+        capacity = max(self._capacity, self.initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[name] = grown
+        grown = np.zeros((capacity, self.digest_size), dtype=np.uint8)
+        grown[: self._size] = self._digests[: self._size]
+        self._digests = grown
+        self._capacity = capacity
+
+    def add_document(
+        self,
+        filename: str,
+        text: str,
+        spans: Sequence[Tuple[int, int]],
+        digests: Sequence[bytes],
+        page_starts: Optional[Sequence[int]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[str]:
+        """
+        Store (or replace) a document and its chunks.
+
+        :param filename: Document name; an existing document is replaced
+        :param text: Full document text
+        :param spans: ``(start, end)`` character span of each chunk
+        :param digests: Content digest of each chunk (``digest_size`` bytes)
+        :param page_starts: Offset where each page begins, for page lookup
+        :param metadata: Document-level metadata (JSON-serializable)
+        :return: Vector keys the replaced version used (empty for a new document)
+        """
+        previous = self.remove_document(filename)
+
+        doc_id = len(self._doc_names)
+        self._doc_names.append(filename)
+        self._doc_texts.append(text)
+        self._doc_pages.append(np.asarray(page_starts if page_starts is not None else [], dtype=np.int64))
+        self._doc_metadata.append(dict(metadata or {}))
+        self._doc_ids[filename] = doc_id
+
+        count = len(spans)
+        self._ensure_capacity(count)
+        start, stop = self._size, self._size + count
+        offsets = np.fromiter((span[0] for span in spans), dtype=np.int64, count=count)
+        ends = np.fromiter((span[1] for span in spans), dtype=np.int64, count=count)
+        self._columns["doc_id"][start:stop] = doc_id
+        self._columns["offset"][start:stop] = offsets
+        self._columns["length"][start:stop] = ends - offsets
+        self._columns["page"][start:stop] = np.searchsorted(self._doc_pages[doc_id], offsets, side="right")
+        if count:
+            self._digests[start:stop] = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(count, -1)
+        self._doc_rows[doc_id] = (start, stop)
+        self._size = stop
+
+        for row, digest in zip(range(start, stop), digests):
+            self._key_rows.setdefault(chunk_key(digest), []).append(row)
+        return previous
+
+    def remove_document(self, filename: str) -> List[str]:
+        """
+        Tombstone a document's chunks.
+
+        :return: Vector keys the document used (callers delete the ones
+            ``rows_for_key`` no longer resolves)
+        """
+        doc_id = self._doc_ids.pop(filename, None)
+        if doc_id is None:
+            return []
+        start, stop = self._doc_rows.pop(doc_id)
+        keys = self._keys_for_rows(start, stop)
+        for row, key in zip(range(start, stop), keys):
+            rows = self._key_rows.get(key)
+            if rows is not None:
+                rows.remove(row)
+                if not rows:
+                    del self._key_rows[key]
+        self._columns["doc_id"][start:stop] = -1
+        self._doc_names[doc_id] = None
+        self._doc_texts[doc_id] = None
+        self._doc_pages[doc_id] = np.zeros(0, dtype=np.int64)
+        self._doc_metadata[doc_id] = {}
+        self._dead += stop - start
+        if self._dead > self._size // 2:
+            self.compact()
+        return keys
+
+    def clear(self) -> None:
+        self.__init__(self.initial_capacity)
+
+    def rows_for_key(self, key: str) -> List[int]:
+        """Live chunk rows whose text has this vector key."""
+        return self._key_rows.get(key, [])
+
+    def text(self, row: int) -> str:
+        """Chunk text, sliced from the document."""
+        offset = int(self._columns["offset"][row])
+        length = int(self._columns["length"][row])
+        return self._doc_texts[int(self._columns["doc_id"][row])][offset:offset + length]
+
+    def key_metadata(self, key: str) -> Dict[str, Any]:
+        """
+        Metadata for the vector behind ``key``, merged over every chunk that
+        shares its text: filenames, pages, upload times and tags are lists.
+        """
+        merged: Dict[str, List[Any]] = {"filename": [], "page": [], "uploaded_at": [], "tag": []}
+        for row in self.rows_for_key(key):
+            doc_id = int(self._columns["doc_id"][row])
+            doc_metadata = self._doc_metadata[doc_id]
+            values = {
+                "filename": [self._doc_names[doc_id]],
+                "page": [int(self._columns["page"][row])],
+                "uploaded_at": [doc_metadata.get("uploaded_at")],
+                "tag": list(doc_metadata.get("tags") or []),
+            }
+            for field, items in values.items():
+                for item in items:
+                    if item is not None and item not in merged[field]:
+                        merged[field].append(item)
+        return {field: items for field, items in merged.items() if items}
+
+    def source(self, row: int) -> Dict[str, Any]:
+        """Where a chunk came from: filename, page and character offsets."""
+        offset = int(self._columns["offset"][row])
+        return {
+            "chunk_id": int(row),
+            "source": self._doc_names[int(self._columns["doc_id"][row])],
+            "page": int(self._columns["page"][row]),
+            "start": offset,
+            "end": offset + int(self._columns["length"][row]),
+        }
+
+    def iter_document_chunks(self, filename: str) -> Iterator[str]:
+        doc_id = self._doc_ids.get(filename)
+        if doc_id is None:
+            return
+        start, stop = self._doc_rows[doc_id]
+        for row in range(start, stop):
+            yield self.text(row)
+
+    def compact(self) -> None:
+        """Drop tombstoned chunk rows and removed documents, renumbering ids."""
+        if self._dead == 0:
+            return
+        live_docs = [doc_id for doc_id, name in enumerate(self._doc_names) if name is not None]
+        doc_remap = np.full(len(self._doc_names), -1, dtype=np.int32)
+        doc_remap[live_docs] = np.arange(len(live_docs), dtype=np.int32)
+
+        survivors = np.flatnonzero(self._columns["doc_id"][: self._size] >= 0)
+        capacity = max(self.initial_capacity, survivors.size)
+        for name, column in self._columns.items():
+            compacted = np.zeros(capacity, dtype=column.dtype)
+            compacted[: survivors.size] = column[survivors]
+            self._columns[name] = compacted
+        self._columns["doc_id"][: survivors.size] = doc_remap[self._columns["doc_id"][: survivors.size]]
+        digests = np.zeros((capacity, self.digest_size), dtype=np.uint8)
+        digests[: survivors.size] = self._digests[survivors]
+        self._digests = digests
+
+        self._doc_names = [self._doc_names[doc_id] for doc_id in live_docs]
+        self._doc_texts = [self._doc_texts[doc_id] for doc_id in live_docs]
+        self._doc_pages = [self._doc_pages[doc_id] for doc_id in live_docs]
+        self._doc_metadata = [self._doc_metadata[doc_id] for doc_id in live_docs]
+        self._capacity = capacity
+        self._size = survivors.size
+        self._dead = 0
+        self._rebuild_lookups()
+
+    def _rebuild_lookups(self) -> None:
+        self._doc_ids = {name: doc_id for doc_id, name in enumerate(self._doc_names) if name is not None}
+        self._doc_rows = {doc_id: (0, 0) for doc_id in self._doc_ids.values()}
+        self._key_rows = {}
+        doc_ids = self._columns["doc_id"][: self._size].tolist()
+        for row, (doc_id, key) in enumerate(zip(doc_ids, self._keys_for_rows(0, self._size))):
+            if doc_id < 0:
+                continue
+            start, stop = self._doc_rows[doc_id]
+            self._doc_rows[doc_id] = (start if stop else row, row + 1)
+            self._key_rows.setdefault(key, []).append(row)
+
+    def estimate_memory_bytes(self) -> int:
+        texts = sum(sys.getsizeof(text) for text in self._doc_texts if text is not None)
+        names = sum(sys.getsizeof(name) for name in self._doc_ids)
+        columns = sum(column.nbytes for column in self._columns.values()) + self._digests.nbytes
+        # ~100 bytes per lookup entry (key string, list and dict slot)
+        return texts + names + columns + 100 * len(self._key_rows)
+
+    def save(self, directory: str) -> None:
+        """Write the columns as an ``.npz`` and the document texts as JSON."""
+        self.snapshot()(directory)
+
+    def snapshot(self) -> Callable[[str], None]:
+        """
+        Copy the chunk columns and document lists and return a
+        ``write(directory)`` function for them that can run on a worker
+        thread. Tombstoned rows are written as-is and skipped on ``load``.
+        """
+        columns = {name: column[: self._size].copy() for name, column in self._columns.items()}
+        digests = self._digests[: self._size].copy()
+        documents = {
+            "names": list(self._doc_names),
+            "texts": list(self._doc_texts),
+            "pages": list(self._doc_pages),
+            "metadata": list(self._doc_metadata),
+        }
+
+        def write(directory: str) -> None:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, _COLUMNS_FILE)
+            with open(f"{path}.tmp", "wb") as f:
+                np.savez(f, digests=digests, **columns)
+            os.replace(f"{path}.tmp", path)
+
+            path = os.path.join(directory, _DOCUMENTS_FILE)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({**documents, "pages": [pages.tolist() for pages in documents["pages"]]}, f)
+            os.replace(f"{path}.tmp", path)
+
+        return write
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, _DOCUMENTS_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "ChunkStore":
+        store = cls()
+        with open(os.path.join(directory, _DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        store._doc_names = documents["names"]
+        store._doc_texts = documents["texts"]
+        store._doc_pages = [np.asarray(pages, dtype=np.int64) for pages in documents["pages"]]
+        store._doc_metadata = documents["metadata"]
+        with np.load(os.path.join(directory, _COLUMNS_FILE)) as arrays:
+            for name, dtype in _COLUMN_DTYPES.items():
+                store._columns[name] = np.asarray(arrays[name], dtype=dtype)
+            store._digests = np.asarray(arrays["digests"], dtype=np.uint8).reshape(-1, cls.digest_size)
+        store._size = store._capacity = store._digests.shape[0]
+        store._dead = int(np.count_nonzero(store._columns["doc_id"] < 0))
+        store._rebuild_lookups()
+        return store
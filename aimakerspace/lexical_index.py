@@ -0,0 +1,309 @@
+import json
+import math
+import os
+import re
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# On-disk layout written by BM25Index.save
+_POSTINGS_FILE = "lexical.npz"
+_VOCABULARY_FILE = "lexical_terms.json"
+
+# Words, numbers and joined identifiers such as "XR-2000", "v1.2" or "a_b/c"
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART_PATTERN = re.compile(r"[-./:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of ``text``. Joined identifiers are kept whole and also
+    split into their parts, so "XR-2000" matches both "xr-2000" and "xr 2000".
+    """
+    terms: List[str] = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        if _PART_PATTERN.search(token):
+            terms.extend(part for part in _PART_PATTERN.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index over chunk text with Okapi BM25 scoring.
+
+    Each term owns two compact postings arrays: document ids (``uint32``) and
+    term frequencies (``uint16``), appended to as chunks are added so the
+    index is updated incrementally. Scoring reads them zero-copy through
+    numpy. Documents are addressed by the same keys as their vectors.
+
+    Removing a document tombstones its id; postings and document frequencies
+    are cleaned up by ``compact``, which runs automatically once
+    ``compaction_threshold`` of the ids are dead.
+    """
+
+    # A lexical top hit is "strong" when it contains the query's most
+    # selective term (present in at most this share of chunks) ...
+    strong_max_df_ratio = 0.05
+    # ... and outscores the runner-up by at least this factor
+    strong_margin = 2.0
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compaction_threshold: float = 0.25):
+        """
+        :param k1: Term-frequency saturation
+        :param b: Document-length normalization (0 = none, 1 = full)
+        :param compaction_threshold: Dead share of ids that triggers ``compact``
+        """
+        self.k1 = k1
+        self.b = b
+        self.compaction_threshold = compaction_threshold
+        self.clear()
+
+    def clear(self) -> None:
+        self._term_ids: Dict[str, int] = {}
+        self._doc_postings: List[array] = []   # term id -> doc ids (ascending)
+        self._freq_postings: List[array] = []  # term id -> term frequency per doc id
+        self._doc_keys: List[Optional[str]] = []  # doc id -> key (None = removed)
+        self._doc_lengths = array("I")          # doc id -> number of terms
+        self._alive = np.zeros(0, dtype=bool)   # doc id -> not removed (grown by doubling)
+        self._key_ids: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._key_ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_ids
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._term_ids)
+
+    @property
+    def nbytes(self) -> int:
+        postings = sum(p.itemsize * len(p) for p in self._doc_postings)
+        postings += sum(f.itemsize * len(f) for f in self._freq_postings)
+        # ~100 bytes per vocabulary and key entry (string plus dict slot)
+        return postings + self._doc_lengths.itemsize * len(self._doc_lengths) + self._alive.nbytes + 100 * (
+            len(self._term_ids) + len(self._key_ids)
+        )
+
+    def add(self, key: str, text: str) -> None:
+        """Index (or re-index) one chunk under ``key``"""
+        if key in self._key_ids:
+            self.remove([key])
+        counts: Dict[int, int] = {}
+        terms = tokenize(text)
+        for term in terms:
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self._doc_postings)
+                self._doc_postings.append(array("I"))
+                self._freq_postings.append(array("H"))
+            counts[term_id] = counts.get(term_id, 0) + 1
+
+        doc_id = len(self._doc_keys)
+        for term_id, count in counts.items():
+            self._doc_postings[term_id].append(doc_id)
+            self._freq_postings[term_id].append(min(count, 0xFFFF))
+        if doc_id == self._alive.size:
+            alive = np.zeros(max(16, 2 * doc_id), dtype=bool)
+            alive[:doc_id] = self._alive
+            self._alive = alive
+        self._alive[doc_id] = True
+        self._doc_keys.append(key)
+        self._doc_lengths.append(len(terms))
+        self._key_ids[key] = doc_id
+        self._total_length += len(terms)
+
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Index ``(key, text)`` pairs"""
+        for key, text in items:
+            self.add(key, text)
+
+    def remove(self, keys: Iterable[str]) -> int:
+        """
+        Tombstone the given keys (unknown keys are ignored).
+
+        :return: Number of documents removed
+        """
+        removed = 0
+        for key in keys:
+            doc_id = self._key_ids.pop(key, None)
+            if doc_id is not None:
+                self._doc_keys[doc_id] = None
+                self._alive[doc_id] = False
+                self._total_length -= self._doc_lengths[doc_id]
+                removed += 1
+        dead = len(self._doc_keys) - len(self._key_ids)
+        if removed and dead >= self.compaction_threshold * len(self._doc_keys):
+            self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """Drop removed documents from the postings and renumber doc ids"""
+        if len(self._key_ids) == len(self._doc_keys):
+            return
+        remap = np.full(len(self._doc_keys), -1, dtype=np.int64)
+        live = np.flatnonzero(self._alive[: len(self._doc_keys)])
+        remap[live] = np.arange(live.size)
+
+        term_ids: Dict[str, int] = {}
+        doc_postings: List[array] = []
+        freq_postings: List[array] = []
+        for term, term_id in self._term_ids.items():
+            docs = remap[np.frombuffer(self._doc_postings[term_id], dtype=np.uint32)]
+            keep = docs >= 0
+            if not keep.any():
+                continue
+            term_ids[term] = len(doc_postings)
+            doc_postings.append(array("I", docs[keep].astype(np.uint32).tobytes()))
+            freqs = np.frombuffer(self._freq_postings[term_id], dtype=np.uint16)[keep]
+            freq_postings.append(array("H", freqs.tobytes()))
+
+        self._term_ids = term_ids
+        self._doc_postings = doc_postings
+        self._freq_postings = freq_postings
+        self._doc_keys = [self._doc_keys[doc_id] for doc_id in live.tolist()]
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)[live]
+        self._doc_lengths = array("I", lengths.tobytes())
+        self._alive = np.ones(live.size, dtype=bool)
+        self._key_ids = {key: doc_id for doc_id, key in enumerate(self._doc_keys)}
+
+    def _idf(self, term_id: int) -> float:
+        # Document frequency counts tombstoned ids until the next compaction
+        df = len(self._doc_postings[term_id])
+        return math.log(1.0 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10, keys: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-``k`` keys by BM25 score for ``query`` (only documents sharing at
+        least one term with it)
+
+        :param query: Free-text query
+        :param k: Number of results
+        :param keys: Only rank these keys (e.g. those matching a metadata filter)
+        :return: ``(key, score)`` pairs, best first
+        """
+        if not self._key_ids or k <= 0:
+            return []
+        term_ids = {self._term_ids[term] for term in tokenize(query) if term in self._term_ids}
+        if not term_ids:
+            return []
+
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        average_length = self._total_length / len(self) or 1.0
+        scores = np.zeros(len(self._doc_keys), dtype=np.float32)
+        for term_id in term_ids:
+            docs = np.frombuffer(self._doc_postings[term_id], dtype=np.uint32)
+            freqs = np.frombuffer(self._freq_postings[term_id], dtype=np.uint16).astype(np.float32)
+            norms = self.k1 * (1.0 - self.b + self.b * lengths[docs] / average_length)
+            # Each doc id appears once per term, so plain fancy-index addition is safe
+            scores[docs] += self._idf(term_id) * freqs * (self.k1 + 1.0) / (freqs + norms)
+
+        if keys is not None:
+            allowed = np.zeros(len(self._doc_keys), dtype=bool)
+            allowed[[self._key_ids[key] for key in keys if key in self._key_ids]] = True
+            scores[~allowed] = 0.0
+        if len(self._key_ids) != len(self._doc_keys):
+            scores[~self._alive[: len(self._doc_keys)]] = 0.0
+
+        matched = np.flatnonzero(scores > 0)
+        if matched.size > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self._doc_keys[doc_id], float(scores[doc_id])) for doc_id in matched.tolist()]
+
+    def strong_match(self, query: str, hits: List[Tuple[str, float]]) -> bool:
+        """
+        Whether ``hits`` (from ``search``) single out one chunk confidently:
+        the top hit contains the query's most selective term, that term is
+        rare in the corpus (an identifier, part number or name rather than a
+        common word), and the top score clearly beats the runner-up.
+        """
+        if not hits:
+            return False
+        if len(hits) > 1 and hits[0][1] < self.strong_margin * hits[1][1]:
+            return False
+        term_ids = {self._term_ids[term] for term in tokenize(query) if term in self._term_ids}
+        if not term_ids:
+            return False
+        rarest = min(term_ids, key=lambda term_id: len(self._doc_postings[term_id]))
+        if len(self._doc_postings[rarest]) > max(1.0, self.strong_max_df_ratio * len(self)):
+            return False
+        docs = np.frombuffer(self._doc_postings[rarest], dtype=np.uint32)
+        top = self._key_ids[hits[0][0]]
+        position = int(np.searchsorted(docs, top))
+        return position < docs.size and int(docs[position]) == top
+
+    def save(self, directory: str) -> None:
+        """Write the postings as one concatenated ``.npz`` plus a JSON vocabulary"""
+        self.snapshot()(directory)
+
+    def snapshot(self) -> Callable[[str], None]:
+        """
+        Capture the index as it is now and return a ``write(directory)``
+        function for it that can run on a worker thread. Postings are only
+        ever appended to (compaction builds new ones), so the snapshot keeps
+        references plus their current lengths instead of copying them.
+        Removed documents are written as ``None`` keys and skipped on ``load``.
+        """
+        terms = list(self._term_ids)  # term ids are assigned in insertion order
+        doc_postings = list(self._doc_postings)
+        freq_postings = list(self._freq_postings)
+        counts = [len(postings) for postings in doc_postings]
+        doc_lengths, num_docs = self._doc_lengths, len(self._doc_lengths)
+        vocabulary = {"k1": self.k1, "b": self.b, "terms": terms, "keys": list(self._doc_keys)}
+
+        def write(directory: str) -> None:
+            os.makedirs(directory, exist_ok=True)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            docs = b"".join(p[:count].tobytes() for p, count in zip(doc_postings, counts))
+            freqs = b"".join(f[:count].tobytes() for f, count in zip(freq_postings, counts))
+            path = os.path.join(directory, _POSTINGS_FILE)
+            with open(f"{path}.tmp", "wb") as f:
+                np.savez(
+                    f,
+                    offsets=offsets,
+                    docs=np.frombuffer(docs, dtype=np.uint32),
+                    freqs=np.frombuffer(freqs, dtype=np.uint16),
+                    lengths=np.frombuffer(doc_lengths[:num_docs], dtype=np.uint32),
+                )
+            os.replace(f"{path}.tmp", path)
+
+            path = os.path.join(directory, _VOCABULARY_FILE)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(vocabulary, f)
+            os.replace(f"{path}.tmp", path)
+
+        return write
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, _VOCABULARY_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        with open(os.path.join(directory, _VOCABULARY_FILE), "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        index = cls(k1=vocabulary["k1"], b=vocabulary["b"])
+        with np.load(os.path.join(directory, _POSTINGS_FILE)) as arrays:
+            offsets = arrays["offsets"]
+            docs = np.asarray(arrays["docs"], dtype=np.uint32)
+            freqs = np.asarray(arrays["freqs"], dtype=np.uint16)
+            lengths = np.asarray(arrays["lengths"], dtype=np.uint32)
+        for term_id, term in enumerate(vocabulary["terms"]):
+            start, stop = offsets[term_id], offsets[term_id + 1]
+            index._term_ids[term] = term_id
+            index._doc_postings.append(array("I", docs[start:stop].tobytes()))
+            index._freq_postings.append(array("H", freqs[start:stop].tobytes()))
+        index._doc_keys = list(vocabulary["keys"])
+        index._doc_lengths = array("I", lengths.tobytes())
+        index._alive = np.array([key is not None for key in index._doc_keys], dtype=bool)
+        index._key_ids = {key: doc_id for doc_id, key in enumerate(index._doc_keys) if key is not None}
+        index._total_length = sum(
+            int(length) for length, key in zip(lengths.tolist(), index._doc_keys) if key is not None
+        )
+        return index
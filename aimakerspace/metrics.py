@@ -0,0 +1,206 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cache hit (~1 ms) up to a slow multi-file upload
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Counts and token totals per call
+COUNT_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+def tenant_label(api_key: str) -> str:
+    """Stable, non-reversible tenant id for labels and cache keys (never the key itself)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate by the ~4 characters per token rule of thumb (O(1), no tokenizer)."""
+    return (len(text) + 3) // 4
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}" for labels, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination, Prometheus style."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last = +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        lines = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                le = 'le="{}"'.format(bound if isinstance(bound, str) else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _StageTimer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_StageTimer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(self._labels, time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class PipelineMetrics:
+    """
+    Dependency-free stage timings and per-tenant usage histograms, rendered
+    in the Prometheus text exposition format.
+
+    Stages (``pdf_extraction``, ``splitting``, ``embedding``,
+    ``vector_search``, ``lexical_search``, ``query_expansion``,
+    ``web_search``, ``generation``, ``generation_ttft``) are timed with
+    ``with metrics.stage(name, tenant):``. When ``enabled`` is False every
+    call returns before touching a lock or a clock, so instrumented code
+    pays one attribute check.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "rag_stage_seconds", "Time spent in each pipeline stage", ("stage", "tenant"), STAGE_BUCKETS
+        )
+        self.tokens = Histogram(
+            "rag_tokens", "Tokens per model call (as reported by the API, else estimated)", ("kind", "tenant"),
+            COUNT_BUCKETS,
+        )
+        self.items = Histogram(
+            "rag_items", "Items per operation (chunks per document, texts per embedding call, ...)",
+            ("item", "tenant"), COUNT_BUCKETS,
+        )
+        self.operations = Counter("rag_operations_total", "Pipeline operations performed", ("operation", "tenant"))
+        self._instruments = (self.stage_seconds, self.tokens, self.items, self.operations)
+
+    def stage(self, name: str, tenant: str = ""):
+        """Context manager timing one stage into ``rag_stage_seconds``"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self.stage_seconds, (name, tenant))
+
+    def observe_stage(self, name: str, tenant: str, seconds: float) -> None:
+        """Record a stage duration measured elsewhere (e.g. time to first token)"""
+        if self.enabled:
+            self.stage_seconds.observe((name, tenant), seconds)
+
+    def count(self, operation: str, tenant: str = "", amount: float = 1.0) -> None:
+        if self.enabled:
+            self.operations.inc((operation, tenant), amount)
+
+    def observe_items(self, item: str, tenant: str, count: int) -> None:
+        if self.enabled:
+            self.items.observe((item, tenant), count)
+
+    def observe_tokens(self, kind: str, tenant: str, texts: Iterable[str]) -> None:
+        """Estimate and record the tokens of ``texts`` sent or received in one call"""
+        if self.enabled:
+            self.tokens.observe((kind, tenant), sum(estimate_tokens(text) for text in texts))
+
+    def observe_token_count(self, kind: str, tenant: str, tokens: int) -> None:
+        """Record the tokens of one call as reported by the API's ``usage``"""
+        if self.enabled:
+            self.tokens.observe((kind, tenant), tokens)
+
+    def render(self) -> str:
+        """All instruments in Prometheus text format (version 0.0.4)"""
+        lines = []
+        for instrument in self._instruments:
+            lines.append(f"# HELP {instrument.name} {instrument.help}")
+            lines.append(f"# TYPE {instrument.name} {instrument.kind}")
+            lines.extend(instrument.render())
+        return "\n".join(lines) + "\n"
+
+
+_default_metrics: Optional[PipelineMetrics] = None
+_default_lock = threading.Lock()
+
+
+def metrics_from_env() -> PipelineMetrics:
+    """
+    Process-wide metrics shared by every pipeline (series are labelled per
+    tenant). Recording is enabled by ``RAG_METRICS=1``; otherwise the
+    instrumentation is a no-op.
+    """
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            enabled = os.getenv("RAG_METRICS", "").lower() in ("1", "true", "yes", "on")
+            _default_metrics = PipelineMetrics(enabled=enabled)
+        return _default_metrics
@@ -1,7 +1,7 @@
-from openai import OpenAI
 from dotenv import load_dotenv
-from typing import Optional
+from typing import AsyncIterator, Optional
 import os
+from aimakerspace.openai_utils.clients import get_async_client, get_sync_client
 
 load_dotenv()
 
@@ -23,8 +23,8 @@ class ChatOpenAI:
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
 
-        # Create client with the API key
-        client = OpenAI(api_key=self.openai_api_key)
+        # Reuse the pooled client for this API key
+        client = get_sync_client(self.openai_api_key)
         response = client.chat.completions.create(
             model=self.model_name, messages=messages, **kwargs
         )
@@ -33,3 +33,29 @@ class ChatOpenAI:
             return response.choices[0].message.content
 
         return response
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        client = get_async_client(self.openai_api_key)
+        response = await client.chat.completions.create(
+            model=self.model_name, messages=messages, **kwargs
+        )
+
+        if text_only:
+            return response.choices[0].message.content
+
+        return response
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator[str]:
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        client = get_async_client(self.openai_api_key)
+        stream = await client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
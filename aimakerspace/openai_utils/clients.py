@@ -0,0 +1,108 @@
+import asyncio
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Set
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# Connection pool settings shared by every pooled client
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Pooled clients kept per event loop (and for sync use); least recently used
+# keys are closed beyond this, so a stream of one-off API keys can't leak sockets
+MAX_CLIENTS = int(os.getenv("OPENAI_MAX_CLIENTS", "256"))
+
+_lock = threading.Lock()
+_sync_clients: "OrderedDict[str, OpenAI]" = OrderedDict()
+# Async connections belong to the loop that opened them, so pool per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict[str, AsyncOpenAI]]" = (
+    weakref.WeakKeyDictionary()
+)
+# Keeps background close() tasks of evicted async clients alive until done
+_closing: Set[asyncio.Task] = set()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _evict_oldest(clients: "OrderedDict[str, object]") -> List[object]:
+    """Pop least recently used clients beyond ``MAX_CLIENTS``; the caller closes them"""
+    evicted = []
+    while len(clients) > max(1, MAX_CLIENTS):
+        evicted.append(clients.popitem(last=False)[1])
+    return evicted
+
+
+def get_async_client(api_key: str) -> AsyncOpenAI:
+    """
+    Shared ``AsyncOpenAI`` client for ``api_key`` on the running event loop,
+    backed by a keep-alive httpx connection pool. Creating a client per call
+    throws away TLS sessions and connection reuse. At most ``MAX_CLIENTS``
+    are kept per loop; the least recently used one is closed in the background.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = _async_clients[loop] = OrderedDict()
+        client = clients.get(api_key)
+        if client is not None:
+            clients.move_to_end(api_key)
+            return client
+        client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=REQUEST_TIMEOUT,
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT),
+        )
+        clients[api_key] = client
+        evicted = _evict_oldest(clients)
+    for old in evicted:
+        task = loop.create_task(old.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    return client
+
+
+def get_sync_client(api_key: str) -> OpenAI:
+    """
+    Shared synchronous ``OpenAI`` client for ``api_key`` with a pooled httpx
+    client, closing the least recently used one beyond ``MAX_CLIENTS``.
+    """
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is not None:
+            _sync_clients.move_to_end(api_key)
+            return client
+        client = OpenAI(
+            api_key=api_key,
+            timeout=REQUEST_TIMEOUT,
+            http_client=httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT),
+        )
+        _sync_clients[api_key] = client
+        evicted = _evict_oldest(_sync_clients)
+    for old in evicted:
+        old.close()
+    return client
+
+
+async def aclose_clients() -> None:
+    """Close every pooled client on the running loop, e.g. at app shutdown."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+        sync_clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        await client.close()
+    for client in sync_clients:
+        client.close()
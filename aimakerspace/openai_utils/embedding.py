@@ -1,13 +1,22 @@
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
 import openai
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import os
 import asyncio
+from aimakerspace.openai_utils.embedding_batcher import EmbeddingBatcher
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
+from aimakerspace.openai_utils.clients import get_async_client, get_sync_client
 
 
 class EmbeddingModel:
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small", api_key: Optional[str] = None):
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        api_key: Optional[str] = None,
+        cache: Optional[EmbeddingCache] = None,
+        batcher: Optional[EmbeddingBatcher] = None,
+    ):
         load_dotenv()
         
         # Use provided API key or fall back to environment variable
@@ -21,50 +30,125 @@ class EmbeddingModel:
                 "OPENAI_API_KEY environment variable is not set or api_key parameter not provided. Please set it to your OpenAI API key."
             )
         
-        # Initialize clients with the API key
-        self.async_client = AsyncOpenAI(api_key=self.openai_api_key)
-        self.client = OpenAI(api_key=self.openai_api_key)
+        # Pooled clients are looked up per call; these allow injecting custom ones
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._client: Optional[OpenAI] = None
         
         # Set the legacy openai.api_key for backwards compatibility
         openai.api_key = self.openai_api_key
         self.embeddings_model_name = embeddings_model_name
 
+        # Optional content-addressed cache; only misses are sent to the API
+        self.cache = cache
+
+        # Token-budgeted, rate-limit-aware batching of async embedding requests
+        self.batcher = batcher if batcher is not None else EmbeddingBatcher()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Shared keep-alive async client for this API key on the running loop"""
+        return self._async_client or get_async_client(self.openai_api_key)
+
+    @async_client.setter
+    def async_client(self, client: AsyncOpenAI) -> None:
+        self._async_client = client
+
+    @property
+    def client(self) -> OpenAI:
+        """Shared keep-alive sync client for this API key"""
+        return self._client or get_sync_client(self.openai_api_key)
+
+    @client.setter
+    def client(self, client: OpenAI) -> None:
+        self._client = client
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Hit/miss counters of the embedding cache (empty if caching is off)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def batch_stats(self) -> Dict[str, float]:
+        """Request, retry and throughput counters of async embedding batches."""
+        return self.batcher.stats()
+
+    def _lookup_cached(self, list_of_text: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """
+        Split a request into cached embeddings and the unique texts still to embed.
+
+        :return: ``(embeddings, misses)`` where ``embeddings`` has None at every miss
+        """
+        if self.cache is None:
+            return [None] * len(list_of_text), list(dict.fromkeys(list_of_text))
+        embeddings = self.cache.get_many(self.embeddings_model_name, list_of_text)
+        misses = [text for text, embedding in zip(list_of_text, embeddings) if embedding is None]
+        return embeddings, list(dict.fromkeys(misses))
+
+    def _merge_computed(
+        self,
+        list_of_text: List[str],
+        embeddings: List[Optional[List[float]]],
+        misses: List[str],
+        computed: List[List[float]],
+    ) -> List[List[float]]:
+        """Store freshly computed embeddings and fill them into the cache gaps."""
+        if self.cache is not None and misses:
+            self.cache.put_many(self.embeddings_model_name, misses, computed)
+        by_text = dict(zip(misses, computed))
+        return [
+            embedding if embedding is not None else by_text[text]
+            for text, embedding in zip(list_of_text, embeddings)
+        ]
+
     async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        batch_size = 1024
-        batches = [list_of_text[i:i + batch_size] for i in range(0, len(list_of_text), batch_size)]
-        
-        async def process_batch(batch):
-            embedding_response = await self.async_client.embeddings.create(
+        return (await self.async_get_embeddings_with_usage(list_of_text))[0]
+
+    async def async_get_embeddings_with_usage(
+        self, list_of_text: List[str]
+    ) -> Tuple[List[List[float]], Optional[int]]:
+        """
+        Like ``async_get_embeddings``, plus the prompt tokens the API reported
+        for the texts it had to embed (0 when all were cached, None when a
+        response carried no usage).
+        """
+        embeddings, misses = self._lookup_cached(list_of_text)
+        if not misses:
+            return embeddings, 0
+        computed, tokens = await self._async_embed_uncached(misses)
+        return self._merge_computed(list_of_text, embeddings, misses, computed), tokens
+
+    async def _async_embed_uncached(self, list_of_text: List[str]) -> Tuple[List[List[float]], Optional[int]]:
+        usage: List[Optional[int]] = []
+
+        # The batcher retries with backoff; SDK retries would multiply its attempts
+        client = self.async_client.with_options(max_retries=0)
+
+        async def process_batch(batch: List[str]) -> List[List[float]]:
+            embedding_response = await client.embeddings.create(
                 input=batch, model=self.embeddings_model_name
             )
+            reported = getattr(embedding_response, "usage", None)
+            usage.append(getattr(reported, "prompt_tokens", None))
             return [embeddings.embedding for embeddings in embedding_response.data]
         
-        # Use asyncio.gather to process all batches concurrently
-        results = await asyncio.gather(*[process_batch(batch) for batch in batches])
-        
-        # Flatten the results
-        return [embedding for batch_result in results for embedding in batch_result]
+        # Packed by token estimate, concurrency-capped, retried in order
+        embeddings = await self.batcher.embed(list_of_text, process_batch)
+        return embeddings, None if None in usage else sum(usage)
 
     async def async_get_embedding(self, text: str) -> List[float]:
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
-
-        return embedding.data[0].embedding
+        return (await self.async_get_embeddings([text]))[0]
 
     def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        embeddings, misses = self._lookup_cached(list_of_text)
+        if not misses:
+            return embeddings
+
         embedding_response = self.client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
+            input=misses, model=self.embeddings_model_name
         )
-
-        return [embeddings.embedding for embeddings in embedding_response.data]
+        computed = [embeddings.embedding for embeddings in embedding_response.data]
+        return self._merge_computed(list_of_text, embeddings, misses, computed)
 
     def get_embedding(self, text: str) -> List[float]:
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
-
-        return embedding.data[0].embedding
+        return self.get_embeddings([text])[0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import openai
+
+from aimakerspace.metrics import estimate_tokens
+from aimakerspace.structured_logging import get_logger
+
+# OpenAI accepts up to 2048 inputs and 300k tokens per embeddings request;
+# the token budget leaves headroom for the ~4 characters/token estimate
+MAX_BATCH_INPUTS = int(os.getenv("EMBEDDING_MAX_BATCH_INPUTS", "2048"))
+MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "200000"))
+# Embedding requests in flight per model instance, across all callers
+MAX_CONCURRENT_REQUESTS = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+
+# Smallest token budget shrinking can reach after "too many tokens" errors
+MIN_BATCH_TOKENS = 1024
+
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+log = get_logger("aimakerspace.embedding")
+
+EmbedRequest = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers (0 if absent)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+class EmbeddingBatcher:
+    """
+    Sends embedding inputs as token-budgeted batches with bounded concurrency.
+
+    Inputs are packed in order into batches of at most ``max_batch_tokens``
+    estimated tokens and ``max_batch_inputs`` texts, and at most
+    ``max_concurrency`` requests are in flight at once (per event loop,
+    shared by every caller). Rate limits, connection errors and 5xx responses
+    are retried with full-jitter exponential backoff (at least as long as any
+    Retry-After header). A batch rejected for having too many tokens is split
+    in half, and the token budget shrinks for later batches. Embeddings come
+    back in input order however the batches finish.
+    """
+
+    def __init__(
+        self,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        max_batch_inputs: int = MAX_BATCH_INPUTS,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        """
+        :param max_batch_tokens: Estimated tokens per request
+        :param max_batch_inputs: Texts per request
+        :param max_concurrency: Requests in flight at once
+        :param max_retries: Retries per batch before the error is raised
+        :param base_delay: Backoff cap of the first retry, in seconds (doubles per retry)
+        :param max_delay: Upper bound of any single backoff, in seconds
+        :param count_tokens: Token estimate of one input
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.count_tokens = count_tokens
+
+        # asyncio primitives belong to one loop, so keep a semaphore per loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._inputs = 0
+        self._tokens = 0
+        self._retries = 0
+        self._rate_limited = 0
+        self._splits = 0
+        self._in_flight = 0
+        self._busy_since = 0.0
+        self._busy_seconds = 0.0
+
+    def pack(self, token_counts: Sequence[int]) -> List[Tuple[int, int]]:
+        """
+        Group consecutive inputs into batches within the token and input limits.
+
+        :param token_counts: Estimated tokens of each input
+        :return: ``(start, end)`` index ranges covering every input in order
+        """
+        batches = []
+        start, tokens = 0, 0
+        for i, count in enumerate(token_counts):
+            if i > start and (tokens + count > self.max_batch_tokens or i - start >= self.max_batch_inputs):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += count
+        if start < len(token_counts):
+            batches.append((start, len(token_counts)))
+        return batches
+
+    async def embed(self, texts: List[str], request: EmbedRequest) -> List[List[float]]:
+        """
+        Embed ``texts`` with ``request`` (one API call for a list of texts).
+
+        :return: One embedding per text, in input order
+        """
+        counts = [self.count_tokens(text) for text in texts]
+        batches = self.pack(counts)
+        semaphore = self._semaphore()
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        started = time.perf_counter()
+        retries_before = self._retries
+
+        async def run(start: int, end: int) -> None:
+            embeddings[start:end] = await self._send(texts[start:end], counts[start:end], request, semaphore)
+
+        tasks = [asyncio.ensure_future(run(start, end)) for start, end in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        if len(batches) > 1:
+            seconds = time.perf_counter() - started
+            tokens = sum(counts)
+            log.info(
+                "embedding.completed",
+                inputs=len(texts),
+                batches=len(batches),
+                tokens=tokens,
+                seconds=round(seconds, 3),
+                tokens_per_s=round(tokens / seconds) if seconds else None,
+                retries=self._retries - retries_before,
+            )
+        return embeddings
+
+    async def _send(
+        self,
+        texts: List[str],
+        counts: List[int],
+        request: EmbedRequest,
+        semaphore: asyncio.Semaphore,
+    ) -> List[List[float]]:
+        """One batch, retried on transient errors and split if it is too large"""
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    self._request_started()
+                    try:
+                        embeddings = await request(texts)
+                    finally:
+                        self._request_finished()
+            except openai.BadRequestError as error:
+                if len(texts) < 2 or "token" not in str(error).lower():
+                    raise
+                return await self._split(texts, counts, request, semaphore)
+            except _RETRYABLE_ERRORS as error:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, error)
+                attempt += 1
+                with self._lock:
+                    self._retries += 1
+                    self._rate_limited += isinstance(error, openai.RateLimitError)
+                log.warning(
+                    "embedding.retry",
+                    attempt=attempt,
+                    inputs=len(texts),
+                    delay=round(delay, 3),
+                    error=type(error).__name__,
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            with self._lock:
+                self._requests += 1
+                self._inputs += len(texts)
+                self._tokens += sum(counts)
+            log.debug("embedding.batch", inputs=len(texts), tokens=sum(counts), attempts=attempt + 1)
+            return embeddings
+
+    async def _split(
+        self,
+        texts: List[str],
+        counts: List[int],
+        request: EmbedRequest,
+        semaphore: asyncio.Semaphore,
+    ) -> List[List[float]]:
+        """Halve a batch the API rejected as too large, and shrink the budget to match"""
+        batch_tokens = sum(counts)
+        with self._lock:
+            self._splits += 1
+            self.max_batch_tokens = min(self.max_batch_tokens, max(MIN_BATCH_TOKENS, batch_tokens // 2))
+        log.warning("embedding.split", inputs=len(texts), tokens=batch_tokens, max_batch_tokens=self.max_batch_tokens)
+        middle = len(texts) // 2
+        left, right = await asyncio.gather(
+            self._send(texts[:middle], counts[:middle], request, semaphore),
+            self._send(texts[middle:], counts[middle:], request, semaphore),
+        )
+        return left + right
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+        jittered = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(jittered, min(self.max_delay, _retry_after(error)))
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return semaphore
+
+    def _request_started(self) -> None:
+        with self._lock:
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+
+    def _request_finished(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Request counters and throughput so far. Throughput is measured over
+        the time at least one request was in flight, so it is live during an
+        upload and unaffected by idle periods.
+        """
+        with self._lock:
+            busy = self._busy_seconds
+            if self._in_flight:
+                busy += time.perf_counter() - self._busy_since
+            return {
+                "requests": self._requests,
+                "inputs": self._inputs,
+                "estimated_tokens": self._tokens,
+                "retries": self._retries,
+                "rate_limited": self._rate_limited,
+                "splits": self._splits,
+                "in_flight": self._in_flight,
+                "max_batch_tokens": self.max_batch_tokens,
+                "busy_seconds": busy,
+                "inputs_per_s": self._inputs / busy if busy else 0.0,
+                "tokens_per_s": self._tokens / busy if busy else 0.0,
+            }
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def embedding_cache_key(model_name: str, text: str) -> str:
+    """Content-addressed cache key: the model name plus a SHA-256 of the text."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Base class for embedding caches. Subclasses implement ``_get`` and ``_put``
+    for a single key; this class handles batching and hit/miss accounting.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for ``texts``.
+
+        :return: One embedding per text, or None where the text is not cached
+        """
+        found = [self._get(embedding_cache_key(model_name, text)) for text in texts]
+        hits = sum(vector is not None for vector in found)
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return [None if vector is None else vector.tolist() for vector in found]
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store freshly computed embeddings for ``texts``."""
+        for text, vector in zip(texts, vectors):
+            self._put(embedding_cache_key(model_name, text), np.asarray(vector, dtype=np.float32))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+
+class LRUEmbeddingCache(EmbeddingCache):
+    """
+    In-memory cache capped by size, evicting the least recently used
+    embeddings. A byte budget rather than an entry count keeps the footprint
+    predictable whatever the embedding dimension.
+    """
+
+    # Approximate bookkeeping per entry beyond the vector data: key string,
+    # ndarray header and dict slot
+    entry_overhead = 250
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param max_bytes: Memory budget for the cached vectors
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry_bytes(self, vector: np.ndarray) -> int:
+        return vector.nbytes + self.entry_overhead
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= self._entry_bytes(previous)
+            self._entries[key] = vector
+            self.nbytes += self._entry_bytes(vector)
+            while self.nbytes > self.max_bytes and self._entries:
+                _key, evicted = self._entries.popitem(last=False)
+                self.nbytes -= self._entry_bytes(evicted)
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "bytes": self.nbytes, "max_bytes": self.max_bytes}
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """On-disk cache storing float32 embeddings as blobs in a SQLite file."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                (key, vector.tobytes()),
+            )
+            self._conn.commit()
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        # One transaction per batch instead of one commit per vector
+        rows = [
+            (embedding_cache_key(model_name, text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredEmbeddingCache(EmbeddingCache):
+    """
+    Memory tier in front of a disk tier. Disk hits are promoted into memory and
+    new embeddings are written to both tiers.
+    """
+
+    def __init__(self, memory: Optional[LRUEmbeddingCache] = None, disk: Optional[EmbeddingCache] = None):
+        super().__init__()
+        self.memory = memory if memory is not None else LRUEmbeddingCache()
+        self.disk = disk
+
+    def __len__(self) -> int:
+        return len(self.disk) if self.disk is not None else len(self.memory)
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "bytes": self.memory.nbytes, "max_bytes": self.memory.max_bytes}
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        vector = self.memory._get(key)
+        if vector is None and self.disk is not None:
+            vector = self.disk._get(key)
+            if vector is not None:
+                self.memory._put(key, vector)
+        return vector
+
+    def _put(self, key: str, vector: np.ndarray) -> None:
+        self.memory._put(key, vector)
+        if self.disk is not None:
+            self.disk._put(key, vector)
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        self.memory.put_many(model_name, texts, vectors)
+        if self.disk is not None:
+            self.disk.put_many(model_name, texts, vectors)
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_lock = threading.Lock()
+
+
+def embedding_cache_from_env() -> EmbeddingCache:
+    """
+    Process-wide embedding cache shared by every pipeline (keys are content
+    hashes, so tenants uploading the same text share entries; its stats are
+    therefore cross-tenant and must not be shown to tenants): an in-memory
+    LRU capped at ``EMBEDDING_CACHE_MB`` (default 64), backed by a single
+    SQLite connection when ``EMBEDDING_CACHE_PATH`` is set.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            memory = LRUEmbeddingCache(max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MB", "64")) * 1024 * 1024))
+            path = os.getenv("EMBEDDING_CACHE_PATH")
+            _default_cache = memory if not path else TieredEmbeddingCache(memory=memory, disk=SQLiteEmbeddingCache(path))
+        return _default_cache
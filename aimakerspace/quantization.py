@@ -0,0 +1,184 @@
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from aimakerspace.ann import assign_to_centroids, kmeans
+
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization of unit vectors with one float32 scale per vector.
+
+    Each vector is stored as ``round(v / max|v| * 127)`` plus its scale, about
+    4x smaller than float32. Needs no training, so inserts encode immediately.
+    Scores are computed asymmetrically: the float query is multiplied against
+    the int8 codes without decoding them.
+    """
+
+    kind = "int8"
+    code_dtype = np.int8
+    min_train_size = 0
+    block_size = 16384  # rows upcast to float32 at a time while scoring
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def train(self, unit_vectors: np.ndarray) -> None:
+        pass
+
+    def code_size(self, dim: int) -> int:
+        return dim
+
+    def encode(self, unit_vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """:return: ``(codes, scales)`` for the given unit vectors"""
+        unit_vectors = np.asarray(unit_vectors, dtype=np.float32)
+        max_abs = np.max(np.abs(unit_vectors), axis=1)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(unit_vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def decode(self, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * scales[:, None]
+
+    def score(self, unit_queries: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """``(num_queries, num_codes)`` approximate cosine similarities."""
+        scores = np.empty((unit_queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], self.block_size):
+            block = codes[start:start + self.block_size].astype(np.float32)
+            scores[:, start:start + self.block_size] = (
+                unit_queries @ block.T
+            ) * scales[start:start + self.block_size]
+        return scores
+
+    def state(self) -> Dict[str, Any]:
+        return {"kind": self.kind}
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+
+class ProductQuantizer:
+    """
+    Product quantization: each vector is split into ``num_subspaces`` slices
+    and every slice is replaced by the id of its nearest of 256 k-means
+    centroids, one byte per slice. A 1536-d float32 vector with 96 subspaces
+    shrinks from 6 KB to 96 bytes.
+
+    Scoring uses asymmetric distance computation: per query, a
+    ``(num_subspaces, 256)`` table of slice/centroid dot products is built once
+    and each code's score is a sum of table lookups.
+    """
+
+    kind = "pq"
+    code_dtype = np.uint8
+    num_centroids = 256
+
+    def __init__(
+        self,
+        num_subspaces: int = 96,
+        min_train_size: int = 4096,
+        max_train_samples: int = 65536,
+        n_iter: int = 15,
+        seed: int = 0,
+    ):
+        """
+        :param num_subspaces: Slices per vector (must divide the dimension)
+        :param min_train_size: Rows held unquantized until the codebooks are trained
+        :param max_train_samples: Cap on rows sampled for codebook training
+        :param n_iter: k-means iterations per subspace
+        :param seed: RNG seed
+        """
+        self.num_subspaces = num_subspaces
+        self.min_train_size = min_train_size
+        self.max_train_samples = max_train_samples
+        self.n_iter = n_iter
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (num_subspaces, 256, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def code_size(self, dim: int) -> int:
+        return self.num_subspaces
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """``(n, dim)`` -> ``(num_subspaces, n, sub_dim)``"""
+        n, dim = vectors.shape
+        if dim % self.num_subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible by num_subspaces={self.num_subspaces}")
+        return vectors.reshape(n, self.num_subspaces, dim // self.num_subspaces).transpose(1, 0, 2)
+
+    def train(self, unit_vectors: np.ndarray) -> None:
+        unit_vectors = np.asarray(unit_vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if unit_vectors.shape[0] > self.max_train_samples:
+            sample = rng.choice(unit_vectors.shape[0], size=self.max_train_samples, replace=False)
+            unit_vectors = unit_vectors[sample]
+
+        codebooks = []
+        for sub in self._split(unit_vectors):
+            centroids = kmeans(sub, self.num_centroids, n_iter=self.n_iter, seed=self.seed, spherical=False)
+            if centroids.shape[0] < self.num_centroids:
+                # Tiny training sets: pad so codes always index a full table
+                padding = np.zeros((self.num_centroids - centroids.shape[0], centroids.shape[1]), dtype=np.float32)
+                centroids = np.vstack([centroids, padding])
+            codebooks.append(centroids)
+        self.codebooks = np.stack(codebooks).astype(np.float32)
+
+    def encode(self, unit_vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        unit_vectors = np.asarray(unit_vectors, dtype=np.float32)
+        codes = np.empty((unit_vectors.shape[0], self.num_subspaces), dtype=np.uint8)
+        for j, sub in enumerate(self._split(unit_vectors)):
+            codes[:, j] = assign_to_centroids(sub, self.codebooks[j], spherical=False)
+        return codes, np.ones(unit_vectors.shape[0], dtype=np.float32)
+
+    def decode(self, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.num_subspaces)]
+        return np.concatenate(parts, axis=1) * scales[:, None]
+
+    def score(self, unit_queries: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        # tables[q, j, c] = <query slice j, centroid c of subspace j>
+        tables = np.einsum("jqd,jcd->qjc", self._split(unit_queries), self.codebooks)
+        scores = np.zeros((unit_queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for j in range(self.num_subspaces):
+            scores += tables[:, j, :][:, codes[:, j]]
+        return scores * scales
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "num_subspaces": self.num_subspaces,
+            "min_train_size": self.min_train_size,
+            "max_train_samples": self.max_train_samples,
+            "n_iter": self.n_iter,
+            "seed": self.seed,
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {} if self.codebooks is None else {"codebooks": self.codebooks}
+
+
+def quantizer_from_state(state: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+    """Rebuild a quantizer from the ``state()``/``arrays()`` saved with an index."""
+    params = {key: value for key, value in state.items() if key != "kind"}
+    if state["kind"] == ScalarQuantizer.kind:
+        return ScalarQuantizer()
+    if state["kind"] == ProductQuantizer.kind:
+        quantizer = ProductQuantizer(**params)
+        if "codebooks" in arrays:
+            quantizer.codebooks = np.asarray(arrays["codebooks"], dtype=np.float32)
+        return quantizer
+    raise ValueError(f"Unknown quantizer kind: {state['kind']}")
+
+
+def quantizer_from_name(name: Optional[str]):
+    """Map a config string (``"int8"``, ``"pq"``, or empty) to a quantizer instance."""
+    if not name or name == "none":
+        return None
+    if name == ScalarQuantizer.kind:
+        return ScalarQuantizer()
+    if name == ProductQuantizer.kind:
+        return ProductQuantizer()
+    raise ValueError(f"Unknown quantization mode: {name}")
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used for cache keys."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def expansion_cache_key(namespace: str, query: str, num_queries: int) -> str:
+    """Cache key for a tenant's reformulations of ``query``."""
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"{namespace}:{num_queries}:{digest}"
+
+
+class QueryExpansionCache:
+    """
+    TTL + LRU cache of LLM query reformulations.
+
+    Entries expire ``ttl_seconds`` after they were written and the least
+    recently used entry is evicted beyond ``max_entries``. With a ``path``, a
+    SQLite file backs the memory tier so reformulations survive restarts;
+    disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 3600.0, path: Optional[str] = None):
+        """
+        :param max_entries: Entries kept in memory
+        :param ttl_seconds: Lifetime of an entry (0 = never expires)
+        :param path: Optional SQLite file for persistence
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS expansions "
+                "(key TEXT PRIMARY KEY, queries TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, expires_at: float) -> bool:
+        return self.ttl_seconds > 0 and expires_at <= time.time()
+
+    def get(self, namespace: str, query: str, num_queries: int) -> Optional[List[str]]:
+        """
+        Cached reformulations of ``query``, or None on a miss or expired entry.
+        """
+        key = expansion_cache_key(namespace, query, num_queries)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT queries, expires_at FROM expansions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[1], json.loads(row[0]))
+                    self._store(key, entry)
+            if entry is not None and self._expired(entry[0]):
+                self._entries.pop(key, None)
+                if self._conn is not None:
+                    self._conn.execute("DELETE FROM expansions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, namespace: str, query: str, num_queries: int, queries: List[str]) -> None:
+        """Store reformulations of ``query`` for ``ttl_seconds``."""
+        key = expansion_cache_key(namespace, query, num_queries)
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+        with self._lock:
+            self._store(key, (expires_at, list(queries)))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO expansions (key, queries, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(queries), expires_at),
+                )
+                self._conn.commit()
+
+    def _store(self, key: str, entry: Tuple[float, List[str]]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache: Optional[QueryExpansionCache] = None
+_default_lock = threading.Lock()
+
+
+def query_expansion_cache_from_env() -> QueryExpansionCache:
+    """
+    Process-wide reformulation cache shared by every pipeline (entries are
+    namespaced per tenant). Configured by ``QUERY_EXPANSION_CACHE_TTL``,
+    ``QUERY_EXPANSION_CACHE_SIZE`` and, for persistence,
+    ``QUERY_EXPANSION_CACHE_PATH``.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = QueryExpansionCache(
+                max_entries=int(os.getenv("QUERY_EXPANSION_CACHE_SIZE", "4096")),
+                ttl_seconds=float(os.getenv("QUERY_EXPANSION_CACHE_TTL", "3600")),
+                path=os.getenv("QUERY_EXPANSION_CACHE_PATH") or None,
+            )
+        return _default_cache
@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TYPE_CHECKING
+
+from aimakerspace.structured_logging import get_logger
+
+if TYPE_CHECKING:
+    from aimakerspace import RAGPipeline
+
+log = get_logger("aimakerspace.registry")
+
+
+class PipelineRegistry:
+    """
+    Per-tenant RAG pipelines kept under a memory budget.
+
+    Pipelines are held in least-recently-used order with an estimate of their
+    footprint (a fixed per-pipeline overhead plus vector storage and document
+    and chunk text). When the total exceeds ``max_bytes``, or more than
+    ``max_pipelines`` tenants are resident, the least recently used tenants are
+    evicted. With a ``storage_dir`` they are saved to disk first and
+    memory-mapped back in on their next request; without one their documents
+    are lost, and every such eviction is logged as a warning.
+
+    Requests hold a ``lease`` on their tenant's pipeline while they ingest or
+    query it. Leased pipelines are never evicted, so a tenant is never served
+    by two diverging copies, and a pipeline with no documents is dropped when
+    its last lease ends instead of taking up a slot.
+
+    The embedding and query expansion caches are process-wide and bounded by
+    their own settings, so they are not part of this budget, and an evicted
+    pipeline holds no cache connections of its own to release.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], "RAGPipeline"],
+        max_bytes: int = 0,
+        storage_dir: Optional[str] = None,
+        max_pipelines: int = 0,
+    ):
+        """
+        :param factory: Builds an empty pipeline for an API key
+        :param max_bytes: Memory budget across all tenants (0 = unlimited)
+        :param storage_dir: Where tenants are saved/spilled (None = drop on eviction)
+        :param max_pipelines: Most tenants kept in memory at once (0 = unlimited)
+        """
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.max_pipelines = max_pipelines
+        self.storage_dir = storage_dir
+        self._pipelines: "OrderedDict[str, RAGPipeline]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._leases: Dict[str, int] = {}
+        self._loading: Dict[str, "asyncio.Future[None]"] = {}
+        self._evicting: Dict[str, "asyncio.Future[None]"] = {}
+        self.evictions = 0
+        self.reloads = 0
+        if (max_bytes > 0 or max_pipelines > 0) and not storage_dir:
+            log.warning("registry.no_storage_dir", max_bytes=max_bytes, max_pipelines=max_pipelines)
+
+    def __contains__(self, api_key: str) -> bool:
+        return api_key in self._pipelines
+
+    def __len__(self) -> int:
+        return len(self._pipelines)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def tenant_dir(self, api_key: str) -> Optional[str]:
+        """Directory for a tenant's saved index (named by key hash, never the key itself)"""
+        if not self.storage_dir:
+            return None
+        return os.path.join(self.storage_dir, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+
+    def _is_saved(self, api_key: str) -> bool:
+        index_dir = self.tenant_dir(api_key)
+        return bool(index_dir) and os.path.exists(index_dir)
+
+    def get(self, api_key: str) -> Optional["RAGPipeline"]:
+        """A tenant's pipeline if it is resident or saved on disk, else None"""
+        pipeline = self._pipelines.get(api_key)
+        if pipeline is not None:
+            self._pipelines.move_to_end(api_key)
+            return pipeline
+        if self._is_saved(api_key):
+            return self.get_or_create(api_key)
+        return None
+
+    def get_or_create(self, api_key: str) -> "RAGPipeline":
+        """
+        A tenant's pipeline, reattaching a saved index or creating an empty one.
+        Loads and spills on the calling thread; async callers use ``lease``.
+        """
+        pipeline = self._pipelines.get(api_key)
+        if pipeline is not None:
+            self._pipelines.move_to_end(api_key)
+            return pipeline
+
+        pipeline = self.factory(api_key)
+        index_dir = self.tenant_dir(api_key)
+        if index_dir and pipeline.load(index_dir):
+            self.reloads += 1
+        self._pipelines[api_key] = pipeline
+        self.refresh(api_key)
+        return pipeline
+
+    @asynccontextmanager
+    async def lease(self, api_key: str, create: bool = False) -> AsyncIterator[Optional["RAGPipeline"]]:
+        """
+        Hold a tenant's pipeline for the duration of a request. Saved indexes
+        are reattached on a worker thread, and the pipeline cannot be evicted
+        until the lease ends.
+
+        :param api_key: Tenant to lease
+        :param create: Create an empty pipeline if the tenant has none (else yield None)
+        """
+        pipeline = await self._acquire(api_key, create)
+        try:
+            yield pipeline
+        finally:
+            if pipeline is not None:
+                await self._release(api_key, pipeline)
+
+    async def _acquire(self, api_key: str, create: bool) -> Optional["RAGPipeline"]:
+        while True:
+            pipeline = self._pipelines.get(api_key)
+            if pipeline is not None and api_key not in self._evicting:
+                self._pipelines.move_to_end(api_key)
+                self._leases[api_key] = self._leases.get(api_key, 0) + 1
+                return pipeline
+            # Wait for a spill to finish (then reload what it wrote) or for
+            # another request's reload of the same tenant
+            pending = self._evicting.get(api_key) or self._loading.get(api_key)
+            if pending is not None:
+                await asyncio.shield(pending)
+                continue
+            if not create and not self._is_saved(api_key):
+                return None
+            break
+
+        loading = asyncio.get_running_loop().create_future()
+        self._loading[api_key] = loading
+        try:
+            pipeline = self.factory(api_key)
+            index_dir = self.tenant_dir(api_key)
+            if index_dir and await asyncio.to_thread(pipeline.load, index_dir):
+                self.reloads += 1
+            self._pipelines[api_key] = pipeline
+            self._leases[api_key] = self._leases.get(api_key, 0) + 1
+            self._sizes[api_key] = pipeline.estimate_memory_bytes()
+        finally:
+            del self._loading[api_key]
+            loading.set_result(None)
+        try:
+            await self._aenforce_budget(keep=api_key)
+        except BaseException:
+            await self._release(api_key, pipeline)
+            raise
+        return pipeline
+
+    async def _release(self, api_key: str, pipeline: "RAGPipeline") -> None:
+        remaining = self._leases.get(api_key, 1) - 1
+        if remaining > 0:
+            self._leases[api_key] = remaining
+            return
+        self._leases.pop(api_key, None)
+        if self._pipelines.get(api_key) is not pipeline:
+            return
+        if not pipeline.chunk_store.filenames and not pipeline.saving:
+            self._pipelines.pop(api_key, None)
+            self._sizes.pop(api_key, None)
+            return
+        await self.arefresh(api_key)
+
+    def refresh(self, api_key: str) -> None:
+        """Re-estimate a tenant's footprint after it changed and enforce the budget"""
+        pipeline = self._pipelines.get(api_key)
+        if pipeline is None:
+            return
+        self._sizes[api_key] = pipeline.estimate_memory_bytes()
+        self._enforce_budget(keep=api_key)
+
+    async def arefresh(self, api_key: str) -> None:
+        """Like ``refresh``, but evicted tenants are spilled off the event loop"""
+        pipeline = self._pipelines.get(api_key)
+        if pipeline is None:
+            return
+        self._sizes[api_key] = pipeline.estimate_memory_bytes()
+        await self._aenforce_budget(keep=api_key)
+
+    def persist(self, api_key: str) -> None:
+        """Save a tenant's pipeline if a storage directory is configured"""
+        pipeline = self._pipelines.get(api_key)
+        index_dir = self.tenant_dir(api_key)
+        if pipeline is not None and index_dir:
+            pipeline.save(index_dir)
+
+    def evict(self, api_key: str) -> None:
+        """Drop a tenant from memory, spilling it to disk first when possible"""
+        self._warn_if_lost(api_key)
+        self.persist(api_key)
+        self._drop(api_key)
+
+    async def aevict(self, api_key: str) -> None:
+        """
+        Like ``evict``, but the spill is written on a worker thread. Requests
+        for the tenant wait until it is on disk, then reload it.
+        """
+        self._mark_evicting(api_key)
+        await self._aspill(api_key)
+
+    def _mark_evicting(self, api_key: str) -> None:
+        self._evicting[api_key] = asyncio.get_running_loop().create_future()
+
+    async def _aspill(self, api_key: str) -> None:
+        pipeline = self._pipelines.get(api_key)
+        index_dir = self.tenant_dir(api_key)
+        try:
+            self._warn_if_lost(api_key)
+            if pipeline is not None and index_dir:
+                await pipeline.asave(index_dir)
+            self._drop(api_key)
+        finally:
+            self._evicting.pop(api_key).set_result(None)
+
+    def _warn_if_lost(self, api_key: str) -> None:
+        pipeline = self._pipelines.get(api_key)
+        if pipeline is not None and not self.storage_dir:
+            log.warning(
+                "registry.evicted_without_storage",
+                tenant=pipeline.tenant,
+                documents=len(pipeline.chunk_store.filenames),
+                bytes=self._sizes.get(api_key, 0),
+            )
+
+    def _drop(self, api_key: str) -> None:
+        self._pipelines.pop(api_key, None)
+        self._sizes.pop(api_key, None)
+        self.evictions += 1
+
+    def _victims(self, keep: Optional[str]) -> List[str]:
+        """
+        Least recently used tenants to evict until under budget, never ``keep``,
+        a leased tenant, one already being evicted, or one whose save is still
+        being written
+        """
+        if self.max_bytes <= 0 and self.max_pipelines <= 0:
+            return []
+        remaining = [key for key in self._pipelines if key not in self._evicting]
+        resident_bytes = sum(self._sizes.get(key, 0) for key in remaining)
+        count = len(remaining)
+        victims = []
+        for api_key in remaining:
+            over_bytes = self.max_bytes > 0 and resident_bytes > self.max_bytes
+            over_count = self.max_pipelines > 0 and count > self.max_pipelines
+            if not (over_bytes or over_count):
+                break
+            if api_key == keep or self._leases.get(api_key) or self._pipelines[api_key].saving:
+                continue
+            victims.append(api_key)
+            resident_bytes -= self._sizes.get(api_key, 0)
+            count -= 1
+        return victims
+
+    def _enforce_budget(self, keep: Optional[str] = None) -> None:
+        """Evict least recently used tenants until under budget"""
+        for api_key in self._victims(keep):
+            self.evict(api_key)
+
+    async def _aenforce_budget(self, keep: Optional[str] = None) -> None:
+        """Evict least recently used tenants until under budget, spilling them concurrently"""
+        victims = self._victims(keep)
+        # Marked before the first await so concurrent checks don't pick them again
+        for api_key in victims:
+            self._mark_evicting(api_key)
+        if victims:
+            await asyncio.gather(*(self._aspill(api_key) for api_key in victims))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resident_pipelines": len(self._pipelines),
+            "resident_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_pipelines": self.max_pipelines,
+            "leased_pipelines": len(self._leases),
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,142 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from aimakerspace.ann import normalize_rows
+
+
+class RetrievedContext:
+    """
+    What one retrieval produced: the query embedding, the ranked chunk keys
+    and their text. Passing it on to generation lets the answer cache reuse
+    the embedding instead of computing it again.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        chunk_keys: List[str],
+        chunks: List[str],
+        generation: int,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.query = query
+        self.query_vector = query_vector
+        self.chunk_keys = chunk_keys
+        self.chunks = chunks
+        self.generation = generation  # response cache generation at retrieval time
+        self.sources = sources or []  # per chunk: source filename, page, start/end offsets
+
+
+class SemanticResponseCache:
+    """
+    Answer cache keyed by question meaning rather than exact text.
+
+    A stored answer is reused when a new question's embedding has cosine
+    similarity of at least ``similarity_threshold`` with a cached question,
+    the same model is requested, and retrieval returned the same chunk set
+    (so the answer is grounded in identical context). ``clear`` drops every
+    entry and bumps ``generation`` so answers generated against the old
+    corpus are not stored after the fact.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 256):
+        """
+        :param similarity_threshold: Minimum cosine similarity between questions
+        :param max_entries: Entries kept; the least recently used is replaced
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim) unit vectors
+        self._chunk_sets: List[frozenset] = []
+        self._models: List[str] = []
+        self._answers: List[str] = []
+        self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._vectors is None else self._vectors.nbytes
+
+    def lookup(self, query_vector: Sequence[float], chunk_keys: Sequence[str], model: str) -> Optional[str]:
+        """Cached answer for a near-identical question over the same chunks, or None"""
+        with self._lock:
+            answer = None
+            if self._answers:
+                unit_query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+                scores = self._vectors[: len(self._answers)] @ unit_query
+                chunk_set = frozenset(chunk_keys)
+                for row in np.argsort(-scores):
+                    if scores[row] < self.similarity_threshold:
+                        break
+                    if self._models[row] == model and self._chunk_sets[row] == chunk_set:
+                        self._clock += 1
+                        self._last_used[row] = self._clock
+                        answer = self._answers[row]
+                        break
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def store(
+        self,
+        query_vector: Sequence[float],
+        chunk_keys: Sequence[str],
+        model: str,
+        answer: str,
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Remember an answer. Ignored when ``generation`` is older than the
+        cache's, i.e. the corpus changed while the answer was being generated.
+        """
+        unit_query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, unit_query.shape[0]), dtype=np.float32)
+
+            if len(self._answers) < self.max_entries:
+                row = len(self._answers)
+                self._chunk_sets.append(frozenset(chunk_keys))
+                self._models.append(model)
+                self._answers.append(answer)
+            else:
+                row = int(np.argmin(self._last_used))
+                self._chunk_sets[row] = frozenset(chunk_keys)
+                self._models[row] = model
+                self._answers[row] = answer
+            self._vectors[row] = unit_query
+            self._clock += 1
+            self._last_used[row] = self._clock
+
+    def clear(self) -> None:
+        """Drop every answer (call whenever the corpus changes)"""
+        with self._lock:
+            self._reset()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
@@ -0,0 +1,173 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, Iterable, Optional, TextIO
+
+_sample_rates: Dict[str, float] = {}
+_listener: Optional[logging.handlers.QueueListener] = None
+_configured: Dict[str, logging.Handler] = {}
+_configure_lock = threading.Lock()
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse ``"search.results=0.01,rag.context=0.1"`` into per-event rates"""
+    rates = {}
+    for item in spec.split(","):
+        event, sep, rate = item.partition("=")
+        if sep and event.strip():
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class _EventMessage:
+    """Record message rendered as ``event key=value ...`` only if a plain-text handler asks"""
+
+    __slots__ = ("event", "fields")
+
+    def __init__(self, event: str, fields: Dict[str, Any]):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join([self.event, *(f"{key}={value!r}" for key, value in self.fields.items())])
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event and the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as-is. The stdlib handler formats the message in the
+    calling thread; here all formatting happens on the listener thread, so
+    logging from a request handler costs a level check and a queue put.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class StructuredLogger:
+    """
+    Logs named events with keyword fields, e.g.
+    ``log.debug("search.results", query=query, results=results)``.
+
+    The level check and per-event sampling run before a record is built, so
+    a disabled or unsampled event costs one comparison. Field values are
+    serialized later on the logging thread: pass values that will not be
+    mutated afterwards (strings, numbers, fresh lists), not live state.
+    """
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def enabled_for(self, level: int, event: str) -> bool:
+        """Whether an ``event`` at ``level`` would be emitted (applies sampling)"""
+        if not self.logger.isEnabledFor(level):
+            return False
+        rate = _sample_rates.get(event, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+    def log(self, level: int, event: str, exc_info: bool = False, **fields: Any) -> None:
+        if self.enabled_for(level, event):
+            message = _EventMessage(event, fields)
+            self.logger.log(level, message, exc_info=exc_info, extra={"event": event, "fields": fields})
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        """Log at ERROR with the current exception's traceback"""
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream: Optional[TextIO] = None,
+    loggers: Iterable[str] = ("aimakerspace", "api"),
+) -> None:
+    """
+    Route the given loggers through a queue to a background thread that
+    writes JSON lines to ``stream``. Safe to call again (reconfigures).
+
+    :param level: Minimum level (default ``RAG_LOG_LEVEL`` or INFO)
+    :param sample_rates: Fraction of each event to keep (default parsed from
+        ``RAG_LOG_SAMPLE``, e.g. ``"search.results=0.01"``); unlisted events
+        are always kept
+    :param stream: Destination (default stderr)
+    :param loggers: Logger namespaces to configure
+    """
+    global _listener
+    level = (level or os.getenv("RAG_LOG_LEVEL") or "INFO").upper()
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.getenv("RAG_LOG_SAMPLE", ""))
+
+    with _configure_lock:
+        _stop()
+        _sample_rates.clear()
+        _sample_rates.update(sample_rates)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter())
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+        _listener.start()
+
+        handler = _DeferredQueueHandler(records)
+        for name in loggers:
+            logger = logging.getLogger(name)
+            logger.addHandler(handler)
+            logger.setLevel(level)
+            logger.propagate = False
+            _configured[name] = handler
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the background writer and detach its handlers"""
+    with _configure_lock:
+        _stop()
+
+
+def _stop() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for name, handler in _configured.items():
+        logging.getLogger(name).removeHandler(handler)
+    _configured.clear()
+
+
+atexit.register(shutdown_logging)
@@ -1,6 +1,17 @@
 import os
-from typing import List
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 import io
+import asyncio
+import atexit
+import math
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from aimakerspace.structured_logging import get_logger
 
 try:
     import PyPDF2
@@ -8,6 +19,12 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
 
 class TextFileLoader:
     def __init__(self, path: str, encoding: str = "utf-8"):
@@ -57,10 +74,12 @@ class CharacterTextSplitter:
         self.chunk_overlap = chunk_overlap
 
     def split(self, text: str) -> List[str]:
-        chunks = []
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """``(start, end)`` character offsets of each chunk ``split`` would return"""
         for i in range(0, len(text), self.chunk_size - self.chunk_overlap):
-            chunks.append(text[i : i + self.chunk_size])
-        return chunks
+            yield i, min(i + self.chunk_size, len(text))
 
     def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
@@ -69,24 +88,272 @@ class CharacterTextSplitter:
         return chunks
 
 
+# Rough stand-in for a BPE tokenizer: words and individual punctuation marks
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+log = get_logger("aimakerspace.text")
+_fallback_logged = False
+
+
+def token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Local token counter for ``encoding_name``. Uses tiktoken when it is
+    installed and its encoding is available (it is downloaded once, then
+    cached); otherwise counts words and punctuation marks, which tracks BPE
+    counts for English prose closely enough to size chunks.
+    """
+    global _fallback_logged
+    reason = "tiktoken is not installed"
+    if TIKTOKEN_AVAILABLE:
+        try:
+            encoding = tiktoken.get_encoding(encoding_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as error:
+            reason = f"{type(error).__name__}: {error}"  # e.g. offline on first use
+    if not _fallback_logged:
+        _fallback_logged = True
+        log.warning("tokenizer.fallback", encoding=encoding_name, reason=reason)
+    return lambda text: sum(1 for _ in _APPROXIMATE_TOKEN_PATTERN.finditer(text))
+
+
+class RecursiveTokenTextSplitter:
+    """
+    Splits text on the coarsest natural boundary that fits and sizes chunks
+    in tokens rather than characters.
+
+    Text is cut at paragraph breaks first; any piece still longer than
+    ``chunk_size`` tokens is cut at line breaks, then sentence ends, then
+    spaces, and only as a last resort mid-word. Adjacent pieces are then
+    packed greedily into chunks of at most ``chunk_size`` tokens, repeating
+    up to ``chunk_overlap`` tokens of trailing pieces at the start of the
+    next chunk. Everything is generated lazily, so arbitrarily large texts
+    are split without holding the chunk list in memory.
+    """
+
+    # Boundaries tried in order, coarsest first
+    separators: Sequence[str] = (r"\n\s*\n", r"\n", r"(?<=[.!?])\s+", r"\s+")
+
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        encoding_name: str = "cl100k_base",
+        length_function: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        :param chunk_size: Maximum tokens per chunk
+        :param chunk_overlap: Tokens of context repeated between consecutive chunks
+        :param encoding_name: tiktoken encoding used to count tokens
+        :param length_function: Custom token counter (overrides ``encoding_name``)
+        """
+        assert (
+            chunk_size > chunk_overlap
+        ), "Chunk size must be greater than chunk overlap"
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.count_tokens = length_function or token_counter(encoding_name)
+        self._patterns = [re.compile(separator) for separator in self.separators]
+
+    def split(self, text: str) -> List[str]:
+        return list(self.iter_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """Chunk texts of ``text``, in order"""
+        for start, end in self.iter_spans(text):
+            yield text[start:end]
+
+    def split_texts(self, texts: Iterable[str]) -> Iterator[str]:
+        """Chunks of every text, generated one at a time"""
+        for text in texts:
+            yield from self.iter_chunks(text)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        ``(start, end)`` character offsets of each chunk, trimmed of
+        surrounding whitespace
+        """
+        window: deque = deque()  # (start, end, tokens) of the pieces in the current chunk
+        window_tokens = 0
+        emitted = True  # window holds nothing that has not been emitted yet
+        for piece in self._iter_pieces(text, 0, len(text), 0):
+            if window and window_tokens + piece[2] > self.chunk_size:
+                if not emitted:
+                    span = self._trim(text, window[0][0], window[-1][1])
+                    if span:
+                        yield span
+                    emitted = True
+                # Keep trailing pieces as overlap while they leave room for the new one
+                while window and (
+                    window_tokens > self.chunk_overlap or window_tokens + piece[2] > self.chunk_size
+                ):
+                    window_tokens -= window.popleft()[2]
+            window.append(piece)
+            window_tokens += piece[2]
+            emitted = False
+        if window and not emitted:
+            span = self._trim(text, window[0][0], window[-1][1])
+            if span:
+                yield span
+
+    def _iter_pieces(self, text: str, start: int, end: int, level: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        ``(start, end, tokens)`` of consecutive pieces covering ``text[start:end]``,
+        each at most ``chunk_size`` tokens, cut at the coarsest boundary possible
+        """
+        if level == len(self._patterns):
+            yield from self._iter_hard_pieces(text, start, end)
+            return
+        piece_start = start
+        for match in self._patterns[level].finditer(text, start, end):
+            if match.end() > piece_start:
+                # Separators stay attached to the piece they end, so pieces tile the text
+                yield from self._fit_piece(text, piece_start, match.end(), level)
+                piece_start = match.end()
+        if piece_start < end:
+            yield from self._fit_piece(text, piece_start, end, level)
+
+    def _fit_piece(self, text: str, start: int, end: int, level: int) -> Iterator[Tuple[int, int, int]]:
+        tokens = self.count_tokens(text[start:end])
+        if tokens <= self.chunk_size:
+            yield start, end, tokens
+        else:
+            yield from self._iter_pieces(text, start, end, level + 1)
+
+    def _iter_hard_pieces(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        """Cut a single oversized word into pieces that fit, shrinking by halves"""
+        while start < end:
+            stop = end
+            tokens = self.count_tokens(text[start:stop])
+            while tokens > self.chunk_size and stop - start > 1:
+                stop = start + (stop - start) // 2
+                tokens = self.count_tokens(text[start:stop])
+            yield start, stop, tokens
+            start = stop
+
+    @staticmethod
+    def _trim(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+
+def join_pages(pages: List[str]) -> Tuple[str, List[int]]:
+    """
+    Join page texts the way ``PDFLoader.load_from_bytes`` does and report where
+    each page starts in the result, for mapping character offsets to pages.
+    """
+    joined = "\n".join(pages)
+    text = joined.strip()
+    leading = len(joined) - len(joined.lstrip())
+    page_starts = []
+    position = 0
+    for page in pages:
+        page_starts.append(max(0, position - leading))
+        position += len(page) + 1
+    return text, page_starts
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> List[str]:
+    """Extract pages ``start..stop-1``; module-level so process pool workers can pickle it"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, stop)]
+
+
+# Shared across PDFLoader instances so worker processes are spawned once
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+# Uploads extract on several to_thread workers at once; only one may create the pool
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(max_workers: Optional[int]) -> Tuple[ProcessPoolExecutor, int]:
+    """
+    The shared pool and its worker count. Workers are started with forkserver
+    (spawn where unavailable): the pool is created from a worker thread of a
+    running server, and forking a threaded process can deadlock the child.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _process_pool_workers = max_workers or os.cpu_count() or 1
+            _process_pool = ProcessPoolExecutor(max_workers=_process_pool_workers, mp_context=context)
+        return _process_pool, _process_pool_workers
+
+
+def shutdown_process_pool() -> None:
+    """Stop the shared extraction workers, e.g. at app shutdown (also runs at exit)"""
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_process_pool)
+
+
 class PDFLoader:
     """Loads and extracts text from PDF files"""
     
-    def __init__(self):
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 8):
+        """
+        :param max_workers: Size of the shared extraction process pool (default: CPU count)
+        :param pages_per_task: Fewest pages worth a parallel task; each worker
+            otherwise gets one contiguous range so the PDF is parsed once per worker
+        """
         if not PDF_AVAILABLE:
             raise ImportError("PyPDF2 is required for PDF processing. Install with: pip install PyPDF2")
+        self.max_workers = max_workers
+        self.pages_per_task = pages_per_task
     
-    def load_from_bytes(self, pdf_bytes: bytes) -> str:
-        """Extract text from PDF bytes"""
-        pdf_file = io.BytesIO(pdf_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+    def iter_pages(self, pdf_bytes: bytes, parallel: bool = False) -> Iterator[str]:
+        """
+        Yield the text of each page, in order, as soon as it is extracted.
+        
+        :param pdf_bytes: PDF file content
+        :param parallel: Spread page ranges over a process pool (PyPDF2 parsing
+            is CPU-bound, so threads would not help)
+        """
+        num_pages = len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+        extracted = 0
         
-        text = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text += page.extract_text() + "\n"
+        if parallel and num_pages > self.pages_per_task:
+            try:
+                pool, workers = _get_process_pool(self.max_workers)
+                # Every task re-sends and re-parses the whole PDF, so hand each
+                # worker a single range instead of many small ones
+                size = max(self.pages_per_task, math.ceil(num_pages / workers))
+                starts = list(range(0, num_pages, size))
+                stops = [min(start + size, num_pages) for start in starts]
+                # map() yields ranges in order while later ones are still running
+                for pages in pool.map(_extract_page_range, repeat(pdf_bytes), starts, stops):
+                    extracted += len(pages)
+                    yield from pages
+                return
+            except (OSError, NotImplementedError, RuntimeError):
+                # No usable multiprocessing (e.g. some serverless sandboxes):
+                # finish serially from the first page not yet yielded
+                pass
         
-        return text.strip()
+        yield from _extract_page_range(pdf_bytes, extracted, num_pages)
+    
+    def load_from_bytes(self, pdf_bytes: bytes, parallel: bool = False) -> str:
+        """Extract text from PDF bytes"""
+        return "\n".join(self.iter_pages(pdf_bytes, parallel=parallel)).strip()
+    
+    async def aload_from_bytes(self, pdf_bytes: bytes, parallel: bool = True) -> str:
+        """Extract text from PDF bytes without blocking the event loop"""
+        return await asyncio.to_thread(self.load_from_bytes, pdf_bytes, parallel)
+    
+    async def aload_with_pages(self, pdf_bytes: bytes, parallel: bool = True) -> Tuple[str, List[int]]:
+        """Like ``aload_from_bytes`` but also returns each page's start offset in the text"""
+        pages = await asyncio.to_thread(lambda: list(self.iter_pages(pdf_bytes, parallel=parallel)))
+        return join_pages(pages)
     
     def load_from_file(self, file_path: str) -> str:
         """Extract text from PDF file"""
@@ -1,8 +1,25 @@
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+from collections.abc import Mapping
+from typing import Any, List, Tuple, Callable, Dict, Iterator, Optional, Sequence, Set
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.ann import IVFIndex, normalize_rows
+from aimakerspace.quantization import quantizer_from_state
 import asyncio
+import copy
+import json
+import os
+import sys
+
+# On-disk layout written by VectorDatabase.save
+INDEX_FORMAT_VERSION = 3
+_COLUMN_FILES = {
+    "vectors": "vectors.f32",
+    "norms": "norms.f32",
+    "codes": "codes.bin",
+    "scales": "scales.f32",
+}
+_QUANTIZER_FILE = "quantizer.npz"
+_SIDECAR_FILE = "index.json"
 
 
 def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
@@ -13,25 +30,651 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+# A filter maps metadata fields to a value, a list of accepted values, or a
+# {"gte": ..., "lte": ...} range; rows must match every field
+MetadataFilter = Dict[str, Any]
+
+
+def _unit_vectors(columns: Dict[str, np.ndarray], quantizer, rows: np.ndarray) -> np.ndarray:
+    """Unit vectors for ``rows`` from float32 ``columns``, else decoded from their codes."""
+    if "vectors" not in columns:
+        return quantizer.decode(columns["codes"][rows], columns["scales"][rows])
+    norms = columns["norms"][rows][:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norms > 0, columns["vectors"][rows] / norms, 0.0).astype(np.float32)
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= scores.size:
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class _VectorView(Mapping):
+    """
+    Read-only ``key -> vector`` view over the contiguous matrix so code that
+    treated ``VectorDatabase.vectors`` as a dict keeps working.
+    """
+
+    def __init__(self, db: "VectorDatabase"):
+        self._db = db
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        vector = self._db.retrieve_from_key(key)
+        if vector is None:
+            raise KeyError(key)
+        return vector
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._db._key_to_row))
+
+    def __len__(self) -> int:
+        return len(self._db)
+
+    def clear(self) -> None:
+        self._db.clear()
+
+
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
+    """
+    In-memory vector store backed by contiguous, growable per-row columns.
+
+    By default every row is a float32 vector with its L2 norm computed once at
+    insert time, so a cosine search is one matrix-vector product followed by
+    an ``argpartition`` top-k instead of a Python loop over every key.
+
+    Optional extensions, chosen per instance:
+
+    - ``index``: an ``IVFIndex`` so queries only score rows from the nearest buckets
+    - ``quantizer``: a ``ScalarQuantizer`` (int8) or ``ProductQuantizer`` that
+      stores compact codes instead of float32 vectors and scores them with
+      asymmetric distance computation. With ``keep_originals=True`` the float32
+      vectors are kept as well (ideally memory-mapped from a saved index) so
+      the top ``rerank`` candidates can be re-scored exactly.
+
+    Each row may carry a metadata dict (values are scalars or lists of
+    scalars). Fields are indexed in inverted indexes, so a ``filter`` on
+    ``search`` narrows the rows to score before any similarity is computed.
+
+    Deletes only tombstone rows, which searches then skip. Once tombstones make
+    up ``compaction_threshold`` of the rows, the survivors are compacted into
+    fresh columns (the ANN index keeps its centroids), reclaiming the memory.
+
+    A product quantizer and the ANN index need training (k-means) once enough
+    rows exist. By default ``insert_many`` trains them inline; with
+    ``auto_train=False`` they stay untrained (float32 rows, exact scans) until
+    ``train`` or ``atrain`` is called, the latter fitting on a worker thread.
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        initial_capacity: int = 1024,
+        index: Optional[IVFIndex] = None,
+        quantizer=None,
+        keep_originals: bool = False,
+        rerank: int = 0,
+        compaction_threshold: float = 0.25,
+        auto_train: bool = True,
+    ):
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.initial_capacity = max(1, initial_capacity)
+        self.index = index  # None = exact brute-force search
+        self.quantizer = quantizer  # None = full-precision float32 storage
+        self.keep_originals = keep_originals
+        self.rerank = rerank
+        self.compaction_threshold = compaction_threshold
+        self.auto_train = auto_train
+
+        self._keys: List[str] = []               # row -> key
+        self._key_to_row: Dict[str, int] = {}    # key -> row
+        # Column name -> (capacity, ...) array: "vectors", "norms", "codes", "scales"
+        self._columns: Dict[str, np.ndarray] = {}
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._size = 0                           # rows in use, tombstones included
+        self._tombstones: Set[int] = set()       # deleted rows awaiting compaction
+        self._dead_mask: Optional[np.ndarray] = None
+        self._metadata: Dict[int, Dict[str, Any]] = {}            # row -> metadata
+        self._inverted: Dict[str, Dict[Any, Set[int]]] = {}       # field -> value -> rows
+        # Bumped when rows are renumbered or trained state is replaced; a
+        # background fit started under an older version is discarded
+        self._layout_version = 0
+        self._pending_rows: Optional[Set[int]] = None  # rows written while atrain() fits
+
+        self.vectors = _VectorView(self)
+
+    def __len__(self) -> int:
+        return self._size - len(self._tombstones)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_to_row
+
+    @property
+    def dim(self) -> Optional[int]:
+        """Embedding dimensionality, or None until the first insert."""
+        return self._dim
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the row storage (keys and index structures excluded)."""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Approximate heap footprint: in-RAM columns plus the key strings and
+        lookup tables. Memory-mapped columns are excluded because the OS can
+        drop their pages at any time.
+        """
+        columns = sum(
+            column.nbytes for column in self._columns.values() if not isinstance(column, np.memmap)
+        )
+        keys = sum(sys.getsizeof(key) for key in self._keys)
+        tables = sys.getsizeof(self._keys) + sys.getsizeof(self._key_to_row) + sys.getsizeof(self._tombstones)
+        # Rough per-row cost of a metadata dict plus its inverted index postings
+        metadata = 400 * len(self._metadata)
+        return columns + keys + tables + metadata
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        The ``(len(self), dim)`` vectors: the stored float32 rows, or unit
+        vectors decoded from the quantized codes when no originals are kept.
+        """
+        if len(self) == 0:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        if self._tombstones:
+            rows = self._live_rows()
+            return self._columns["vectors"][rows] if self._has_originals() else self._decode(rows)
+        if self._has_originals():
+            return self._columns["vectors"][: self._size]
+        return self._decode(np.arange(self._size))
+
+    def _has_originals(self) -> bool:
+        return "vectors" in self._columns
+
+    def _has_codes(self) -> bool:
+        return "codes" in self._columns
+
+    def _column_spec(self, name: str) -> Tuple[tuple, type]:
+        """Per-row shape and dtype of a storage column."""
+        if name == "vectors":
+            return (self._dim,), np.float32
+        if name == "codes":
+            return (self.quantizer.code_size(self._dim),), self.quantizer.code_dtype
+        return (), np.float32
+
+    def _wanted_columns(self) -> List[str]:
+        """Columns a fresh store should allocate given the quantizer's state."""
+        quantized = self.quantizer is not None and self.quantizer.trained
+        columns = ["norms"]
+        if not quantized or self.keep_originals:
+            columns.append("vectors")
+        if quantized:
+            columns.extend(["codes", "scales"])
+        return columns
+
+    def _ensure_capacity(self, extra_rows: int, dim: int) -> None:
+        """Allocate or grow (by doubling) every column to fit ``extra_rows`` more rows."""
+        if self._dim is None:
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(
+                f"Vector dimension {dim} does not match database dimension {self._dim}"
+            )
+        if not self._columns:
+            for name in self._wanted_columns():
+                shape, dtype = self._column_spec(name)
+                self._columns[name] = np.zeros((0,) + shape, dtype=dtype)
+            self._capacity = 0
+
+        needed = self._size + extra_rows
+        # A memory-mapped index is read-only; the first write copies it into RAM
+        writeable = all(column.flags.writeable for column in self._columns.values())
+        if needed <= self._capacity and writeable:
+            return
+        capacity = max(self._capacity, self.initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+
+        for name, column in self._columns.items():
+            shape, dtype = self._column_spec(name)
+            grown = np.zeros((capacity,) + shape, dtype=dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
 
     def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+        self.insert_many([key], [vector])
+
+    def insert_many(
+        self,
+        keys: Sequence[str],
+        vectors: Sequence[np.array],
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """
+        Insert several vectors at once. Re-inserting an existing key overwrites
+        its row in place, matching the old dict semantics.
+
+        :param keys: One key per vector
+        :param vectors: Sequence of vectors or a 2-D array
+        :param metadata: Optional metadata dict per vector (kept as-is when None)
+        """
+        if len(keys) == 0:
+            return
+        block = np.asarray(vectors, dtype=np.float32)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        if block.shape[0] != len(keys):
+            raise ValueError("keys and vectors must have the same length")
+
+        self._ensure_capacity(len(keys), block.shape[1])
+
+        rows = []
+        for key in keys:
+            row = self._key_to_row.get(key)
+            if row is None:
+                row = self._size
+                self._key_to_row[key] = row
+                self._keys.append(key)
+                self._size += 1
+            rows.append(row)
+        rows = np.asarray(rows, dtype=np.int64)
+
+        self._columns["norms"][rows] = np.linalg.norm(block, axis=1)
+        if self._has_originals():
+            self._columns["vectors"][rows] = block
+        if self._has_codes():
+            codes, scales = self.quantizer.encode(normalize_rows(block))
+            self._columns["codes"][rows] = codes
+            self._columns["scales"][rows] = scales
+
+        if metadata is not None:
+            for key, row_metadata in zip(keys, metadata):
+                self.set_metadata(key, row_metadata)
+
+        if self._pending_rows is not None:
+            self._pending_rows.update(rows.tolist())
+        if self.auto_train and self.needs_training:
+            self.train()
+        elif self.index is not None and self.index.trained:
+            self.index.add(rows, self._unit_rows(rows))
+
+    def set_metadata(self, key: str, metadata: Optional[Dict[str, Any]]) -> None:
+        """Replace the metadata of ``key`` (None removes it) and update the inverted indexes."""
+        row = self._key_to_row.get(key)
+        if row is None:
+            raise KeyError(key)
+        self._unindex_metadata(row)
+        if metadata:
+            self._metadata[row] = dict(metadata)
+            self._index_metadata(row)
+
+    def get_metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._key_to_row.get(key)
+        return None if row is None else self._metadata.get(row)
+
+    @staticmethod
+    def _metadata_values(value: Any) -> List[Any]:
+        return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+    def _index_metadata(self, row: int) -> None:
+        for field, value in self._metadata.get(row, {}).items():
+            postings = self._inverted.setdefault(field, {})
+            for item in self._metadata_values(value):
+                postings.setdefault(item, set()).add(row)
+
+    def _unindex_metadata(self, row: int) -> None:
+        for field, value in self._metadata.pop(row, {}).items():
+            postings = self._inverted.get(field, {})
+            for item in self._metadata_values(value):
+                rows = postings.get(item)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del postings[item]
+
+    def filter_rows(self, filter: MetadataFilter) -> np.ndarray:
+        """
+        Sorted row ids matching every field of ``filter``, resolved from the
+        inverted indexes without touching any vectors.
+        """
+        matched: Optional[Set[int]] = None
+        for field, wanted in filter.items():
+            postings = self._inverted.get(field, {})
+            rows: Set[int] = set()
+            if isinstance(wanted, dict):
+                low, high = wanted.get("gte"), wanted.get("lte")
+                for value, value_rows in postings.items():
+                    try:
+                        in_range = (low is None or value >= low) and (high is None or value <= high)
+                    except TypeError:
+                        continue  # value of another type, e.g. a string in a numeric field
+                    if in_range:
+                        rows |= value_rows
+            else:
+                for value in self._metadata_values(wanted):
+                    rows |= postings.get(value, set())
+            matched = rows if matched is None else matched & rows
+            if not matched:
+                break
+        if matched is None:
+            return np.arange(self._size)
+        return np.fromiter(sorted(matched), dtype=np.int64, count=len(matched))
+
+    def filter_keys(self, filter: MetadataFilter) -> List[str]:
+        """Keys of the live rows matching ``filter`` (see ``filter_rows``)"""
+        if not filter:
+            return list(self._key_to_row)
+        return [self._keys[row] for row in self.filter_rows(filter).tolist() if self._keys[row] in self._key_to_row]
+
+    def _quantizer_due(self) -> bool:
+        """A quantizer without codes yet that is trained, or has the rows to train on."""
+        if self.quantizer is None or self._has_codes() or self._size == 0:
+            return False
+        return self.quantizer.trained or self._size >= self.quantizer.min_train_size
+
+    @property
+    def needs_training(self) -> bool:
+        """Whether ``train`` has work to do (quantizer codes or ANN index (re)training)."""
+        return self._quantizer_due() or (self.index is not None and self.index.needs_training(self._size))
+
+    def train(self) -> None:
+        """
+        Train what is due now, on the calling thread: fit the quantizer and
+        encode every row (dropping the float32 vectors unless originals are
+        kept), and (re)build the ANN index.
+        """
+        fit = self._fit_job()
+        if fit is not None:
+            self._apply_fit(fit(), self._layout_version)
+
+    async def atrain(self) -> bool:
+        """
+        Like ``train`` but k-means and encoding run on a worker thread, so the
+        event loop keeps serving searches (exact, or with the previous index)
+        and inserts meanwhile. Rows written during the fit are encoded and
+        assigned when its result is installed. If the rows are renumbered
+        first (compaction, clear), the result is dropped and training stays due.
+
+        :return: True if a fit was installed
+        """
+        if self._pending_rows is not None:
+            return False  # another fit is running
+        fit = self._fit_job()
+        if fit is None:
+            return False
+        version = self._layout_version
+        self._pending_rows = set()
+        try:
+            result = await asyncio.to_thread(fit)
+        finally:
+            pending, self._pending_rows = self._pending_rows, None
+        return self._apply_fit(result, version, pending)
+
+    def _fit_job(self) -> Optional[Callable[[], Dict[str, Any]]]:
+        """
+        Capture what training needs and return a function that does the
+        expensive part without touching the database (so it can run on a
+        worker thread), or None when nothing is due.
+        """
+        fit_quantizer = self._quantizer_due()
+        fit_index = self.index is not None and self.index.needs_training(self._size)
+        if not (fit_quantizer or fit_index):
+            return None
+        size = self._size
+        columns = dict(self._columns)
+        quantizer = copy.deepcopy(self.quantizer) if fit_quantizer else self.quantizer
+        index = self.index
+
+        def fit() -> Dict[str, Any]:
+            units = _unit_vectors(columns, quantizer, np.arange(size))
+            result: Dict[str, Any] = {"size": size}
+            if fit_quantizer:
+                if not quantizer.trained:
+                    quantizer.train(units)
+                result["quantizer"] = quantizer
+                result["codes"] = quantizer.encode(units)
+            if fit_index:
+                result["buckets"] = index.fit(units)
+            return result
+
+        return fit
+
+    def _apply_fit(self, result: Dict[str, Any], version: int, pending: Set[int] = frozenset()) -> bool:
+        """Install a ``_fit_job`` result, catching up on rows written since it was captured."""
+        if version != self._layout_version:
+            return False
+        self._layout_version += 1
+        size = result["size"]
+        changed = np.union1d(np.fromiter(pending, dtype=np.int64, count=len(pending)), np.arange(size, self._size))
+
+        if "quantizer" in result and not self._has_codes():
+            self.quantizer = result["quantizer"]
+            for name, data in zip(("codes", "scales"), result["codes"]):
+                shape, dtype = self._column_spec(name)
+                column = np.zeros((self._capacity,) + shape, dtype=dtype)
+                column[:size] = data
+                self._columns[name] = column
+            if changed.size:
+                codes, scales = self.quantizer.encode(self._unit_rows(changed))
+                self._columns["codes"][changed] = codes
+                self._columns["scales"][changed] = scales
+            if not self.keep_originals:
+                del self._columns["vectors"]
+
+        if "buckets" in result:
+            self.index.set_buckets(*result["buckets"])
+            if changed.size:
+                self.index.add(changed, self._unit_rows(changed))
+        return True
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        """Approximate unit vectors for ``rows`` reconstructed from their codes."""
+        return self.quantizer.decode(self._columns["codes"][rows], self._columns["scales"][rows])
+
+    def _unit_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Stored vectors for ``rows`` scaled to unit length."""
+        return _unit_vectors(self._columns, self.quantizer, rows)
+
+    def delete(self, keys: Sequence[str]) -> int:
+        """
+        Remove ``keys`` (unknown keys are ignored). Rows are tombstoned so the
+        delete itself is O(len(keys)); storage is compacted once tombstones
+        reach ``compaction_threshold`` of the rows.
+
+        :return: Number of rows removed
+        """
+        removed = 0
+        for key in set(keys):
+            row = self._key_to_row.pop(key, None)
+            if row is not None:
+                self._tombstones.add(row)
+                self._unindex_metadata(row)
+                removed += 1
+        if removed:
+            self._dead_mask = None
+            if len(self._tombstones) >= self.compaction_threshold * self._size:
+                self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """
+        Drop tombstoned rows: copy the survivors into right-sized columns and
+        rebuild the ANN index over them.
+        """
+        if not self._tombstones:
+            return
+        survivors = self._live_rows()
+        if survivors.size == 0:
+            self.clear()
+            return
+
+        capacity = max(self.initial_capacity, survivors.size)
+        for name, column in self._columns.items():
+            shape, dtype = self._column_spec(name)
+            compacted = np.zeros((capacity,) + shape, dtype=dtype)
+            compacted[: survivors.size] = column[survivors]
+            self._columns[name] = compacted
+        self._capacity = capacity
+        self._keys = [self._keys[row] for row in survivors.tolist()]
+        self._key_to_row = {key: row for row, key in enumerate(self._keys)}
+        self._metadata = {
+            new_row: self._metadata[old_row]
+            for new_row, old_row in enumerate(survivors.tolist())
+            if old_row in self._metadata
+        }
+        self._rebuild_inverted()
+        self._size = survivors.size
+        self._tombstones = set()
+        self._dead_mask = None
+        self._layout_version += 1
+
+        if self.index is not None:
+            self.index.compact(survivors)
+
+    def _rebuild_inverted(self) -> None:
+        self._inverted = {}
+        for row in self._metadata:
+            self._index_metadata(row)
+
+    def _live_rows(self) -> np.ndarray:
+        """Row ids that are not tombstoned, in row order."""
+        if not self._tombstones:
+            return np.arange(self._size)
+        return np.flatnonzero(~self._tombstone_mask())
+
+    def _tombstone_mask(self) -> Optional[np.ndarray]:
+        """Boolean ``(size,)`` mask of deleted rows, or None when nothing is deleted."""
+        if not self._tombstones:
+            return None
+        if self._dead_mask is None or self._dead_mask.size != self._size:
+            mask = np.zeros(self._size, dtype=bool)
+            mask[list(self._tombstones)] = True
+            self._dead_mask = mask
+        return self._dead_mask
+
+    def clear(self) -> None:
+        """Drop every vector and release the storage columns."""
+        self._keys = []
+        self._key_to_row = {}
+        self._columns = {}
+        self._dim = None
+        self._capacity = 0
+        self._size = 0
+        self._tombstones = set()
+        self._dead_mask = None
+        self._metadata = {}
+        self._inverted = {}
+        self._layout_version += 1
+        if self.index is not None:
+            self.index.reset()
+
+    def _score_rows(self, unit_queries: np.ndarray, rows: Optional[np.ndarray], use_codes: bool) -> np.ndarray:
+        """
+        ``(num_queries, num_rows)`` cosine similarities for unit queries against
+        ``rows`` (every row when None), from the codes or the float32 vectors.
+        """
+        if use_codes:
+            codes = self._columns["codes"][: self._size]
+            scales = self._columns["scales"][: self._size]
+            if rows is not None:
+                codes, scales = codes[rows], scales[rows]
+            return self.quantizer.score(unit_queries, codes, scales)
+
+        vectors = self._columns["vectors"][: self._size]
+        norms = self._columns["norms"][: self._size]
+        if rows is not None:
+            vectors, norms = vectors[rows], norms[rows]
+        dots = unit_queries @ vectors.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(norms > 0, dots / norms, 0.0)
+
+    def _rank(
+        self,
+        unit_query: np.ndarray,
+        rows: Optional[np.ndarray],
+        k: int,
+        exact: bool,
+        rerank: Optional[int],
+    ) -> List[Tuple[str, float]]:
+        """Top-k among ``rows`` (all when None), re-ranking quantized scores if asked."""
+        use_codes = self._has_codes() and not (exact and self._has_originals())
+        scores = self._score_rows(unit_query[None, :], rows, use_codes)[0]
+        dead = self._tombstone_mask()
+        if dead is not None:
+            scores[dead if rows is None else dead[rows]] = -np.inf
+
+        rerank = self.rerank if rerank is None else rerank
+        if use_codes and rerank and self._has_originals():
+            shortlist = _top_k_indices(scores, max(rerank, k))
+            rows = shortlist if rows is None else rows[shortlist]
+            scores = self._score_rows(unit_query[None, :], rows, use_codes=False)[0]
+
+        top = _top_k_indices(scores, k)
+        row_ids = top if rows is None else rows[top]
+        return [
+            (self._keys[row], float(scores[i]))
+            for row, i in zip(row_ids.tolist(), top.tolist())
+            if row not in self._tombstones
+        ]
+
+    def _ann_candidates(self, unit_query: np.ndarray, nprobe: Optional[int] = None) -> Optional[np.ndarray]:
+        """Candidate rows from the ANN index, or None to scan everything."""
+        if self.index is None or not unit_query.any():
+            return None
+        return self.index.candidates(unit_query, nprobe=nprobe)
 
     def search(
         self,
         query_vector: np.array,
         k: int,
         distance_measure: Callable = cosine_similarity,
+        exact: bool = False,
+        nprobe: Optional[int] = None,
+        rerank: Optional[int] = None,
+        filter: Optional[MetadataFilter] = None,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        """
+        Top-k keys by similarity to ``query_vector``.
+
+        :param exact: Scan every row, using float32 vectors when they are stored
+        :param nprobe: Override the index's ``nprobe`` for this query
+        :param rerank: Override how many quantized candidates are re-scored exactly
+        :param filter: Only consider rows whose metadata matches (see ``filter_rows``)
+        """
+        if len(self) == 0:
+            return []
+
+        allowed = None if not filter else self.filter_rows(filter)
+        if allowed is not None and allowed.size == 0:
+            return []
+
+        if distance_measure is not cosine_similarity:
+            # Custom measures cannot be vectorized, so score row by row
+            keys = self.vectors if allowed is None else [self._keys[row] for row in allowed.tolist()]
+            scores = [
+                (key, distance_measure(query_vector, self.retrieve_from_key(key)))
+                for key in keys
+                if key in self._key_to_row
+            ]
+            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+
+        unit_query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        candidates = None if exact else self._ann_candidates(unit_query, nprobe)
+        if allowed is not None:
+            if candidates is not None:
+                probed = np.intersect1d(candidates, allowed, assume_unique=True)
+                # A selective filter may miss the probed buckets: scan its rows instead
+                candidates = probed if probed.size >= k else allowed
+            else:
+                candidates = allowed
+        return self._rank(unit_query, candidates, k, exact, rerank)
 
     def search_by_text(
         self,
@@ -39,18 +682,264 @@ class VectorDatabase:
         k: int,
         distance_measure: Callable = cosine_similarity,
         return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
     ) -> List[Tuple[str, float]]:
         query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        results = self.search(query_vector, k, distance_measure, filter=filter)
+        return [result[0] for result in results] if return_as_text else results
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Callable = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[Tuple[str, float]]:
+        """Like ``search_by_text`` but awaits the embedding call instead of blocking."""
+        query_vector = await self.embedding_model.async_get_embedding(query_text)
+        results = self.search(query_vector, k, distance_measure, filter=filter)
         return [result[0] for result in results] if return_as_text else results
 
+    def search_many(
+        self,
+        query_vectors: Sequence[np.array],
+        k: int,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Cosine top-k for several queries with a single scan of the corpus.
+
+        :param query_vectors: Sequence of query vectors or a 2-D array
+        :param k: Number of results per query
+        :param filter: Only consider rows whose metadata matches
+        :return: One ranked ``[(key, score), ...]`` list per query, in input order
+        """
+        if len(query_vectors) == 0:
+            return []
+        if len(self) == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        use_codes = self._has_codes()
+        reranking = use_codes and self.rerank and self._has_originals()
+        if (self.index is not None and self.index.trained) or reranking:
+            # Each query probes different buckets / shortlists, so rank them one by one
+            return [self.search(query, k, filter=filter) for query in query_vectors]
+
+        rows = None if not filter else self.filter_rows(filter)
+        unit_queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        scores = self._score_rows(unit_queries, rows, use_codes)
+        dead = self._tombstone_mask()
+        if dead is not None:
+            scores[:, dead if rows is None else dead[rows]] = -np.inf
+        row_ids = np.arange(self._size) if rows is None else rows
+        return [
+            [
+                (self._keys[row], float(scores_row[i]))
+                for i, row in ((i, int(row_ids[i])) for i in _top_k_indices(scores_row, k).tolist())
+                if row not in self._tombstones
+            ]
+            for scores_row in scores
+        ]
+
+    def search_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Embed all queries in one batch request, then rank them with ``search_many``.
+        """
+        if not query_texts:
+            return []
+        query_vectors = self.embedding_model.get_embeddings(query_texts)
+        results = self.search_many(query_vectors, k, filter=filter)
+        if return_as_text:
+            return [[key for key, _score in ranking] for ranking in results]
+        return results
+
+    async def asearch_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        return_as_text: bool = False,
+        filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Like ``search_by_texts`` but awaits the batched embedding call."""
+        if not query_texts:
+            return []
+        query_vectors = await self.embedding_model.async_get_embeddings(query_texts)
+        results = self.search_many(query_vectors, k, filter=filter)
+        if return_as_text:
+            return [[key for key, _score in ranking] for ranking in results]
+        return results
+
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        """
+        The stored vector for ``key``. Quantized rows without originals are
+        decoded and rescaled to their original norm, so they are approximate.
+        """
+        row = self._key_to_row.get(key)
+        if row is None:
+            return None
+        if self._has_originals():
+            return self._columns["vectors"][row]
+        return self._decode(np.array([row]))[0] * self._columns["norms"][row]
+
+    def save(self, directory: str) -> None:
+        """
+        Persist the index as one raw binary file per storage column plus a JSON
+        sidecar holding the keys (and quantizer codebooks in an ``.npz``). The
+        sidecar is written last so a crash mid-save never leaves a readable but
+        inconsistent index behind. Only live rows are written; the database
+        itself is left untouched (tombstones stay until the next ``compact``).
+
+        :param directory: Target directory, created if missing
+        """
+        self.snapshot()(directory)
+
+    def snapshot(self) -> Callable[[str], None]:
+        """
+        Capture what ``save`` would write and return a ``write(directory)``
+        function for it, so the files can be written on a worker thread while
+        the database keeps serving.
+
+        Only the key and metadata lists and references to the current columns
+        are taken here. Compaction, growth and quantizer training replace
+        columns instead of modifying them, and new rows land past the
+        captured ones, so later inserts and deletes do not leak into the
+        snapshot. Re-inserting an existing key does write its row in place,
+        which is harmless for content-addressed keys (same key, same vector).
+        """
+        compacted = bool(self._tombstones)
+        rows = self._live_rows()
+        count = int(rows.size)
+        columns = dict(self._columns)
+        keys = [self._keys[row] for row in rows.tolist()]
+        metadata = [self._metadata.get(row) for row in rows.tolist()]
+        quantizer = arrays = None
+        if self.quantizer is not None:
+            quantizer, arrays = self.quantizer.state(), self.quantizer.arrays()
+        sidecar = {
+            "version": INDEX_FORMAT_VERSION,
+            "dim": self.dim,
+            "count": count,
+            "columns": {name: np.dtype(column.dtype).name for name, column in columns.items()},
+            "quantizer": quantizer,
+            "keys": keys,
+            "metadata": metadata,
+            "keep_originals": self.keep_originals,
+            "compaction_threshold": self.compaction_threshold,
+        }
+
+        def write(directory: str) -> None:
+            os.makedirs(directory, exist_ok=True)
+
+            def write_atomic(name: str, write_file) -> None:
+                path = os.path.join(directory, name)
+                tmp_path = f"{path}.tmp"
+                write_file(tmp_path)
+                os.replace(tmp_path, path)
+
+            for name, column in columns.items():
+                data = column[rows] if compacted else column[:count]
+                write_atomic(_COLUMN_FILES[name], lambda path: data.tofile(path))
+
+            if quantizer is not None:
+                def write_quantizer(path: str) -> None:
+                    with open(path, "wb") as f:
+                        np.savez(f, **arrays)
+
+                write_atomic(_QUANTIZER_FILE, write_quantizer)
+
+            def write_sidecar(path: str) -> None:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(sidecar, f)
+
+            write_atomic(_SIDECAR_FILE, write_sidecar)
+
+        return write
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+        index: Optional[IVFIndex] = None,
+        rerank: int = 0,
+        auto_train: bool = True,
+    ) -> "VectorDatabase":
+        """
+        Open an index written by ``save``.
+
+        With ``mmap=True`` every column is memory-mapped read-only, so opening
+        is O(number of keys) and rows are paged in lazily on first search. Any
+        later insert copies the columns into memory. For a quantized index with
+        originals this keeps only the compact codes hot; the float32 vectors are
+        read from disk just for re-ranking.
+
+        :param directory: Directory passed to ``save``
+        :param embedding_model: Embedding model for ``search_by_text``
+        :param mmap: Memory-map the columns instead of reading them eagerly
+        :param index: Optional ANN index, rebuilt from the loaded vectors
+        :param rerank: Quantized candidates to re-score exactly per query
+        :param auto_train: Train the index (and a quantizer saved before it had
+            enough rows) while loading; with False, call ``train``/``atrain``
+        """
+        with open(os.path.join(directory, _SIDECAR_FILE), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        version = sidecar.get("version")
+        if version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format version: {version}")
+
+        quantizer = None
+        if sidecar.get("quantizer"):
+            with np.load(os.path.join(directory, _QUANTIZER_FILE)) as arrays:
+                quantizer = quantizer_from_state(sidecar["quantizer"], dict(arrays))
+
+        columns = sidecar["columns"]
+        db = cls(
+            embedding_model=embedding_model,
+            index=index,
+            quantizer=quantizer,
+            keep_originals=sidecar["keep_originals"],
+            rerank=rerank,
+            compaction_threshold=sidecar["compaction_threshold"],
+            auto_train=auto_train,
+        )
+        count, dim = sidecar["count"], sidecar["dim"]
+        if count == 0:
+            return db
+
+        db._dim = dim
+        for name, dtype in columns.items():
+            shape, _ = db._column_spec(name)
+            path = os.path.join(directory, _COLUMN_FILES[name])
+            if mmap:
+                db._columns[name] = np.memmap(path, dtype=dtype, mode="r", shape=(count,) + shape)
+            else:
+                db._columns[name] = np.fromfile(path, dtype=dtype).reshape((count,) + shape)
+
+        db._keys = list(sidecar["keys"])
+        db._key_to_row = {key: row for row, key in enumerate(db._keys)}
+        db._metadata = {
+            row: metadata for row, metadata in enumerate(sidecar["metadata"]) if metadata
+        }
+        db._rebuild_inverted()
+        db._capacity = count
+        db._size = count
+        if db.index is not None:
+            db.index.reset()
+        if db.auto_train and db.needs_training:
+            db.train()
+        return db
 
     async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        self.insert_many(list_of_text, embeddings)
         return self
 
 
@@ -1,4 +1,5 @@
 from typing import List, Optional
+import asyncio
 import os
 
 try:
@@ -52,4 +53,8 @@ class TavilySearch:
             # Fail softly: treat web search as optional context
             return []
 
-
+    async def asearch_snippets(self, query: str, max_results: int = 3) -> List[str]:
+        """Async variant of ``search_snippets``; the blocking HTTP call runs in a worker thread."""
+        if not self.enabled or self._client is None:
+            return []
+        return await asyncio.to_thread(self.search_snippets, query, max_results)
@@ -1,18 +1,38 @@
 # Import required FastAPI components for building the API
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 # Import Pydantic for data validation and settings management
 from pydantic import BaseModel
-# Import OpenAI client for interacting with OpenAI's API
-from openai import OpenAI
 import os
 import sys
-from typing import Optional, List, Dict
+import json
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Optional, List, Dict, AsyncIterator
 
 # Add the parent directory to Python path to import aimakerspace
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from aimakerspace import RAGPipeline
+from aimakerspace import (
+    RAGPipeline,
+    PipelineRegistry,
+    RetrievedContext,
+    RecursiveTokenTextSplitter,
+    quantizer_from_name,
+    get_async_client,
+    aclose_clients,
+    metrics_from_env,
+    tenant_label,
+    configure_logging,
+    get_logger,
+    shutdown_logging,
+    shutdown_process_pool,
+)
+
+# JSON-lines logs written off the request path (RAG_LOG_LEVEL, RAG_LOG_SAMPLE)
+configure_logging()
+log = get_logger("api")
 
 # Initialize FastAPI application with a title
 app = FastAPI(title="OpenAI Chat API with RAG")
@@ -27,8 +47,26 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers in requests
 )
 
-# In-memory storage for RAG pipelines (keyed by API key for simple isolation)
-rag_pipelines: Dict[str, RAGPipeline] = {}
+# Optional directory for persisting each tenant's index across restarts
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR")
+
+# Memory budget for resident tenant pipelines (0 = unlimited)
+RAG_MEMORY_BUDGET_MB = int(os.getenv("RAG_MEMORY_BUDGET_MB", "1024"))
+
+# Most tenant pipelines kept in memory at once (0 = unlimited)
+RAG_MAX_TENANTS = int(os.getenv("RAG_MAX_TENANTS", "1000"))
+
+# Optional vector compression ("int8" or "pq") and exact re-rank depth
+RAG_VECTOR_QUANTIZATION = os.getenv("RAG_VECTOR_QUANTIZATION")
+RAG_RERANK = int(os.getenv("RAG_RERANK", "0"))
+
+# Optional token-sized chunking on paragraph/sentence/word boundaries
+# (chunks are 1000 characters with 200 overlap when unset)
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "0"))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", str(RAG_CHUNK_TOKENS // 8)))
+
+# Stage timings and per-tenant usage for /api/metrics (enabled by RAG_METRICS=1)
+metrics = metrics_from_env()
 
 # Define the data model for chat requests using Pydantic
 # This ensures incoming request data is properly validated
@@ -45,6 +83,8 @@ class RAGChatRequest(BaseModel):
     model: Optional[str] = "gpt-4.1-mini"   # Model name
     api_key: str                             # OpenAI API key
     k: Optional[int] = 3                     # Number of chunks to retrieve
+    stream: Optional[bool] = False           # Stream sources + tokens instead of one JSON body
+    document_filter: Optional[Dict[str, Any]] = None  # e.g. {"filename": ["a.pdf"]} or {"tag": "contracts"}
 
 class FusionChatRequest(BaseModel):
     user_message: str                        # User question
@@ -54,19 +94,84 @@ class FusionChatRequest(BaseModel):
     num_queries: Optional[int] = 4           # Number of query reformulations
     include_web: Optional[bool] = False      # Include Tavily web snippets
     web_results: Optional[int] = 3           # How many web snippets to include
+    stream: Optional[bool] = False           # Stream sources + tokens instead of one JSON body
+    document_filter: Optional[Dict[str, Any]] = None  # Restrict retrieval by filename/page/uploaded_at/tag
 
-def get_or_create_rag_pipeline(api_key: str) -> RAGPipeline:
-    """Get existing RAG pipeline or create new one for the API key"""
-    if api_key not in rag_pipelines:
-        rag_pipelines[api_key] = RAGPipeline(api_key)
-    return rag_pipelines[api_key]
+def create_rag_pipeline(api_key: str) -> RAGPipeline:
+    """Build an empty RAG pipeline with the configured storage options"""
+    return RAGPipeline(
+        api_key,
+        vector_quantizer=quantizer_from_name(RAG_VECTOR_QUANTIZATION),
+        rerank=RAG_RERANK,
+        text_splitter=RecursiveTokenTextSplitter(RAG_CHUNK_TOKENS, RAG_CHUNK_OVERLAP_TOKENS) if RAG_CHUNK_TOKENS else None,
+    )
+
+# RAG pipelines keyed by API key for simple isolation; least recently used
+# tenants are evicted (spilled to RAG_INDEX_DIR when set) over the budget,
+# but never while a request holds a lease on them
+rag_pipelines = PipelineRegistry(
+    create_rag_pipeline,
+    max_bytes=RAG_MEMORY_BUDGET_MB * 1024 * 1024,
+    storage_dir=RAG_INDEX_DIR,
+    max_pipelines=RAG_MAX_TENANTS,
+)
+
+async def lease_rag_pipeline(stack: AsyncExitStack, api_key: str, create: bool = False) -> Optional[RAGPipeline]:
+    """
+    Lease a tenant's pipeline until ``stack`` closes: the resident one, a saved
+    one reattached off the event loop, or (with ``create``) a new empty one.
+    Returns None when the tenant has no documents and ``create`` is False.
+    """
+    return await stack.enter_async_context(rag_pipelines.lease(api_key, create=create))
+
+def stream_rag_answer(
+    rag_pipeline: RAGPipeline,
+    query: str,
+    context_chunks: List[str],
+    model: str,
+    metadata: Dict,
+    retrieval: Optional[RetrievedContext] = None,
+    lease: Optional[AsyncExitStack] = None,
+) -> StreamingResponse:
+    """
+    Stream a RAG answer: the first line is a JSON object with the retrieved
+    source metadata, every byte after that newline is answer text. ``lease``
+    keeps the tenant's pipeline pinned until the last token is sent.
+    """
+    async def generate() -> AsyncIterator[str]:
+        try:
+            yield json.dumps(metadata) + "\n"
+            try:
+                async for token in rag_pipeline.astream_rag_response(
+                    query, context_chunks, model=model, retrieval=retrieval
+                ):
+                    yield token
+            except Exception as e:
+                yield f"Error: {str(e)}"
+        finally:
+            if lease is not None:
+                await lease.aclose()
+
+    return StreamingResponse(generate(), media_type="text/plain")
+
+async def persist_rag_pipeline(api_key: str, rag_pipeline: RAGPipeline) -> None:
+    """
+    Save a tenant's pipeline if persistence is enabled (the files are written
+    off the event loop, one save per tenant at a time) and re-check the
+    memory budget
+    """
+    index_dir = rag_pipelines.tenant_dir(api_key)
+    if index_dir:
+        await rag_pipeline.asave(index_dir)
+    await rag_pipelines.arefresh(api_key)
 
 # Define the main chat endpoint that handles POST requests
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     try:
-        # Initialize OpenAI client with the provided API key
-        client = OpenAI(api_key=request.api_key)
+        # Shared, connection-pooled async client for this API key
+        client = get_async_client(request.api_key)
+        tenant = tenant_label(request.api_key)
         
         # Build message list (backwards compatible)
         if request.messages:
@@ -80,11 +185,13 @@ async def chat(request: ChatRequest):
         # If non-streaming requested (better for some serverless platforms)
         if request.stream is False:
             try:
-                resp = client.chat.completions.create(
-                    model=request.model,
-                    messages=msg_payload,
-                    stream=False
-                )
+                with metrics.stage("generation", tenant):
+                    resp = await client.chat.completions.create(
+                        model=request.model,
+                        messages=msg_payload,
+                        stream=False
+                    )
+                metrics.count("chats", tenant)
                 text = resp.choices[0].message.content or ""
                 return {"response": text}
             except Exception as e:
@@ -92,8 +199,10 @@ async def chat(request: ChatRequest):
         
         # Create an async generator function for streaming responses
         async def generate():
+            started = time.perf_counter()
+            first_token = True
             try:
-                stream = client.chat.completions.create(
+                stream = await client.chat.completions.create(
                     model=request.model,
                     messages=msg_payload,
                     stream=True
@@ -103,9 +212,14 @@ async def chat(request: ChatRequest):
                 return
             
             # Yield each chunk of the response as it becomes available
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    if first_token:
+                        metrics.observe_stage("generation_ttft", tenant, time.perf_counter() - started)
+                        first_token = False
                     yield chunk.choices[0].delta.content
+            metrics.observe_stage("generation", tenant, time.perf_counter() - started)
+            metrics.count("chats", tenant)
 
         # Return a streaming response to the client
         return StreamingResponse(generate(), media_type="text/plain")
@@ -117,11 +231,14 @@ async def chat(request: ChatRequest):
 # RAG Endpoints
 
 @app.post("/api/rag/upload")
-async def upload_pdf(files: List[UploadFile] = File(...), api_key: str = Form(...)):
+async def upload_pdf(
+    files: List[UploadFile] = File(...),
+    api_key: str = Form(...),
+    tags: Optional[str] = Form(None),  # Comma-separated tags for document filters
+):
     """Upload and process multiple PDFs for RAG"""
+    lease = AsyncExitStack()
     try:
-        print(f"Upload request received - Files: {len(files) if files else 0}, API key provided: {bool(api_key)}")
-        
         if not api_key:
             raise HTTPException(status_code=400, detail="API key is required")
         
@@ -133,44 +250,47 @@ async def upload_pdf(files: List[UploadFile] = File(...), api_key: str = Form(..
             if not file.filename or not file.filename.endswith('.pdf'):
                 raise HTTPException(status_code=400, detail=f"File {file.filename or 'unknown'} is not a PDF. Only PDF files are supported")
         
-        print(f"Processing {len(files)} PDF files...")
+        tenant = tenant_label(api_key)
+        log.info("upload.received", tenant=tenant, files=len(files))
         
-        # Get or create RAG pipeline for this API key
-        rag_pipeline = get_or_create_rag_pipeline(api_key)
+        # Get or create RAG pipeline for this API key (pinned until the upload finishes)
+        rag_pipeline = await lease_rag_pipeline(lease, api_key, create=True)
         
         total_chunks_created = 0
         total_characters = 0
         successful_files = []
         failed_files = []
         
-        # Process each PDF file
-        for i, file in enumerate(files):
-            try:
-                print(f"Processing file {i+1}/{len(files)}: {file.filename}")
-                
-                # Read PDF content
-                pdf_content = await file.read()
-                print(f"Read {len(pdf_content)} bytes from {file.filename}")
-                
-                # Process PDF
-                result = await rag_pipeline.add_pdf(file.filename, pdf_content)
-                print(f"Processing result for {file.filename}: {result}")
-                
-                if result["status"] == "success":
-                    successful_files.append(file.filename)
-                    total_chunks_created += result["chunks_created"]
-                    total_characters += result["total_characters"]
-                else:
-                    failed_files.append(f"{file.filename}: {result['message']}")
-                    
-            except Exception as e:
-                error_msg = f"Error processing file {file.filename}: {str(e)}"
-                print(error_msg)
-                import traceback
-                traceback.print_exc()
-                failed_files.append(error_msg)
+        # Read all uploads, then extract/chunk/embed them as overlapping stages
+        contents = await asyncio.gather(*(file.read() for file in files))
+        log.debug("upload.read", tenant=tenant, sizes={file.filename: len(content) for file, content in zip(files, contents)})
+        
+        # Collect per-file results as each file finishes
+        async for result in rag_pipeline.add_pdfs(
+            [(file.filename, pdf_content) for file, pdf_content in zip(files, contents)],
+            tags=[tag.strip() for tag in (tags or "").split(",") if tag.strip()],
+        ):
+            filename = result["filename"]
+            log.info(
+                "upload.file_processed",
+                tenant=tenant,
+                filename=filename,
+                status=result["status"],
+                chunks=result.get("chunks_created"),
+                message=result.get("message"),
+            )
+            
+            if result["status"] == "success":
+                successful_files.append(filename)
+                total_chunks_created += result["chunks_created"]
+                total_characters += result["total_characters"]
+            else:
+                failed_files.append(f"{filename}: {result['message']}")
         
-        print(f"Upload processing complete - Success: {len(successful_files)}, Failed: {len(failed_files)}")
+        log.info("upload.complete", tenant=tenant, succeeded=len(successful_files), failed=len(failed_files))
+        
+        if successful_files:
+            await persist_rag_pipeline(api_key, rag_pipeline)
         
         # Prepare response
         if successful_files and not failed_files:
@@ -181,7 +301,6 @@ async def upload_pdf(files: List[UploadFile] = File(...), api_key: str = Form(..
                 "total_chunks_created": total_chunks_created,
                 "total_characters": total_characters
             }
-            print(f"Returning success response: {response}")
             return response
         elif successful_files and failed_files:
             response = {
@@ -192,95 +311,106 @@ async def upload_pdf(files: List[UploadFile] = File(...), api_key: str = Form(..
                 "total_chunks_created": total_chunks_created,
                 "total_characters": total_characters
             }
-            print(f"Returning partial success response: {response}")
             return response
         else:
             error_detail = f"All files failed to process: {'; '.join(failed_files)}"
-            print(f"All files failed: {error_detail}")
             raise HTTPException(status_code=400, detail=error_detail)
         
     except HTTPException as he:
-        print(f"HTTP Exception in upload: {he.status_code} - {he.detail}")
+        log.warning("upload.rejected", status_code=he.status_code, detail=he.detail)
         raise
     except Exception as e:
         error_msg = f"Unexpected error processing PDFs: {str(e)}"
-        print(error_msg)
-        import traceback
-        traceback.print_exc()
+        log.exception("upload.error", error=str(e))
         raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        await lease.aclose()
 
 @app.post("/api/rag/chat")
 async def rag_chat(request: RAGChatRequest):
     """Chat with documents using RAG"""
+    lease = AsyncExitStack()
     try:
-        # Get RAG pipeline for this API key
-        if request.api_key not in rag_pipelines:
+        # Get RAG pipeline for this API key (pinned until the answer is sent)
+        rag_pipeline = await lease_rag_pipeline(lease, request.api_key)
+        if rag_pipeline is None:
             raise HTTPException(status_code=400, detail="No documents uploaded for this API key")
         
-        rag_pipeline = rag_pipelines[request.api_key]
-        
-        # Debug: Log the query
-        print(f"RAG Query: {request.user_message}")
+        tenant = tenant_label(request.api_key)
+        log.debug("rag_chat.query", tenant=tenant, query=request.user_message, k=request.k)
         
-        # Search for relevant chunks
-        context_chunks = rag_pipeline.search_documents(request.user_message, k=request.k)
+        # Search for relevant chunks (the retrieval also keys the answer cache)
+        retrieval = await rag_pipeline.aretrieve(request.user_message, k=request.k, filter=request.document_filter)
+        context_chunks = retrieval.chunks
         
-        # Debug: Log the retrieved chunks
-        print(f"Retrieved {len(context_chunks)} chunks:")
-        for i, chunk in enumerate(context_chunks):
-            print(f"  Chunk {i+1}: {chunk[:100]}...")
+        log.debug("rag_chat.retrieved", tenant=tenant, chunks=len(context_chunks), sources=retrieval.sources)
         
         if not context_chunks:
             raise HTTPException(status_code=400, detail="No relevant context found in uploaded documents")
         
-        # Generate response
-        response = rag_pipeline.generate_rag_response(
+        metadata = {
+            "context_chunks_used": len(context_chunks),
+            "sources": [chunk[:100] + "..." for chunk in context_chunks],  # Preview of sources
+            "source_details": retrieval.sources,  # Filename, page and character offsets per chunk
+        }
+        
+        # Stream sources first, then tokens as they are generated
+        if request.stream:
+            return stream_rag_answer(
+                rag_pipeline, request.user_message, context_chunks, request.model, metadata, retrieval,
+                lease=lease.pop_all(),
+            )
+        
+        # Generate response (served from the semantic cache for near-duplicate questions)
+        response = await rag_pipeline.agenerate_rag_response(
             request.user_message, 
             context_chunks, 
-            model=request.model
+            model=request.model,
+            retrieval=retrieval,
         )
         
-        return {
-            "response": response,
-            "context_chunks_used": len(context_chunks),
-            "sources": [chunk[:100] + "..." for chunk in context_chunks]  # Preview of sources
-        }
+        return {"response": response, **metadata}
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await lease.aclose()
 
 @app.post("/api/rag/fusion_chat")
 async def rag_fusion_chat(request: FusionChatRequest):
     """Chat using RAG-Fusion with optional web augmentation."""
+    lease = AsyncExitStack()
     try:
-        # Get or create pipeline for this API key
-        rag_pipeline = get_or_create_rag_pipeline(request.api_key)
+        # Lease this API key's pipeline; a tenant without documents gets a
+        # throwaway one (web results only) that is never registered
+        rag_pipeline = await lease_rag_pipeline(lease, request.api_key)
+        if rag_pipeline is None:
+            rag_pipeline = create_rag_pipeline(request.api_key)
 
-        print(f"RAG-Fusion Query: {request.user_message}")
+        log.debug(
+            "fusion_chat.query",
+            tenant=tenant_label(request.api_key),
+            query=request.user_message,
+            num_queries=request.num_queries,
+            include_web=bool(request.include_web),
+        )
 
         # Retrieve fused chunks (optionally with web)
-        context_chunks = rag_pipeline.rag_fusion(
+        context_chunks = await rag_pipeline.arag_fusion(
             query=request.user_message,
             k=request.k or 5,
             num_queries=request.num_queries or 4,
             include_web=bool(request.include_web),
             web_results=request.web_results or 3,
+            filter=request.document_filter,
         )
 
         if not context_chunks:
             raise HTTPException(status_code=400, detail="No relevant context found across fusion sources")
 
-        # Generate final answer
-        response = rag_pipeline.generate_rag_response(
-            request.user_message,
-            context_chunks,
-            model=request.model or "gpt-4.1-mini",
-        )
-
-        return {
-            "response": response,
+        metadata = {
             "context_chunks_used": len(context_chunks),
             "sources": [chunk[:160] + "..." for chunk in context_chunks],  # Slightly longer preview
             "fusion": {
@@ -288,32 +418,74 @@ async def rag_fusion_chat(request: FusionChatRequest):
                 "include_web": bool(request.include_web),
             },
         }
+
+        # Stream sources first, then tokens as they are generated
+        if request.stream:
+            return stream_rag_answer(
+                rag_pipeline, request.user_message, context_chunks, request.model or "gpt-4.1-mini", metadata,
+                lease=lease.pop_all(),
+            )
+
+        # Generate final answer
+        response = await rag_pipeline.agenerate_rag_response(
+            request.user_message,
+            context_chunks,
+            model=request.model or "gpt-4.1-mini",
+        )
+
+        return {"response": response, **metadata}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await lease.aclose()
 
 @app.get("/api/rag/documents")
 async def get_documents(api_key: str):
     """Get information about uploaded documents"""
-    if api_key not in rag_pipelines:
-        return {"loaded_documents": [], "total_chunks": 0, "vector_count": 0}
-    
-    rag_pipeline = rag_pipelines[api_key]
-    return rag_pipeline.get_document_info()
+    async with rag_pipelines.lease(api_key) as rag_pipeline:
+        if rag_pipeline is None:
+            return {"loaded_documents": [], "total_chunks": 0, "vector_count": 0}
+        
+        return rag_pipeline.get_document_info()
 
 @app.delete("/api/rag/documents")
 async def clear_documents(api_key: str):
     """Clear all uploaded documents for an API key"""
-    if api_key in rag_pipelines:
-        rag_pipelines[api_key].clear_documents()
-        return {"message": "All documents cleared successfully"}
+    async with rag_pipelines.lease(api_key) as rag_pipeline:
+        if rag_pipeline is not None:
+            rag_pipeline.clear_documents()
+            await persist_rag_pipeline(api_key, rag_pipeline)
+            return {"message": "All documents cleared successfully"}
     return {"message": "No documents found for this API key"}
 
+@app.delete("/api/rag/documents/{filename}")
+async def delete_document(filename: str, api_key: str):
+    """Delete one uploaded document (and its vectors) for an API key"""
+    async with rag_pipelines.lease(api_key) as rag_pipeline:
+        if rag_pipeline is None or not rag_pipeline.delete_document(filename):
+            raise HTTPException(status_code=404, detail=f"Document {filename} not found")
+        await persist_rag_pipeline(api_key, rag_pipeline)
+        return {"message": f"Document {filename} deleted successfully", **rag_pipeline.get_document_info()}
+
+# Close pooled OpenAI connections, stop PDF extraction workers and flush
+# queued logs when the server stops
+@app.on_event("shutdown")
+async def close_openai_clients():
+    await aclose_clients()
+    await asyncio.to_thread(shutdown_process_pool)
+    shutdown_logging()
+
 # Define a health check endpoint to verify API status
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "rag_pipelines": rag_pipelines.stats()}
+
+# Prometheus scrape endpoint (series are empty unless RAG_METRICS=1)
+@app.get("/api/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Test endpoint for debugging
 @app.get("/api/test")
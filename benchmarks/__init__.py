@@ -0,0 +1,3 @@
+from .embedding_stub import HashedProjectionEmbeddingModel
+from .corpus import SyntheticCorpus
+from .retrieval import BACKENDS, run
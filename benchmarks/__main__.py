@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+
+from benchmarks.retrieval import BACKENDS, run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Offline retrieval benchmarks over synthetic corpora (no API key needed)",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="corpus sizes in chunks, e.g. 1000 10000 100000 1000000")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=200, help="queries timed per run")
+    parser.add_argument("-k", type=int, default=10, help="results per query / recall cutoff")
+    parser.add_argument("--dimensions", type=int, default=384, help="stub embedding dimensionality")
+    parser.add_argument("--pipeline-max-size", type=int, default=100000,
+                        help="largest size also benchmarked through RAGPipeline (0 = skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(
+        sizes=args.sizes,
+        backends=args.backends,
+        num_queries=args.queries,
+        k=args.k,
+        dimensions=args.dimensions,
+        pipeline_max_size=args.pipeline_max_size,
+        seed=args.seed,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
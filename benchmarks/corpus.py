@@ -0,0 +1,103 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+_SYLLABLES = [
+    "ka", "ri", "mo", "te", "lu", "sa", "ne", "po", "vi", "da",
+    "go", "fe", "zu", "ba", "chi", "ro", "mi", "ta", "lo", "pe",
+]
+
+
+def _pseudo_word(index: int) -> str:
+    """Pronounceable, unique word for a vocabulary index."""
+    syllables = []
+    while True:
+        index, digit = divmod(index, len(_SYLLABLES))
+        syllables.append(_SYLLABLES[digit])
+        if index == 0:
+            break
+        index -= 1
+    return "".join(reversed(syllables))
+
+
+class SyntheticCorpus:
+    """
+    Reproducible corpus of ``size`` chunks drawn from topic-clustered
+    pseudo-words.
+
+    Each chunk belongs to one topic: most of its words come from that topic's
+    word list, the rest from a Zipf-distributed background vocabulary, so
+    chunks form clusters the way real documents do. Chunks are generated in
+    batches from a seed derived from the batch number, so any size (including
+    1M chunks) can be streamed without holding it in memory.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        seed: int = 0,
+        words_per_chunk: int = 40,
+        num_topics: int = 64,
+        words_per_topic: int = 200,
+        vocabulary_size: int = 20000,
+        topic_share: float = 0.7,
+    ):
+        """
+        :param size: Number of chunks
+        :param seed: RNG seed; the same seed always yields the same corpus
+        :param words_per_chunk: Words in each chunk
+        :param num_topics: Number of topic clusters
+        :param words_per_topic: Distinct words per topic
+        :param vocabulary_size: Background vocabulary size
+        :param topic_share: Fraction of a chunk's words taken from its topic
+        """
+        self.size = size
+        self.seed = seed
+        self.words_per_chunk = words_per_chunk
+        self.num_topics = num_topics
+        self.topic_share = topic_share
+        self.vocabulary = np.array([_pseudo_word(i) for i in range(vocabulary_size)], dtype=object)
+
+        rng = np.random.default_rng([seed, 0])
+        self.topic_words = rng.integers(vocabulary_size, size=(num_topics, words_per_topic))
+        ranks = np.arange(1, vocabulary_size + 1, dtype=np.float64)
+        self._background_p = (1.0 / ranks) / (1.0 / ranks).sum()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _word_ids(self, rng: np.random.Generator, count: int, words: int) -> np.ndarray:
+        topics = rng.integers(self.num_topics, size=count)
+        topical = self.topic_words[topics[:, None], rng.integers(self.topic_words.shape[1], size=(count, words))]
+        background = rng.choice(self._background_p.size, size=(count, words), p=self._background_p)
+        return np.where(rng.random((count, words)) < self.topic_share, topical, background)
+
+    def _texts(self, word_ids: np.ndarray) -> List[str]:
+        return [" ".join(row) for row in self.vocabulary[word_ids].tolist()]
+
+    def iter_batches(self, batch_size: int = 10000) -> Iterator[Tuple[List[str], List[str]]]:
+        """``(keys, texts)`` for consecutive batches of chunks"""
+        for batch, start in enumerate(range(0, self.size, batch_size)):
+            count = min(batch_size, self.size - start)
+            rng = np.random.default_rng([self.seed, 1, batch])
+            keys = [f"chunk-{i}" for i in range(start, start + count)]
+            yield keys, self._texts(self._word_ids(rng, count, self.words_per_chunk))
+
+    def queries(self, count: int, words: int = 8) -> List[str]:
+        """Short questions about random topics, independent of the corpus size"""
+        rng = np.random.default_rng([self.seed, 2])
+        return self._texts(self._word_ids(rng, count, words))
+
+    def iter_documents(self, chunks_per_document: int = 50, batch_size: int = 10000) -> Iterator[Tuple[str, str]]:
+        """``(filename, text)`` documents made of consecutive chunks, one paragraph each"""
+        paragraphs: List[str] = []
+        number = 0
+        for _keys, texts in self.iter_batches(batch_size):
+            for text in texts:
+                paragraphs.append(text)
+                if len(paragraphs) == chunks_per_document:
+                    yield f"doc-{number}.txt", "\n\n".join(paragraphs)
+                    paragraphs = []
+                    number += 1
+        if paragraphs:
+            yield f"doc-{number}.txt", "\n\n".join(paragraphs)
@@ -0,0 +1,86 @@
+import hashlib
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashedProjectionEmbeddingModel(EmbeddingModel):
+    """
+    Deterministic, offline stand-in for ``EmbeddingModel``.
+
+    Every word is mapped to a fixed Gaussian random vector seeded by a hash of
+    the word, and a text embeds as the normalized sum of its words' vectors (a
+    hashed random projection of its bag of words). Texts sharing words are
+    therefore similar, the same text always gets the same vector on every
+    machine, and no API key or network access is needed.
+    """
+
+    def __init__(self, dimensions: int = 384, batch_size: int = 1024):
+        """
+        :param dimensions: Embedding dimensionality
+        :param batch_size: Texts summed per numpy call (bounds peak memory)
+        """
+        super().__init__(embeddings_model_name=f"hashed-projection-{dimensions}", api_key="offline")
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self._word_ids: Dict[str, int] = {}
+        self._word_vectors = np.zeros((0, dimensions), dtype=np.float32)
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dimensions, dtype=np.float32)
+
+    def _ids(self, text: str) -> List[int]:
+        ids = []
+        for word in _WORD_PATTERN.findall(text.lower()):
+            word_id = self._word_ids.get(word)
+            if word_id is None:
+                word_id = self._word_ids[word] = len(self._word_ids)
+            ids.append(word_id)
+        return ids
+
+    def _grow_vocabulary(self) -> None:
+        known = self._word_vectors.shape[0]
+        if known == len(self._word_ids):
+            return
+        new_words = list(self._word_ids)[known:]
+        grown = np.empty((len(self._word_ids), self.dimensions), dtype=np.float32)
+        grown[:known] = self._word_vectors
+        grown[known:] = [self._word_vector(word) for word in new_words]
+        self._word_vectors = grown
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), dimensions)`` unit vectors"""
+        result = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = [self._ids(text) for text in texts[start:start + self.batch_size]]
+            self._grow_vocabulary()
+            lengths = np.array([len(ids) for ids in batch])
+            non_empty = np.flatnonzero(lengths)
+            if non_empty.size == 0:
+                continue
+            flat = np.fromiter((i for ids in batch for i in ids), dtype=np.int64, count=int(lengths.sum()))
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])[non_empty]
+            result[start + non_empty] = np.add.reduceat(self._word_vectors[flat], offsets, axis=0)
+        norms = np.linalg.norm(result, axis=1, keepdims=True)
+        return result / np.where(norms == 0, 1.0, norms)
+
+    def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        return self.embed(list_of_text).tolist()
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
+
+    async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        return self.get_embeddings(list_of_text)
+
+    async def async_get_embeddings_with_usage(self, list_of_text: List[str]) -> Tuple[List[List[float]], None]:
+        return self.get_embeddings(list_of_text), None
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
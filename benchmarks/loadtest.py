@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.retrieval import latency_summary
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_WORDS = (
+    "pump valve contract invoice quarterly revenue sensor firmware latency budget "
+    "warranty clause supplier audit rollout incident policy renewal forecast margin"
+).split()
+
+
+def make_pdf(pages: Sequence[str]) -> bytes:
+    """Minimal multi-page PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out, offsets = "%PDF-1.4\n", []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Sample:
+    """Outcome of one request."""
+
+    def __init__(self, workload: str, latency: float, ttft: Optional[float], ok: bool):
+        self.workload = workload
+        self.latency = latency
+        self.ttft = ttft  # seconds to the first answer byte (streaming workloads only)
+        self.ok = ok
+
+
+async def _timed_stream(client: httpx.AsyncClient, workload: str, url: str, payload: Dict[str, Any], skip_first_line: bool) -> Sample:
+    """POST and read a streamed body; TTFT is the first answer byte (after the metadata line if any)"""
+    started = time.perf_counter()
+    ttft, ok = None, False
+    async with client.stream("POST", url, json=payload) as response:
+        pending_metadata = skip_first_line
+        async for chunk in response.aiter_bytes():
+            if pending_metadata:
+                if b"\n" not in chunk:
+                    continue
+                chunk = chunk.split(b"\n", 1)[1]
+                pending_metadata = False
+            if chunk and ttft is None:
+                ttft = time.perf_counter() - started
+        ok = response.status_code == 200
+    return Sample(workload, time.perf_counter() - started, ttft, ok)
+
+
+def _workloads(rng: random.Random, upload_pages: int) -> Dict[str, Callable[[httpx.AsyncClient, str], Awaitable[Sample]]]:
+    async def chat(client: httpx.AsyncClient, api_key: str) -> Sample:
+        payload = {"user_message": _sentence(rng, 12), "api_key": api_key, "stream": True}
+        return await _timed_stream(client, "chat", "/api/chat", payload, skip_first_line=False)
+
+    async def rag_chat(client: httpx.AsyncClient, api_key: str) -> Sample:
+        payload = {"user_message": _sentence(rng, 8), "api_key": api_key, "stream": True}
+        return await _timed_stream(client, "rag_chat", "/api/rag/chat", payload, skip_first_line=True)
+
+    async def fusion_chat(client: httpx.AsyncClient, api_key: str) -> Sample:
+        payload = {"user_message": _sentence(rng, 8), "api_key": api_key, "stream": True, "num_queries": 4}
+        return await _timed_stream(client, "fusion_chat", "/api/rag/fusion_chat", payload, skip_first_line=True)
+
+    async def upload(client: httpx.AsyncClient, api_key: str) -> Sample:
+        pdf = make_pdf([_sentence(rng, 60) for _ in range(upload_pages)])
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/rag/upload",
+            data={"api_key": api_key},
+            files=[("files", (f"load-{rng.getrandbits(32):08x}.pdf", pdf, "application/pdf"))],
+        )
+        return Sample("upload", time.perf_counter() - started, None, response.status_code == 200)
+
+    return {"chat": chat, "rag_chat": rag_chat, "fusion_chat": fusion_chat, "upload": upload}
+
+
+class Servers:
+    """Mock OpenAI server plus the app under uvicorn, as child processes."""
+
+    def __init__(self, mock_args: List[str], log_dir: str):
+        self.mock_port = _free_port()
+        self.app_port = _free_port()
+        self.mock_args = mock_args
+        self.log_dir = log_dir
+        self._processes: List[subprocess.Popen] = []
+
+    @property
+    def app_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    def _spawn(self, name: str, module: str, port: int, args: List[str], env: Dict[str, str]) -> None:
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "wb")
+        self._processes.append(subprocess.Popen(
+            [sys.executable, "-m", module, "--port", str(port), *args],
+            cwd=_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        ))
+
+    @staticmethod
+    def _wait_ready(url: str, timeout: float = 30.0) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if httpx.get(url, timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Server at {url} did not become ready")
+
+    def __enter__(self) -> "Servers":
+        env = {**os.environ, "PYTHONPATH": _ROOT}
+        self._spawn("mock_openai", "benchmarks.mock_openai", self.mock_port, self.mock_args, env)
+        self._wait_ready(f"http://127.0.0.1:{self.mock_port}/health")
+        app_env = {**env, "OPENAI_BASE_URL": f"http://127.0.0.1:{self.mock_port}/v1"}
+        for name in ("RAG_INDEX_DIR", "TAVILY_API_KEY", "LANGSMITH_API_KEY", "LANGCHAIN_API_KEY"):
+            app_env.pop(name, None)  # keep runs in memory and off third-party services
+        self._spawn("app", "benchmarks.serve_app", self.app_port, [], app_env)
+        self._wait_ready(f"{self.app_url}/api/health")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run_level(
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    mix: Dict[str, float],
+    tenants: List[str],
+    seed: int,
+    upload_pages: int,
+) -> Dict[str, Any]:
+    """Drive ``concurrency`` closed-loop virtual users for ``duration`` seconds"""
+    rng = random.Random(seed)
+    workloads = _workloads(rng, upload_pages)
+    names, weights = list(mix), list(mix.values())
+    samples: List[Sample] = []
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0, limits=limits) as client:
+        await client.get("/__loadtest/loop_lag", params={"reset": True})
+        deadline = time.perf_counter() + duration
+
+        async def user(number: int) -> None:
+            while time.perf_counter() < deadline:
+                workload = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    samples.append(await workloads[workload](client, tenants[number % len(tenants)]))
+                except httpx.HTTPError:
+                    samples.append(Sample(workload, time.perf_counter() - started, None, False))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        loop_lag = (await client.get("/__loadtest/loop_lag", params={"reset": True})).json()
+
+    per_workload: Dict[str, Any] = {}
+    for name in names:
+        mine = [s for s in samples if s.workload == name]
+        if not mine:
+            continue
+        ttfts = [s.ttft for s in mine if s.ok and s.ttft is not None]
+        per_workload[name] = {
+            "requests": len(mine),
+            "errors": sum(not s.ok for s in mine),
+            "latency": latency_summary([s.latency for s in mine]),
+            "ttft": latency_summary(ttfts) if ttfts else None,
+        }
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "requests": len(samples),
+        "errors": sum(not s.ok for s in samples),
+        "throughput_rps": len(samples) / elapsed,
+        "latency": latency_summary([s.latency for s in samples]) if samples else None,
+        "workloads": per_workload,
+        "event_loop_lag": loop_lag,
+    }
+
+
+async def _warm_up(base_url: str, tenants: List[str], upload_pages: int) -> None:
+    """Give every tenant one document so RAG workloads have something to retrieve"""
+    rng = random.Random(0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0) as client:
+        for api_key in tenants:
+            pdf = make_pdf([_sentence(rng, 60) for _ in range(upload_pages)])
+            response = await client.post(
+                "/api/rag/upload", data={"api_key": api_key}, files=[("files", ("seed.pdf", pdf, "application/pdf"))]
+            )
+            response.raise_for_status()
+
+
+def run(
+    concurrency_levels: Sequence[int] = (1, 4, 16, 64),
+    duration: float = 20.0,
+    mix: Optional[Dict[str, float]] = None,
+    tenants: int = 4,
+    upload_pages: int = 4,
+    mock_args: Sequence[str] = (),
+    seed: int = 0,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Start the mock OpenAI server and the app, then run each concurrency level.
+
+    :param concurrency_levels: Virtual users per step, run in order
+    :param duration: Seconds per step
+    :param mix: Workload name -> relative weight (chat, rag_chat, fusion_chat, upload)
+    :param tenants: Distinct API keys the users are spread over
+    :param upload_pages: Pages per uploaded PDF
+    :param mock_args: Extra ``benchmarks.mock_openai`` CLI flags (latencies)
+    :param seed: Seed for request contents and workload choice
+    :param log: Progress callback
+    :return: JSON-serializable report
+    """
+    mix = mix or {"chat": 4, "fusion_chat": 4, "rag_chat": 1, "upload": 1}
+    unknown = set(mix) - set(_workloads(random.Random(), upload_pages))
+    if unknown:
+        raise ValueError(f"Unknown workloads: {sorted(unknown)}")
+    log = log or (lambda message: None)
+    api_keys = [f"sk-load-{i}" for i in range(tenants)]
+    levels = []
+    with tempfile.TemporaryDirectory() as log_dir, Servers(list(mock_args), log_dir) as servers:
+        asyncio.run(_warm_up(servers.app_url, api_keys, upload_pages))
+        for level, concurrency in enumerate(concurrency_levels):
+            log(f"concurrency {concurrency}")
+            levels.append(asyncio.run(
+                run_level(servers.app_url, concurrency, duration, mix, api_keys, seed + level, upload_pages)
+            ))
+    return {
+        "config": {
+            "concurrency_levels": list(concurrency_levels),
+            "duration_s": duration,
+            "mix": mix,
+            "tenants": tenants,
+            "upload_pages": upload_pages,
+            "mock_args": list(mock_args),
+            "seed": seed,
+        },
+        "timestamp": time.time(),
+        "levels": levels,
+    }
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.loadtest",
+        description="Load-test api/app.py under uvicorn against a local OpenAI stand-in",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--mix", type=_parse_mix, default=None,
+                        help="workload weights, e.g. chat=4,fusion_chat=4,rag_chat=1,upload=1")
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--upload-pages", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args, mock_args = parser.parse_known_args()  # the rest goes to the mock server, e.g. --chat-ttft-ms 500
+
+    report = run(
+        concurrency_levels=args.concurrency,
+        duration=args.duration,
+        mix=args.mix,
+        tenants=args.tenants,
+        upload_pages=args.upload_pages,
+        mock_args=mock_args,
+        seed=args.seed,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
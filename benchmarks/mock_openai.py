@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import base64
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from benchmarks.embedding_stub import HashedProjectionEmbeddingModel
+
+
+class MockOpenAIConfig:
+    """Latencies and sizes the mock server simulates."""
+
+    def __init__(
+        self,
+        embedding_latency_ms: float = 50.0,
+        embedding_ms_per_input: float = 0.2,
+        embedding_dimensions: int = 1536,
+        chat_ttft_ms: float = 300.0,
+        chat_token_ms: float = 15.0,
+        chat_tokens: int = 60,
+    ):
+        """
+        :param embedding_latency_ms: Fixed latency of an embeddings request
+        :param embedding_ms_per_input: Extra latency per input text
+        :param embedding_dimensions: Size of the returned vectors
+        :param chat_ttft_ms: Delay before the first completion token
+        :param chat_token_ms: Delay between streamed tokens
+        :param chat_tokens: Tokens per completion
+        """
+        self.embedding_latency_ms = embedding_latency_ms
+        self.embedding_ms_per_input = embedding_ms_per_input
+        self.embedding_dimensions = embedding_dimensions
+        self.chat_ttft_ms = chat_ttft_ms
+        self.chat_token_ms = chat_token_ms
+        self.chat_tokens = chat_tokens
+
+
+def _completion_tokens(count: int) -> List[str]:
+    # Newlines every few words so query-expansion parsing sees several lines
+    return [f"word{i}" + ("\n" if i % 8 == 7 else " ") for i in range(count)]
+
+
+def create_mock_app(config: MockOpenAIConfig) -> FastAPI:
+    """
+    FastAPI app implementing the subset of the OpenAI API the project uses:
+    ``POST /v1/embeddings`` and ``POST /v1/chat/completions`` (streaming and
+    not). Point a client at it with ``OPENAI_BASE_URL=http://host:port/v1``.
+    """
+    app = FastAPI(title="Mock OpenAI API")
+    embedder = HashedProjectionEmbeddingModel(config.embedding_dimensions)
+    stats = {"embedding_requests": 0, "embedding_inputs": 0, "chat_requests": 0}
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        return {"status": "ok", **stats}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        stats["embedding_requests"] += 1
+        stats["embedding_inputs"] += len(inputs)
+        await asyncio.sleep((config.embedding_latency_ms + config.embedding_ms_per_input * len(inputs)) / 1000)
+
+        vectors = embedder.embed([str(text) for text in inputs])
+        if body.get("encoding_format") == "base64":
+            encoded = [base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii") for vector in vectors]
+        else:
+            encoded = vectors.tolist()
+        tokens = sum(len(str(text).split()) for text in inputs)
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(encoded)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_requests"] += 1
+        model = body.get("model", "gpt-4.1-mini")
+        tokens = _completion_tokens(config.chat_tokens)
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep((config.chat_ttft_ms + config.chat_token_ms * len(tokens)) / 1000)
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            }
+
+        def event(delta: Dict[str, Any], finish_reason=None) -> str:
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            await asyncio.sleep(config.chat_ttft_ms / 1000)
+            yield event({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(config.chat_token_ms / 1000)
+                yield event({"content": token})
+            yield event({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_openai", description="Local OpenAI API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-ms-per-input", type=float, default=0.2)
+    parser.add_argument("--embedding-dimensions", type=int, default=1536)
+    parser.add_argument("--chat-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--chat-token-ms", type=float, default=15.0)
+    parser.add_argument("--chat-tokens", type=int, default=60)
+    args = parser.parse_args()
+    config = MockOpenAIConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_ms_per_input=args.embedding_ms_per_input,
+        embedding_dimensions=args.embedding_dimensions,
+        chat_ttft_ms=args.chat_ttft_ms,
+        chat_token_ms=args.chat_token_ms,
+        chat_tokens=args.chat_tokens,
+    )
+    uvicorn.run(create_mock_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
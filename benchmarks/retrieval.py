@@ -0,0 +1,236 @@
+import asyncio
+import math
+import os
+import platform
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from aimakerspace import (
+    IVFIndex,
+    ProductQuantizer,
+    QueryExpansionCache,
+    RAGPipeline,
+    ScalarQuantizer,
+    VectorDatabase,
+)
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.embedding_stub import HashedProjectionEmbeddingModel
+
+# Backend name -> VectorDatabase keyword arguments for a given dimension
+BACKENDS: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    "exact": lambda dim: {},
+    "ivf": lambda dim: {"index": IVFIndex()},
+    "int8": lambda dim: {"quantizer": ScalarQuantizer()},
+    "int8-rerank": lambda dim: {"quantizer": ScalarQuantizer(), "keep_originals": True, "rerank": 32},
+    "pq": lambda dim: {"quantizer": ProductQuantizer(num_subspaces=math.gcd(dim, 96))},
+    "ivf-int8": lambda dim: {"index": IVFIndex(), "quantizer": ScalarQuantizer()},
+}
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """p50/p99/mean of per-call latencies, in milliseconds"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def embed_corpus(
+    corpus: SyntheticCorpus,
+    embedder: HashedProjectionEmbeddingModel,
+    path: str,
+    batch_size: int = 10000,
+) -> np.ndarray:
+    """
+    Embed every chunk once into a memory-mapped ``(size, dim)`` file, so each
+    backend inserts identical vectors without re-embedding or holding two
+    copies in RAM.
+    """
+    vectors = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(len(corpus), embedder.dimensions)
+    )
+    start = 0
+    for _keys, texts in corpus.iter_batches(batch_size):
+        vectors[start:start + len(texts)] = embedder.embed(texts)
+        start += len(texts)
+    vectors.flush()
+    return vectors
+
+
+def exact_top_k(vectors: np.ndarray, query_vectors: np.ndarray, k: int, batch_size: int = 65536) -> List[Set[str]]:
+    """Ground-truth top-k chunk keys per query, by streaming cosine over all vectors"""
+    best_scores = np.full((query_vectors.shape[0], 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((query_vectors.shape[0], 0), dtype=np.int64)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = np.asarray(vectors[start:start + batch_size])
+        scores = np.concatenate([best_scores, query_vectors @ block.T], axis=1)
+        rows = np.concatenate(
+            [best_rows, np.broadcast_to(np.arange(start, start + block.shape[0]), (query_vectors.shape[0], block.shape[0]))],
+            axis=1,
+        )
+        keep = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+    return [{f"chunk-{row}" for row in rows} for rows in best_rows.tolist()]
+
+
+def benchmark_backend(
+    backend: str,
+    vectors: np.ndarray,
+    embedder: HashedProjectionEmbeddingModel,
+    query_vectors: np.ndarray,
+    truth: List[Set[str]],
+    k: int,
+    batch_size: int = 10000,
+) -> Dict[str, Any]:
+    """Insert throughput, query latency, memory per vector and recall@k of one backend"""
+    db = VectorDatabase(embedding_model=embedder, **BACKENDS[backend](vectors.shape[1]))
+
+    insert_seconds = 0.0
+    for start in range(0, vectors.shape[0], batch_size):
+        block = np.asarray(vectors[start:start + batch_size])
+        keys = [f"chunk-{i}" for i in range(start, start + block.shape[0])]
+        began = time.perf_counter()
+        db.insert_many(keys, block)
+        insert_seconds += time.perf_counter() - began
+
+    latencies, recalls = [], []
+    for query_vector, expected in zip(query_vectors, truth):
+        began = time.perf_counter()
+        results = db.search(query_vector, k)
+        latencies.append(time.perf_counter() - began)
+        recalls.append(len(expected & {key for key, _score in results}) / len(expected))
+
+    return {
+        "backend": backend,
+        "vectors": len(db),
+        "insert_seconds": insert_seconds,
+        "insert_vectors_per_s": len(db) / insert_seconds if insert_seconds else None,
+        "query": latency_summary(latencies),
+        "memory_bytes_per_vector": db.estimate_memory_bytes() / len(db),
+        f"recall@{k}": float(np.mean(recalls)),
+    }
+
+
+def benchmark_pipeline(
+    corpus: SyntheticCorpus,
+    embedder: HashedProjectionEmbeddingModel,
+    queries: List[str],
+    k: int,
+    num_queries: int = 4,
+) -> Dict[str, Any]:
+    """
+    Ingestion throughput and ``search_documents``/``rag_fusion`` latency of a
+    full RAGPipeline (chunk store, keyword index and vectors). Reformulations
+    are pre-seeded in the expansion cache so fusion makes no LLM call.
+    """
+    pipeline = RAGPipeline("offline-benchmark", expansion_cache=QueryExpansionCache())
+    pipeline.embedding_model = embedder
+    pipeline.vector_db.embedding_model = embedder
+
+    async def ingest() -> None:
+        for filename, text in corpus.iter_documents():
+            result = await pipeline.add_text(filename, text)
+            if result["status"] != "success":
+                raise RuntimeError(result["message"])
+
+    began = time.perf_counter()
+    asyncio.run(ingest())
+    ingest_seconds = time.perf_counter() - began
+
+    for query in queries:
+        words = query.split()
+        reformulations = [query, " ".join(reversed(words)), " ".join(words[1:]), " ".join(words[:-1])]
+        pipeline.expansion_cache.put(pipeline._cache_namespace, query, num_queries, reformulations[:num_queries])
+
+    search_latencies, fusion_latencies = [], []
+    for query in queries:
+        began = time.perf_counter()
+        pipeline.search_documents(query, k=k)
+        search_latencies.append(time.perf_counter() - began)
+        began = time.perf_counter()
+        pipeline.rag_fusion(query, k=k, num_queries=num_queries)
+        fusion_latencies.append(time.perf_counter() - began)
+
+    chunks = len(pipeline.chunk_store)
+    return {
+        "backend": "rag_pipeline",
+        "documents": len(pipeline.chunk_store.filenames),
+        "chunks": chunks,
+        "ingest_seconds": ingest_seconds,
+        "ingest_chunks_per_s": chunks / ingest_seconds if ingest_seconds else None,
+        "search_documents": latency_summary(search_latencies),
+        "rag_fusion": latency_summary(fusion_latencies),
+        "memory_bytes_per_chunk": pipeline.estimate_memory_bytes() / chunks,
+    }
+
+
+def run(
+    sizes: Sequence[int] = (1000, 10000, 100000),
+    backends: Sequence[str] = tuple(BACKENDS),
+    num_queries: int = 200,
+    k: int = 10,
+    dimensions: int = 384,
+    pipeline_max_size: int = 100000,
+    seed: int = 0,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Benchmark every backend at every corpus size.
+
+    :param sizes: Corpus sizes in chunks
+    :param backends: Names from ``BACKENDS``
+    :param num_queries: Queries timed per run
+    :param k: Results per query (recall is measured at ``k``)
+    :param dimensions: Embedding dimensionality of the offline stub
+    :param pipeline_max_size: Largest size also run through RAGPipeline (0 = skip)
+    :param seed: Corpus seed
+    :param log: Progress callback
+    :return: JSON-serializable report
+    """
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown backends: {sorted(unknown)}")
+    log = log or (lambda message: None)
+    embedder = HashedProjectionEmbeddingModel(dimensions)
+    results = []
+    for size in sizes:
+        corpus = SyntheticCorpus(size, seed=seed)
+        queries = corpus.queries(num_queries)
+        query_vectors = embedder.embed(queries)
+        with tempfile.TemporaryDirectory() as scratch:
+            log(f"[{size}] embedding corpus")
+            vectors = embed_corpus(corpus, embedder, os.path.join(scratch, "vectors.npy"))
+            truth = exact_top_k(vectors, query_vectors, k)
+            for backend in backends:
+                log(f"[{size}] {backend}")
+                results.append({"corpus_size": size, **benchmark_backend(backend, vectors, embedder, query_vectors, truth, k)})
+            del vectors
+        if pipeline_max_size and size <= pipeline_max_size:
+            log(f"[{size}] rag_pipeline")
+            results.append({"corpus_size": size, **benchmark_pipeline(corpus, embedder, queries, k)})
+
+    return {
+        "config": {
+            "sizes": list(sizes),
+            "backends": list(backends),
+            "num_queries": num_queries,
+            "k": k,
+            "dimensions": dimensions,
+            "seed": seed,
+            "embedding": embedder.embeddings_model_name,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "timestamp": time.time(),
+        "results": results,
+    }
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+from app import app  # noqa: E402
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a ``sleep(interval)`` wakes up. Any
+    blocking call in an async handler (sync HTTP clients, CPU-bound parsing)
+    shows up here as lag, even if no request timed out.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def report(self, reset: bool = False) -> Dict[str, Any]:
+        samples, lag_ms = self.samples, np.asarray(self.samples or [0.0]) * 1000
+        if reset:
+            self.samples = []
+        return {
+            "samples": len(samples),
+            "p50_ms": float(np.percentile(lag_ms, 50)),
+            "p99_ms": float(np.percentile(lag_ms, 99)),
+            "max_ms": float(lag_ms.max()),
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag.start()
+
+
+@app.get("/__loadtest/loop_lag")
+async def get_loop_lag(reset: bool = False):
+    """Event-loop lag since the last reset (load-test builds only)"""
+    return loop_lag.report(reset=reset)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.serve_app",
+        description="Run api/app.py under uvicorn with an event-loop lag probe",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# The repo is run from a checkout, not installed: make ``aimakerspace`` and
+# ``benchmarks`` importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.embedding_stub import HashedProjectionEmbeddingModel  # noqa: E402
+
+
+@pytest.fixture
+def embedder() -> HashedProjectionEmbeddingModel:
+    """Offline, deterministic embedding model (no API key or network)"""
+    return HashedProjectionEmbeddingModel(dimensions=64)
+
+
+@pytest.fixture
+def make_pipeline(embedder):
+    """Builds RAGPipelines that embed offline with ``embedder``"""
+    from aimakerspace import QueryExpansionCache, RAGPipeline
+
+    def make(**kwargs) -> RAGPipeline:
+        kwargs.setdefault("expansion_cache", QueryExpansionCache())
+        pipeline = RAGPipeline("offline-test", **kwargs)
+        pipeline.embedding_model = embedder
+        pipeline.vector_db.embedding_model = embedder
+        return pipeline
+
+    return make
+
+
+class FakeEmbeddingsClient:
+    """
+    Stands in for ``AsyncOpenAI`` in embedding calls: returns stub vectors
+    and records every request's inputs. ``failures`` are raised (in order)
+    by the first calls instead of answering.
+    """
+
+    def __init__(self, embedder: HashedProjectionEmbeddingModel, failures=()):
+        self.embedder = embedder
+        self.failures = list(failures)
+        self.calls = []
+        self.options = []
+        self.embeddings = self
+
+    def with_options(self, **options) -> "FakeEmbeddingsClient":
+        self.options.append(options)
+        return self
+
+    async def create(self, input, model):
+        self.calls.append(list(input))
+        if self.failures:
+            raise self.failures.pop(0)
+        vectors = self.embedder.embed(list(input))
+        data = [SimpleNamespace(embedding=vector.tolist()) for vector in vectors]
+        tokens = sum(len(text.split()) for text in input)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+@pytest.fixture
+def fake_embeddings_client(embedder) -> FakeEmbeddingsClient:
+    return FakeEmbeddingsClient(embedder)
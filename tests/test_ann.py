@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from aimakerspace.ann import IVFIndex, kmeans, recall_at_k, tune_nprobe
+from aimakerspace.vectordatabase import VectorDatabase
+from benchmarks.corpus import SyntheticCorpus
+
+
+@pytest.fixture(scope="module")
+def corpus_db():
+    from benchmarks.embedding_stub import HashedProjectionEmbeddingModel
+
+    embedder = HashedProjectionEmbeddingModel(dimensions=64)
+    corpus = SyntheticCorpus(5000, seed=1)
+    keys, texts = [], []
+    for batch_keys, batch_texts in corpus.iter_batches(5000):
+        keys.extend(batch_keys)
+        texts.extend(batch_texts)
+    db = VectorDatabase(embedding_model=embedder, index=IVFIndex(n_iter=8))
+    db.insert_many(keys, embedder.embed(texts))
+    return db, embedder.embed(corpus.queries(50))
+
+
+def test_kmeans_separates_clusters():
+    rng = np.random.default_rng(0)
+    centers = np.eye(4, 16, dtype=np.float32)
+    points = np.repeat(centers, 50, axis=0) + 0.01 * rng.standard_normal((200, 16)).astype(np.float32)
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+
+    centroids = kmeans(points, 4, seed=0)
+
+    assert np.allclose(np.sort(np.max(centroids @ centers.T, axis=0)), 1.0, atol=1e-2)
+
+
+def test_untrained_index_falls_back_to_exact_search(embedder):
+    db = VectorDatabase(embedding_model=embedder, index=IVFIndex(min_train_size=100))
+    texts = [f"row {i}" for i in range(20)]
+    db.insert_many(texts, embedder.embed(texts))
+
+    assert not db.index.trained
+    query = embedder.embed(["row 3"])[0]
+    assert db.search(query, k=5) == db.search(query, k=5, exact=True)
+
+
+def test_nprobe_defaults_to_a_fraction_of_the_buckets(corpus_db):
+    db, _queries = corpus_db
+    nlist = db.index.centroids.shape[0]
+
+    assert nlist == int(4 * np.sqrt(5000))
+    assert db.index.probes() == int(np.ceil(0.2 * nlist))
+    assert db.index.probes(3) == 3
+    assert db.index.probes(10 * nlist) == nlist
+
+
+def test_default_nprobe_keeps_recall_usable(corpus_db):
+    db, queries = corpus_db
+
+    assert recall_at_k(db, queries, k=10) >= 0.7
+    assert recall_at_k(db, queries, k=10, nprobe=db.index.centroids.shape[0]) == 1.0
+
+
+def test_tune_nprobe_reaches_the_recall_target(corpus_db):
+    db, queries = corpus_db
+    try:
+        chosen = tune_nprobe(db, queries, k=10, target_recall=0.9)
+
+        assert chosen["recall@10"] >= 0.9
+        assert db.index.nprobe == chosen["nprobe"]
+        assert recall_at_k(db, queries, k=10) == pytest.approx(chosen["recall@10"])
+    finally:
+        db.index.nprobe = None
+
+
+def test_tune_nprobe_needs_a_trained_index(embedder):
+    with pytest.raises(ValueError):
+        tune_nprobe(VectorDatabase(embedding_model=embedder, index=IVFIndex()), [], k=10)
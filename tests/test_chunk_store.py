@@ -0,0 +1,90 @@
+import hashlib
+
+import pytest
+
+from aimakerspace import ChunkStore, chunk_key
+
+TEXT = "Alpha paragraph.\n\nBeta paragraph on page two.\n\nAlpha paragraph."
+
+
+def digest(chunk: str) -> bytes:
+    return hashlib.sha256(chunk.encode("utf-8")).digest()[: ChunkStore.digest_size]
+
+
+def spans_of(text: str):
+    spans, position = [], 0
+    for part in text.split("\n\n"):
+        start = text.index(part, position)
+        spans.append((start, start + len(part)))
+        position = start + len(part)
+    return spans
+
+
+def add(store: ChunkStore, filename: str, text: str = TEXT, **kwargs):
+    spans = spans_of(text)
+    return store.add_document(filename, text, spans, [digest(text[a:b]) for a, b in spans], **kwargs)
+
+
+@pytest.fixture
+def store():
+    store = ChunkStore(initial_capacity=2)
+    add(store, "a.pdf", page_starts=[0, 18], metadata={"uploaded_at": "2026-01-01", "tags": ["legal"]})
+    return store
+
+
+def test_chunks_are_sliced_from_the_document(store):
+    assert len(store) == 3
+    assert list(store.iter_document_chunks("a.pdf")) == ["Alpha paragraph.", "Beta paragraph on page two.", "Alpha paragraph."]
+    assert store.source(1) == {"chunk_id": 1, "source": "a.pdf", "page": 2, "start": 18, "end": 45}
+
+
+def test_identical_chunks_share_a_key(store):
+    keys = store.document_keys("a.pdf")
+    assert keys[0] == keys[2] == chunk_key(digest("Alpha paragraph."))
+    assert store.rows_for_key(keys[0]) == [0, 2]
+
+
+def test_key_metadata_merges_every_document_with_that_text(store):
+    add(store, "b.pdf", "Alpha paragraph.", metadata={"tags": ["hr"]})
+    metadata = store.key_metadata(chunk_key(digest("Alpha paragraph.")))
+    assert metadata["filename"] == ["a.pdf", "b.pdf"]
+    assert metadata["tag"] == ["legal", "hr"]
+    assert metadata["uploaded_at"] == ["2026-01-01"]
+
+
+def test_replacing_a_document_returns_its_old_keys(store):
+    old_keys = store.add_document("a.pdf", "New text", [(0, 8)], [digest("New text")])
+    assert chunk_key(digest("Beta paragraph on page two.")) in old_keys
+    assert store.rows_for_key(chunk_key(digest("Beta paragraph on page two."))) == []
+    assert list(store.iter_document_chunks("a.pdf")) == ["New text"]
+
+
+def test_remove_and_compact_renumber_rows(store):
+    add(store, "b.pdf", "Gamma.\n\nDelta.")
+    assert store.remove_document("a.pdf")
+    assert store.remove_document("a.pdf") == []
+    store.compact()
+    assert store.filenames == ["b.pdf"] and len(store) == 2
+    assert list(store.iter_document_chunks("b.pdf")) == ["Gamma.", "Delta."]
+    assert store.rows_for_key(chunk_key(digest("Delta."))) == [1]
+
+
+@pytest.mark.parametrize("remove_first", [False, True])
+def test_save_and_load_round_trip(store, tmp_path, remove_first):
+    add(store, "b.pdf", "Gamma.\n\nDelta.")
+    if remove_first:
+        store.remove_document("b.pdf")
+    store.save(str(tmp_path))
+
+    assert ChunkStore.exists(str(tmp_path))
+    restored = ChunkStore.load(str(tmp_path))
+    assert restored.filenames == store.filenames
+    assert len(restored) == len(store)
+    assert restored.document_metadata("a.pdf") == {"uploaded_at": "2026-01-01", "tags": ["legal"]}
+    assert list(restored.iter_document_chunks("a.pdf")) == list(store.iter_document_chunks("a.pdf"))
+    assert restored.source(1)["page"] == 2
+
+
+def test_pipeline_load_requires_a_chunk_store(make_pipeline, tmp_path):
+    (tmp_path / "documents.json").write_text('{"documents": {}, "chunks": {}}')
+    assert not make_pipeline().load(str(tmp_path))
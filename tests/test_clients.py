@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from aimakerspace.openai_utils import clients
+
+
+@pytest.fixture
+def max_clients(monkeypatch):
+    monkeypatch.setattr(clients, "MAX_CLIENTS", 2)
+    monkeypatch.setattr(clients, "_sync_clients", clients.OrderedDict())
+    return 2
+
+
+def test_async_clients_are_shared_per_key():
+    async def scenario():
+        first = clients.get_async_client("sk-a")
+        assert clients.get_async_client("sk-a") is first
+        assert clients.get_async_client("sk-b") is not first
+        await clients.aclose_clients()
+
+    asyncio.run(scenario())
+
+
+def test_async_clients_close_least_recently_used(max_clients):
+    async def scenario():
+        a = clients.get_async_client("sk-a")
+        b = clients.get_async_client("sk-b")
+        clients.get_async_client("sk-a")  # b is now the oldest
+        clients.get_async_client("sk-c")
+        await asyncio.sleep(0)
+        await asyncio.gather(*list(clients._closing))
+        assert b.is_closed() and not a.is_closed()
+        assert clients.get_async_client("sk-b") is not b
+        await clients.aclose_clients()
+
+    asyncio.run(scenario())
+
+
+def test_sync_clients_close_least_recently_used(max_clients):
+    a = clients.get_sync_client("sk-a")
+    clients.get_sync_client("sk-b")
+    clients.get_sync_client("sk-c")
+    assert a.is_closed()
+    assert list(clients._sync_clients) == ["sk-b", "sk-c"]
+    for client in clients._sync_clients.values():
+        client.close()
@@ -0,0 +1,89 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from aimakerspace import IVFIndex
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXTS = [f"note {i} about topic {i % 7}" for i in range(40)]
+
+
+def make_db(embedder, **kwargs) -> VectorDatabase:
+    db = VectorDatabase(embedding_model=embedder, **kwargs)
+    db.insert_many(TEXTS, embedder.embed(TEXTS))
+    return db
+
+
+def test_deleted_keys_disappear_from_search(embedder):
+    db = make_db(embedder, compaction_threshold=1.0)
+
+    assert db.delete([TEXTS[3], "unknown"]) == 1
+    assert len(db) == len(TEXTS) - 1 and TEXTS[3] not in db
+    keys = [key for key, _ in db.search(embedder.embed([TEXTS[3]])[0], k=len(TEXTS))]
+    assert TEXTS[3] not in keys and len(keys) == len(TEXTS) - 1
+
+
+def test_compaction_keeps_survivors_and_scores(embedder):
+    db = make_db(embedder, compaction_threshold=1.0)
+    db.delete(TEXTS[:10])
+    query = embedder.embed(["topic 3"])[0]
+    before = db.search(query, k=5)
+
+    db.compact()
+    after = db.search(query, k=5)
+    assert [key for key, _ in after] == [key for key, _ in before]
+    assert [score for _, score in after] == pytest.approx([score for _, score in before])
+    assert len(db) == 30
+    np.testing.assert_allclose(db.retrieve_from_key(TEXTS[20]), embedder.embed([TEXTS[20]])[0], atol=1e-6)
+
+
+def test_compaction_runs_once_threshold_is_reached(embedder):
+    db = make_db(embedder, compaction_threshold=0.25)
+    db.delete(TEXTS[:9])
+    assert db._tombstones  # 9 of 40 rows: below the threshold
+    db.delete(TEXTS[9:10])
+    assert not db._tombstones
+    assert db.search(embedder.embed([TEXTS[10]])[0], k=1)[0][0] == TEXTS[10]
+
+
+def test_deleting_everything_empties_the_database(embedder):
+    db = make_db(embedder)
+    db.delete(TEXTS)
+    assert len(db) == 0
+    assert db.search(embedder.embed(["topic"])[0], k=3) == []
+
+
+def test_ann_index_follows_deletes_and_compaction(embedder):
+    rng = np.random.default_rng(4)
+    vectors = rng.standard_normal((3000, 32)).astype(np.float32)
+    keys = [f"row-{i}" for i in range(len(vectors))]
+    db = VectorDatabase(
+        embedding_model=embedder, index=IVFIndex(nprobe_fraction=1.0, n_iter=4), compaction_threshold=1.0
+    )
+    db.insert_many(keys, vectors)
+    assert db.index.trained
+    deleted = keys[:500]
+    db.delete(deleted)
+    db.compact()
+    query = vectors[0] + 0.1 * vectors[600]
+    keys = [key for key, _ in db.search(query, k=10)]
+    assert not set(keys) & set(deleted)
+    exact = [key for key, _ in db.search(query, k=10, exact=True)]
+    assert keys == exact
+
+
+def test_pipeline_delete_keeps_chunks_shared_with_other_documents(make_pipeline):
+    pipeline = make_pipeline()
+    shared = "Safety instructions apply to every model."
+    asyncio.run(pipeline.add_text("a.txt", f"Manual A covers the lathe.\n\n{shared}"))
+    asyncio.run(pipeline.add_text("b.txt", f"Manual B covers the drill press.\n\n{shared}"))
+    vectors = len(pipeline.vector_db)
+
+    assert pipeline.delete_document("a.txt")
+    assert not pipeline.delete_document("a.txt")
+    assert pipeline.chunk_store.filenames == ["b.txt"]
+    assert len(pipeline.vector_db) < vectors
+    hits = [key for key, _ in pipeline.lexical_index.search("safety instructions")]
+    assert len(hits) == 1 and hits[0] in pipeline.vector_db
+    assert pipeline.lexical_index.search("lathe") == []
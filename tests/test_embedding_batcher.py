@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from aimakerspace import EmbeddingBatcher, EmbeddingModel
+
+
+def api_error(cls, status: int, message: str, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return cls(message, response=response, body=None)
+
+
+def make_model(client, **batcher_options) -> EmbeddingModel:
+    options = {"base_delay": 0.0, "max_delay": 0.0, **batcher_options}
+    model = EmbeddingModel(api_key="sk-test", batcher=EmbeddingBatcher(**options))
+    model.async_client = client
+    return model
+
+
+def test_pack_respects_token_and_input_limits():
+    batcher = EmbeddingBatcher(max_batch_tokens=10, max_batch_inputs=3)
+    assert batcher.pack([4, 4, 4, 1, 1, 1, 1, 20, 1]) == [(0, 2), (2, 5), (5, 7), (7, 8), (8, 9)]
+
+
+def test_batches_come_back_in_input_order(fake_embeddings_client, embedder):
+    texts = [f"text number {i}" for i in range(25)]
+    model = make_model(fake_embeddings_client, max_batch_inputs=4)
+
+    embeddings = asyncio.run(model.async_get_embeddings(texts))
+    assert len(fake_embeddings_client.calls) == 7
+    assert embeddings == embedder.embed(texts).tolist()
+
+
+def test_sdk_retries_are_disabled(fake_embeddings_client):
+    asyncio.run(make_model(fake_embeddings_client).async_get_embeddings(["hello"]))
+    assert fake_embeddings_client.options == [{"max_retries": 0}]
+
+
+def test_rate_limits_are_retried(fake_embeddings_client):
+    fake_embeddings_client.failures = [
+        api_error(openai.RateLimitError, 429, "slow down", {"retry-after-ms": "1"}),
+        api_error(openai.InternalServerError, 500, "oops"),
+    ]
+    model = make_model(fake_embeddings_client)
+
+    assert len(asyncio.run(model.async_get_embeddings(["a", "b"]))) == 2
+    assert len(fake_embeddings_client.calls) == 3
+    stats = model.batch_stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 1 and stats["requests"] == 1
+
+
+def test_retries_give_up_after_max_retries(fake_embeddings_client):
+    fake_embeddings_client.failures = [api_error(openai.RateLimitError, 429, "slow down") for _ in range(3)]
+    model = make_model(fake_embeddings_client, max_retries=2)
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(model.async_get_embeddings(["a"]))
+    assert len(fake_embeddings_client.calls) == 3
+
+
+def test_oversized_batches_are_split(fake_embeddings_client, embedder):
+    fake_embeddings_client.failures = [api_error(openai.BadRequestError, 400, "maximum context length in tokens")]
+    texts = [f"chunk {i}" for i in range(6)]
+    model = make_model(fake_embeddings_client)
+
+    assert asyncio.run(model.async_get_embeddings(texts)) == embedder.embed(texts).tolist()
+    assert [len(call) for call in fake_embeddings_client.calls] == [6, 3, 3]
+    assert model.batch_stats()["splits"] == 1
+
+
+def test_other_bad_requests_are_raised(fake_embeddings_client):
+    fake_embeddings_client.failures = [api_error(openai.BadRequestError, 400, "invalid model")]
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(make_model(fake_embeddings_client).async_get_embeddings(["a", "b"]))
+
+
+def test_concurrency_is_capped(embedder):
+    class SlowClient:
+        def __init__(self):
+            self.embeddings = self
+            self.in_flight = self.peak = 0
+
+        def with_options(self, **options):
+            return self
+
+        async def create(self, input, model):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            vectors = embedder.embed(list(input)).tolist()
+            return SimpleNamespace(data=[SimpleNamespace(embedding=vector) for vector in vectors])
+
+    client = SlowClient()
+    model = make_model(client, max_batch_inputs=1, max_concurrency=2)
+    asyncio.run(model.async_get_embeddings([f"t{i}" for i in range(8)]))
+    assert client.peak == 2
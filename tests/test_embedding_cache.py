@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+
+from aimakerspace import QueryExpansionCache
+from aimakerspace.openai_utils import embedding_cache
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.embedding_cache import (
+    LRUEmbeddingCache,
+    SQLiteEmbeddingCache,
+    TieredEmbeddingCache,
+)
+
+MODEL = "text-embedding-3-small"
+
+
+def vector(seed: int, dim: int = 16) -> list:
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+def test_lru_cache_is_capped_by_bytes():
+    entry = 16 * 4 + LRUEmbeddingCache.entry_overhead
+    cache = LRUEmbeddingCache(max_bytes=3 * entry)
+
+    cache.put_many(MODEL, ["a", "b", "c"], [vector(0), vector(1), vector(2)])
+    cache.get_many(MODEL, ["a"])  # "a" is now the most recently used
+    cache.put_many(MODEL, ["d"], [vector(3)])
+
+    assert len(cache) == 3
+    assert cache.nbytes == 3 * entry
+    found = cache.get_many(MODEL, ["a", "b", "c", "d"])
+    assert [embedding is not None for embedding in found] == [True, False, True, True]
+    np.testing.assert_allclose(found[0], vector(0))
+
+
+def test_overwriting_an_entry_does_not_double_count():
+    cache = LRUEmbeddingCache()
+    cache.put_many(MODEL, ["a"], [vector(0)])
+    cache.put_many(MODEL, ["a"], [vector(1)])
+
+    assert len(cache) == 1
+    assert cache.nbytes == 16 * 4 + cache.entry_overhead
+    assert cache.stats()["bytes"] == cache.nbytes
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteEmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    disk.put_many(MODEL, ["a"], [vector(0)])
+    cache = TieredEmbeddingCache(memory=LRUEmbeddingCache(), disk=disk)
+
+    np.testing.assert_allclose(cache.get_many(MODEL, ["a"])[0], vector(0))
+    assert len(cache.memory) == 1
+    assert cache.stats()["hits"] == 1
+    disk.close()
+
+
+def test_cache_from_env_is_one_shared_instance(monkeypatch, tmp_path):
+    monkeypatch.setattr(embedding_cache, "_default_cache", None)
+    monkeypatch.setenv("EMBEDDING_CACHE_MB", "2")
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite"))
+
+    first = embedding_cache.embedding_cache_from_env()
+    second = embedding_cache.embedding_cache_from_env()
+
+    assert first is second
+    assert isinstance(first, TieredEmbeddingCache)
+    assert first.memory.max_bytes == 2 * 1024 * 1024
+    first.disk.close()
+
+
+def test_model_only_sends_cache_misses(fake_embeddings_client):
+    model = EmbeddingModel(api_key="test", cache=LRUEmbeddingCache())
+    model.async_client = fake_embeddings_client
+
+    first = asyncio.run(model.async_get_embeddings(["a", "b", "a"]))
+    second = asyncio.run(model.async_get_embeddings(["b", "c"]))
+
+    assert fake_embeddings_client.calls == [["a", "b"], ["c"]]
+    assert first[0] == first[2]
+    assert second[0] == first[1]
+    assert model.cache_stats()["hits"] == 1
+
+
+def test_tenants_only_see_their_own_cache_counters(make_pipeline):
+    shared = QueryExpansionCache()
+    first, second = make_pipeline(expansion_cache=shared), make_pipeline(expansion_cache=shared)
+    shared.put(first._cache_namespace, "question", 3, ["reworded"])
+
+    assert first._cached_expansions("question", 3) is not None
+    info = second.get_document_info()
+    assert "embedding_cache" not in info
+    assert info["query_expansion_cache"] == {"hits": 0, "misses": 0, "hit_rate": 0.0}
+    assert first.get_document_info()["query_expansion_cache"]["hits"] == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from aimakerspace.vectordatabase import VectorDatabase
+
+ROWS = {
+    "contract": {"filename": ["contract.pdf"], "page": [1], "tag": ["legal"], "uploaded_at": ["2026-01-05"]},
+    "appendix": {"filename": ["contract.pdf"], "page": [9], "tag": ["legal", "q3"], "uploaded_at": ["2026-01-05"]},
+    "report": {"filename": ["report.pdf"], "page": [2], "tag": ["q3"], "uploaded_at": ["2026-03-01"]},
+    "memo": {"filename": ["memo.pdf"], "page": [1], "uploaded_at": ["2025-12-24"]},
+}
+
+
+@pytest.fixture
+def db(embedder):
+    db = VectorDatabase(embedding_model=embedder)
+    keys = list(ROWS)
+    db.insert_many(keys, embedder.embed(keys), metadata=[ROWS[key] for key in keys])
+    return db
+
+
+@pytest.mark.parametrize(
+    "filter, expected",
+    [
+        ({"filename": "contract.pdf"}, {"contract", "appendix"}),
+        ({"filename": ["memo.pdf", "report.pdf"]}, {"memo", "report"}),
+        ({"tag": "q3"}, {"appendix", "report"}),
+        ({"tag": "legal", "page": {"gte": 2}}, {"appendix"}),
+        ({"uploaded_at": {"gte": "2026-01-01", "lte": "2026-01-31"}}, {"contract", "appendix"}),
+        ({"page": {"lte": 1}, "tag": "q3"}, set()),
+        ({"filename": "missing.pdf"}, set()),
+        ({}, set(ROWS)),
+    ],
+)
+def test_filter_keys(db, filter, expected):
+    assert set(db.filter_keys(filter)) == expected
+
+
+def test_search_only_scores_matching_rows(db, embedder):
+    results = db.search(embedder.embed(["memo"])[0], k=4, filter={"tag": "q3"})
+    assert {key for key, _ in results} == {"appendix", "report"}
+    assert db.search(embedder.embed(["memo"])[0], k=4, filter={"tag": "none"}) == []
+
+
+def test_metadata_updates_and_deletes_reach_the_filter(db):
+    db.set_metadata("memo", {"tag": ["q3"]})
+    assert set(db.filter_keys({"tag": "q3"})) == {"appendix", "report", "memo"}
+    db.delete(["report"])
+    db.compact()
+    assert set(db.filter_keys({"tag": "q3"})) == {"appendix", "memo"}
+    assert db.get_metadata("memo") == {"tag": ["q3"]}
+
+
+def test_metadata_survives_save_and_load(db, embedder, tmp_path):
+    db.save(str(tmp_path))
+    restored = VectorDatabase.load(str(tmp_path), embedding_model=embedder)
+    assert set(restored.filter_keys({"tag": "legal", "page": {"gte": 2}})) == {"appendix"}
+
+
+def test_pipeline_retrieval_honours_document_filter(make_pipeline):
+    pipeline = make_pipeline()
+
+    async def scenario():
+        await pipeline.add_text("fruit.txt", "Apples and pears are fruit.", tags=["food"])
+        await pipeline.add_text("space.txt", "Rockets fly to the moon.", tags=["science"])
+        only_space = await pipeline.aretrieve("apples", k=3, filter={"filename": "space.txt"})
+        by_tag = await pipeline.aretrieve("apples", k=3, filter={"tag": "food"})
+        return only_space, by_tag
+
+    only_space, by_tag = asyncio.run(scenario())
+    assert [source["source"] for source in only_space.sources] == ["space.txt"]
+    assert [source["source"] for source in by_tag.sources] == ["fruit.txt"]
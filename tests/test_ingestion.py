@@ -0,0 +1,37 @@
+import asyncio
+
+from benchmarks.loadtest import make_pdf
+
+
+def test_add_pdfs_yields_a_result_per_file(make_pipeline):
+    pipeline = make_pipeline()
+    files = [(f"doc{i}.pdf", make_pdf([f"Document {i} page {p} about topic{i}" for p in range(3)])) for i in range(4)]
+    files.append(("broken.pdf", b"not a pdf"))
+
+    async def collect():
+        return [result async for result in pipeline.add_pdfs(files, tags=["batch"])]
+
+    results = {result["filename"]: result for result in asyncio.run(collect())}
+    assert set(results) == {name for name, _ in files}
+    assert results["broken.pdf"]["status"] == "error"
+    assert all(results[f"doc{i}.pdf"]["status"] == "success" for i in range(4))
+    assert sorted(pipeline.chunk_store.filenames) == [f"doc{i}.pdf" for i in range(4)]
+    assert pipeline.chunk_store.document_metadata("doc2.pdf")["tags"] == ["batch"]
+    assert pipeline.lexical_index.search("topic3")
+
+
+def test_add_pdfs_stops_when_the_consumer_does(make_pipeline):
+    pipeline = make_pipeline()
+    files = [(f"doc{i}.pdf", make_pdf([f"Document {i}"])) for i in range(3)]
+
+    async def first_only():
+        results = pipeline.add_pdfs(files)
+        first = await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+        return first, pending
+
+    first, pending = asyncio.run(first_only())
+    assert first["status"] == "success"
+    assert pending == []
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from aimakerspace import BM25Index
+from aimakerspace.lexical_index import tokenize
+
+CHUNKS = {
+    "a": "The XR-2000 pump is rated for 40 bar.",
+    "b": "Pumps and valves are inspected yearly.",
+    "c": "Valve XR-1000 replaced the older model.",
+    "d": "Orchards grow apples, pears and plums.",
+}
+
+
+@pytest.fixture
+def index():
+    index = BM25Index(compaction_threshold=1.0)
+    index.add_many(CHUNKS.items())
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("Order XR-2000 now") == ["order", "xr-2000", "xr", "2000", "now"]
+
+
+def test_search_ranks_exact_identifier_first(index):
+    hits = index.search("XR-2000 pressure")
+    assert hits[0][0] == "a"
+    assert all(score > 0 for _, score in hits)
+    assert index.strong_match("XR-2000", index.search("XR-2000"))
+
+
+def test_search_respects_key_restriction(index):
+    assert [key for key, _ in index.search("valve XR", keys={"c"})] == ["c"]
+
+
+def test_removed_documents_never_match(index):
+    assert index.remove(["a", "missing"]) == 1
+    assert "a" not in index and len(index) == 3
+    assert "a" not in [key for key, _ in index.search("XR-2000 pump")]
+
+
+def test_readding_a_key_replaces_its_text(index):
+    index.add("d", "Now about the XR-2000 pump instead")
+    assert "d" in [key for key, _ in index.search("pump")]
+    assert index.search("apples") == []
+
+
+def test_compaction_keeps_rankings(index):
+    index.remove(["b"])
+    before = index.search("XR valve pump")
+    index.compact()
+    assert index.search("XR valve pump") == pytest.approx(before)
+    index.add("e", "A brand new XR-3000 pump")
+    assert index.search("XR-3000")[0][0] == "e"
+
+
+def test_automatic_compaction_after_many_removals():
+    index = BM25Index(compaction_threshold=0.25)
+    index.add_many((f"k{i}", f"chunk {i} about term{i}") for i in range(40))
+    index.remove([f"k{i}" for i in range(10)])
+    assert len(index._doc_keys) == 30
+    assert index.search("term15")[0][0] == "k15"
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.remove(["c"])
+    index.save(str(tmp_path))
+    restored = BM25Index.load(str(tmp_path))
+    assert len(restored) == 3 and "c" not in restored
+    assert restored.search("XR valve pump") == pytest.approx(index.search("XR valve pump"))
+    restored.add("f", "valve XR-1000 again")
+    assert restored.search("XR-1000")[0][0] == "f"
+
+
+def test_pipeline_reloads_its_keyword_index(make_pipeline, tmp_path):
+    pipeline = make_pipeline()
+    asyncio.run(pipeline.add_text("pumps.txt", "\n\n".join(CHUNKS.values())))
+    pipeline.save(str(tmp_path))
+
+    restored = make_pipeline()
+    assert restored.load(str(tmp_path))
+    assert restored.lexical_index.search("XR-2000") == pipeline.lexical_index.search("XR-2000")
+    assert len(restored.lexical_index) == len(pipeline.lexical_index)
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+from aimakerspace import EmbeddingModel, PipelineMetrics
+from aimakerspace.metrics import estimate_tokens
+
+
+def token_sum(metrics: PipelineMetrics, kind: str, tenant: str) -> float:
+    return metrics.tokens._series[(kind, tenant)][1]
+
+
+class FakeChatClient:
+    """Non-streaming chat completions that report their own usage"""
+
+    def __init__(self, usage=None):
+        self.usage = usage
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        message = SimpleNamespace(content="The answer.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self.usage)
+
+
+def test_embedding_usage_is_reported(fake_embeddings_client):
+    model = EmbeddingModel(api_key="sk-test")
+    model.async_client = fake_embeddings_client
+
+    embeddings, tokens = asyncio.run(model.async_get_embeddings_with_usage(["one two", "three", "one two"]))
+    assert len(embeddings) == 3 and embeddings[0] == embeddings[2]
+    assert tokens == 3  # the duplicate is sent once
+
+
+def test_pipeline_records_reported_embedding_tokens(make_pipeline, fake_embeddings_client):
+    metrics = PipelineMetrics()
+    pipeline = make_pipeline(metrics=metrics)
+    model = EmbeddingModel(api_key="sk-test")
+    model.async_client = fake_embeddings_client
+    pipeline.embedding_model = pipeline.vector_db.embedding_model = model
+
+    asyncio.run(pipeline.add_text("a.txt", "alpha beta gamma delta"))
+    assert token_sum(metrics, "embedding", pipeline.tenant) == 4
+
+
+def test_pipeline_estimates_embedding_tokens_without_usage(make_pipeline):
+    metrics = PipelineMetrics()
+    pipeline = make_pipeline(metrics=metrics)
+
+    asyncio.run(pipeline.add_text("a.txt", "alpha beta gamma delta"))
+    assert token_sum(metrics, "embedding", pipeline.tenant) == estimate_tokens("alpha beta gamma delta")
+
+
+def test_generation_prefers_reported_usage(make_pipeline):
+    metrics = PipelineMetrics()
+    pipeline = make_pipeline(metrics=metrics)
+    pipeline.async_client = FakeChatClient(SimpleNamespace(prompt_tokens=321, completion_tokens=7))
+
+    assert asyncio.run(pipeline.agenerate_rag_response("question", ["context"])) == "The answer."
+    assert token_sum(metrics, "prompt", pipeline.tenant) == 321
+    assert token_sum(metrics, "completion", pipeline.tenant) == 7
+
+
+def test_generation_without_usage_is_estimated(make_pipeline):
+    metrics = PipelineMetrics()
+    pipeline = make_pipeline(metrics=metrics)
+    pipeline.async_client = FakeChatClient()
+
+    asyncio.run(pipeline.agenerate_rag_response("question", ["context"]))
+    assert token_sum(metrics, "completion", pipeline.tenant) == estimate_tokens("The answer.")
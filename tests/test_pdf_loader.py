@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from aimakerspace import text_utils
+from aimakerspace.text_utils import PDFLoader
+from benchmarks.loadtest import make_pdf
+
+
+@pytest.fixture(scope="module")
+def pdf_pages():
+    return [f"Page {i} mentions part XR-{i:04d}" for i in range(40)]
+
+
+def test_serial_extraction_keeps_page_order(pdf_pages):
+    pages = list(PDFLoader().iter_pages(make_pdf(pdf_pages)))
+    assert [page.strip() for page in pages] == pdf_pages
+
+
+def test_parallel_extraction_matches_serial(pdf_pages):
+    pdf_bytes = make_pdf(pdf_pages)
+    loader = PDFLoader(max_workers=2, pages_per_task=4)
+    assert list(loader.iter_pages(pdf_bytes, parallel=True)) == list(loader.iter_pages(pdf_bytes))
+
+
+def test_page_offsets_point_at_each_page(pdf_pages):
+    text, page_starts = asyncio.run(PDFLoader(max_workers=2).aload_with_pages(make_pdf(pdf_pages)))
+    assert len(page_starts) == len(pdf_pages)
+    for start, page in zip(page_starts, pdf_pages):
+        assert text[start:].lstrip().startswith(page)
+
+
+def test_concurrent_callers_share_one_pool(pdf_pages):
+    from concurrent.futures import ThreadPoolExecutor
+
+    text_utils.shutdown_process_pool()
+    with ThreadPoolExecutor(max_workers=4) as threads:
+        pools = list(threads.map(lambda _: text_utils._get_process_pool(2)[0], range(8)))
+    assert all(pool is pools[0] for pool in pools)
+
+    pdf_bytes = make_pdf(pdf_pages)
+    loader = PDFLoader(max_workers=2, pages_per_task=4)
+    assert len(list(loader.iter_pages(pdf_bytes, parallel=True))) == len(pdf_pages)
+    text_utils.shutdown_process_pool()
+    assert text_utils._process_pool is None
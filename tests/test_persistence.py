@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXTS = [f"note {i}: {word} and {other}" for i, (word, other) in enumerate(
+    zip(["apples", "kittens", "rockets", "violins", "glaciers", "sparrows"] * 4,
+        ["pears", "puppies", "planets", "cellos", "rivers", "owls"] * 4)
+)]
+
+DOCUMENTS = {
+    "fruit.txt": "Apples and pears grow in orchards. " * 20 + "The XR-2000 press makes cider.",
+    "space.txt": "Rockets carry probes to distant planets. " * 20,
+    "music.txt": "Violins and cellos play in the string section. " * 20,
+}
+
+
+def test_vector_database_round_trip(embedder, tmp_path):
+    db = VectorDatabase(embedding_model=embedder)
+    db.insert_many(TEXTS, embedder.embed(TEXTS), metadata=[{"n": i} for i in range(len(TEXTS))])
+    db.save(str(tmp_path))
+
+    for mmap in (True, False):
+        loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedder, mmap=mmap)
+        assert len(loaded) == len(TEXTS)
+        np.testing.assert_array_equal(loaded.matrix, db.matrix)
+        assert loaded.get_metadata(TEXTS[3]) == {"n": 3}
+        query = embedder.embed(["kittens"])[0]
+        assert loaded.search(query, k=3) == db.search(query, k=3)
+
+
+def test_save_writes_live_rows_without_compacting(embedder, tmp_path):
+    db = VectorDatabase(embedding_model=embedder, compaction_threshold=0.9)
+    db.insert_many(TEXTS, embedder.embed(TEXTS))
+    db.delete(TEXTS[:3])
+    db.save(str(tmp_path))
+
+    assert len(db._tombstones) == 3  # the live database is not compacted by saving
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedder)
+    assert sorted(loaded.vectors) == sorted(TEXTS[3:])
+    np.testing.assert_array_equal(loaded.matrix, db.matrix)
+
+
+def test_snapshot_is_isolated_from_later_changes(embedder, tmp_path):
+    db = VectorDatabase(embedding_model=embedder, initial_capacity=len(TEXTS) + 10)
+    db.insert_many(TEXTS[:10], embedder.embed(TEXTS[:10]))
+    write = db.snapshot()
+    db.delete(TEXTS[:5])
+    db.insert_many(TEXTS[10:], embedder.embed(TEXTS[10:]))
+    write(str(tmp_path))
+
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedder)
+    assert list(loaded.vectors) == TEXTS[:10]
+
+
+def test_pipeline_asave_and_load(make_pipeline, tmp_path):
+    pipeline = make_pipeline()
+
+    async def scenario():
+        for filename, text in DOCUMENTS.items():
+            assert (await pipeline.add_text(filename, text))["status"] == "success"
+        pipeline.delete_document("music.txt")
+        await pipeline.asave(str(tmp_path))
+
+    asyncio.run(scenario())
+    assert not pipeline.saving
+
+    restored = make_pipeline()
+    assert restored.load(str(tmp_path))
+    assert sorted(restored.chunk_store.filenames) == ["fruit.txt", "space.txt"]
+    assert len(restored.vector_db) == len(pipeline.vector_db)
+    assert len(restored.lexical_index) == len(pipeline.lexical_index)
+    assert restored.search_documents("rockets planets", k=1) == pipeline.search_documents("rockets planets", k=1)
+    assert restored.lexical_index.search("xr-2000", k=1) == pipeline.lexical_index.search("xr-2000", k=1)
+
+
+def test_concurrent_asaves_keep_the_latest_snapshot(make_pipeline, tmp_path):
+    pipeline = make_pipeline()
+
+    async def scenario():
+        await pipeline.add_text("fruit.txt", DOCUMENTS["fruit.txt"])
+        first = asyncio.create_task(pipeline.asave(str(tmp_path)))
+        await asyncio.sleep(0)
+        await pipeline.add_text("space.txt", DOCUMENTS["space.txt"])
+        await asyncio.gather(first, pipeline.asave(str(tmp_path)))
+
+    asyncio.run(scenario())
+
+    restored = make_pipeline()
+    assert restored.load(str(tmp_path))
+    assert sorted(restored.chunk_store.filenames) == ["fruit.txt", "space.txt"]
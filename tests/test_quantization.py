@@ -0,0 +1,144 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from aimakerspace.ann import IVFIndex
+from aimakerspace.quantization import ProductQuantizer, ScalarQuantizer
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXTS = [f"passage {i} about {topic}" for i, topic in enumerate(
+    ["orchards", "comets", "violins", "glaciers", "falcons", "bridges", "lanterns", "harbors"] * 40
+)]
+
+
+def pq() -> ProductQuantizer:
+    return ProductQuantizer(num_subspaces=8, min_train_size=200, n_iter=4)
+
+
+def insert(db: VectorDatabase, embedder, texts) -> None:
+    db.insert_many(texts, embedder.embed(texts))
+
+
+def top_keys(db: VectorDatabase, embedder, query: str, k: int = 5):
+    return [key for key, _score in db.search(embedder.embed([query])[0], k=k)]
+
+
+def test_int8_stores_codes_and_ranks_like_float32(embedder):
+    exact = VectorDatabase(embedding_model=embedder)
+    quantized = VectorDatabase(embedding_model=embedder, quantizer=ScalarQuantizer())
+    insert(exact, embedder, TEXTS)
+    insert(quantized, embedder, TEXTS)
+
+    assert set(quantized._columns) == {"norms", "codes", "scales"}
+    assert top_keys(quantized, embedder, TEXTS[7], k=1) == [TEXTS[7]]
+    np.testing.assert_allclose(quantized.retrieve_from_key(TEXTS[3]), exact.retrieve_from_key(TEXTS[3]), atol=0.05)
+
+
+@pytest.mark.parametrize("keep_originals", [False, True])
+def test_quantized_round_trip(embedder, tmp_path, keep_originals):
+    db = VectorDatabase(
+        embedding_model=embedder, quantizer=ScalarQuantizer(), keep_originals=keep_originals, rerank=8,
+    )
+    insert(db, embedder, TEXTS)
+    db.save(str(tmp_path))
+
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedder, rerank=8)
+
+    assert loaded.keep_originals is keep_originals
+    assert set(loaded._columns) == set(db._columns)
+    assert top_keys(loaded, embedder, "violins") == top_keys(db, embedder, "violins")
+
+
+def test_pq_saved_before_training_drops_originals_once_trained(embedder, tmp_path):
+    db = VectorDatabase(embedding_model=embedder, quantizer=pq(), compaction_threshold=0.5)
+    insert(db, embedder, TEXTS[:100])
+    db.save(str(tmp_path))
+
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model=embedder)
+    assert not loaded.quantizer.trained
+    assert loaded.keep_originals is False
+    assert loaded.compaction_threshold == 0.5
+
+    insert(loaded, embedder, TEXTS[100:])
+    assert loaded.quantizer.trained
+    assert set(loaded._columns) == {"norms", "codes", "scales"}
+    assert TEXTS[5] in top_keys(loaded, embedder, TEXTS[5], k=10)
+
+
+def test_without_auto_train_nothing_is_trained_until_asked(embedder):
+    db = VectorDatabase(embedding_model=embedder, quantizer=pq(), index=IVFIndex(min_train_size=200), auto_train=False)
+    insert(db, embedder, TEXTS)
+
+    assert db.needs_training
+    assert not db.quantizer.trained and not db.index.trained
+    assert top_keys(db, embedder, TEXTS[9], k=1) == [TEXTS[9]]
+
+    db.train()
+
+    assert not db.needs_training
+    assert db.quantizer.trained and db.index.trained
+    assert "vectors" not in db._columns
+
+
+def test_atrain_catches_up_on_rows_written_during_the_fit(embedder):
+    db = VectorDatabase(embedding_model=embedder, quantizer=pq(), index=IVFIndex(min_train_size=200), auto_train=False)
+    insert(db, embedder, TEXTS[:250])
+    late = [f"late arrival {i}" for i in range(20)]
+
+    async def scenario():
+        training = asyncio.create_task(db.atrain())
+        await asyncio.sleep(0)  # the fit is now running on a worker thread
+        assert not await db.atrain()  # only one fit at a time
+        insert(db, embedder, TEXTS[250:] + late)
+        return await training
+
+    assert asyncio.run(scenario())
+    assert db.quantizer.trained and db.index.trained
+    assert len(db) == len(TEXTS) + len(late)
+    assert late[4] in top_keys(db, embedder, late[4], k=10)
+    assert db.index._assignments[db._key_to_row[late[4]]] >= 0  # assigned to an IVF bucket
+
+
+def test_atrain_result_is_dropped_if_rows_are_renumbered(embedder):
+    db = VectorDatabase(embedding_model=embedder, quantizer=pq(), auto_train=False)
+    insert(db, embedder, TEXTS)
+
+    async def scenario():
+        training = asyncio.create_task(db.atrain())
+        await asyncio.sleep(0)
+        db.delete(TEXTS[:200])  # crosses the compaction threshold
+        return await training
+
+    assert not asyncio.run(scenario())
+    assert not db.quantizer.trained
+    assert len(db) == len(TEXTS) - 200
+    assert top_keys(db, embedder, TEXTS[250], k=1) == [TEXTS[250]]
+
+
+def test_compaction_keeps_ivf_centroids(embedder):
+    db = VectorDatabase(embedding_model=embedder, index=IVFIndex(min_train_size=200))
+    insert(db, embedder, TEXTS)
+    centroids = db.index.centroids
+
+    db.delete(TEXTS[:100])
+
+    assert db.index.centroids is centroids
+    assert sum(len(bucket) for bucket in db.index._lists) == len(db)
+    assert top_keys(db, embedder, TEXTS[150], k=1) == [TEXTS[150]]
+
+
+def test_pipeline_trains_in_the_background(make_pipeline):
+    pipeline = make_pipeline(vector_quantizer=pq(), chunk_size=40, chunk_overlap=0)
+    text = " ".join(TEXTS)
+
+    async def scenario():
+        await pipeline.add_text("notes.txt", text)
+        assert pipeline._training_task is not None
+        await pipeline._training_task
+
+    asyncio.run(scenario())
+
+    assert pipeline.vector_db.quantizer.trained
+    assert not pipeline.vector_db.needs_training
+    assert pipeline.search_documents(TEXTS[10], k=3)
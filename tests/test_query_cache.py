@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+from aimakerspace import QueryExpansionCache
+from aimakerspace import query_cache
+
+
+class FakeChatClient:
+    """Non-streaming chat completions returning fixed reformulations"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_lookups_ignore_case_and_whitespace():
+    cache = QueryExpansionCache()
+    cache.put("tenant", "What is  BM25?", 3, ["bm25 explained", "okapi scoring"])
+    assert cache.get("tenant", "what is bm25?", 3) == ["bm25 explained", "okapi scoring"]
+    assert cache.get("other-tenant", "what is bm25?", 3) is None
+    assert cache.get("tenant", "what is bm25?", 4) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "time", lambda: now[0])
+    cache = QueryExpansionCache(ttl_seconds=60)
+    cache.put("t", "q", 3, ["a"])
+    now[0] += 59
+    assert cache.get("t", "q", 3) == ["a"]
+    now[0] += 2
+    assert cache.get("t", "q", 3) is None
+    assert cache.expirations == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryExpansionCache(max_entries=2)
+    cache.put("t", "one", 3, ["1"])
+    cache.put("t", "two", 3, ["2"])
+    cache.get("t", "one", 3)
+    cache.put("t", "three", 3, ["3"])
+    assert cache.get("t", "two", 3) is None
+    assert cache.get("t", "one", 3) == ["1"] and len(cache) == 2
+
+
+def test_sqlite_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / "expansions.sqlite")
+    cache = QueryExpansionCache(path=path)
+    cache.put("t", "q", 3, ["a", "b"])
+    cache.close()
+
+    reopened = QueryExpansionCache(path=path)
+    assert reopened.get("t", "q", 3) == ["a", "b"]
+    assert len(reopened) == 1  # promoted into memory
+    reopened.close()
+
+
+def test_pipeline_reuses_cached_reformulations(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient("- apples in orchards\n- growing pears")
+
+    first = asyncio.run(pipeline.aexpand_queries("Which fruit grows here?", num_queries=3))
+    second = asyncio.run(pipeline.aexpand_queries("which fruit grows  here?", num_queries=3))
+    assert client.calls == 1
+    assert first[0] == "Which fruit grows here?" and second[0] == "which fruit grows  here?"
+    assert first[1:] == second[1:] == ["apples in orchards", "growing pears"]
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+from aimakerspace import PipelineRegistry
+
+TEXT = "Apples and pears grow in orchards. Bananas grow in the tropics."
+
+
+def fill(registry, api_key):
+    pipeline = registry.get_or_create(api_key)
+    asyncio.run(pipeline.add_text(f"{api_key}.txt", TEXT))
+    registry.refresh(api_key)
+    return pipeline
+
+
+def test_unlimited_budget_keeps_everyone(make_pipeline):
+    registry = PipelineRegistry(lambda api_key: make_pipeline())
+    for api_key in ("sk-a", "sk-b", "sk-c"):
+        fill(registry, api_key)
+    assert len(registry) == 3
+    assert registry.stats()["evictions"] == 0
+    assert registry.total_bytes > 0
+
+
+def test_least_recently_used_tenant_is_spilled_and_reloaded(make_pipeline, tmp_path):
+    registry = PipelineRegistry(lambda api_key: make_pipeline(), max_bytes=1, storage_dir=str(tmp_path))
+    fill(registry, "sk-a")
+    fill(registry, "sk-b")
+    assert "sk-a" not in registry and "sk-b" in registry
+    assert registry.evictions == 1
+
+    reloaded = registry.get("sk-a")
+    assert reloaded is not None and reloaded.chunk_store.filenames == ["sk-a.txt"]
+    assert registry.reloads == 1
+    assert "sk-b" not in registry
+
+
+def test_eviction_without_storage_warns(make_pipeline, caplog):
+    with caplog.at_level(logging.WARNING, logger="aimakerspace.registry"):
+        registry = PipelineRegistry(lambda api_key: make_pipeline(), max_bytes=1)
+        fill(registry, "sk-a")
+        fill(registry, "sk-b")
+    events = [getattr(record, "event", None) for record in caplog.records]
+    assert events == ["registry.no_storage_dir", "registry.evicted_without_storage"]
+    assert registry.get("sk-a") is None
+
+
+def test_pipelines_share_process_wide_caches():
+    from aimakerspace import RAGPipeline
+
+    first, second = RAGPipeline("sk-a"), RAGPipeline("sk-b")
+    assert first.embedding_model.cache is second.embedding_model.cache
+    assert first.expansion_cache is second.expansion_cache
+
+
+async def alease_and_fill(registry, api_key):
+    async with registry.lease(api_key, create=True) as pipeline:
+        await pipeline.add_text(f"{api_key}.txt", TEXT)
+    return pipeline
+
+
+def test_leased_pipeline_is_not_evicted_until_released(make_pipeline, tmp_path):
+    registry = PipelineRegistry(lambda api_key: make_pipeline(), max_bytes=1, storage_dir=str(tmp_path))
+
+    async def scenario():
+        async with registry.lease("sk-a", create=True) as pipeline:
+            await pipeline.add_text("sk-a.txt", TEXT)
+            await alease_and_fill(registry, "sk-b")
+            assert "sk-a" in registry and "sk-b" in registry
+            # A second request for the busy tenant shares the same instance
+            async with registry.lease("sk-a") as again:
+                assert again is pipeline
+        # Once released, the budget is enforced again (sk-a was used last)
+        assert "sk-a" in registry and "sk-b" not in registry
+
+    asyncio.run(scenario())
+    assert registry.evictions == 1
+
+
+def test_async_spill_and_reload_stay_off_the_event_loop(make_pipeline, tmp_path):
+    registry = PipelineRegistry(lambda api_key: make_pipeline(), max_pipelines=1, storage_dir=str(tmp_path))
+
+    async def scenario():
+        first = await alease_and_fill(registry, "sk-a")
+        first.save = first.load = None  # the sync paths must not be used
+        await alease_and_fill(registry, "sk-b")
+        assert "sk-a" not in registry and len(registry) == 1
+
+        leases = [registry.lease("sk-a") for _ in range(3)]
+        pipelines = await asyncio.gather(*(lease.__aenter__() for lease in leases))
+        for lease in leases:
+            await lease.__aexit__(None, None, None)
+        return pipelines
+
+    pipelines = asyncio.run(scenario())
+    assert all(pipeline is pipelines[0] for pipeline in pipelines)
+    assert pipelines[0].chunk_store.filenames == ["sk-a.txt"]
+    assert registry.reloads == 1
+
+
+def test_tenants_without_documents_are_not_registered(make_pipeline):
+    registry = PipelineRegistry(lambda api_key: make_pipeline(), max_pipelines=2)
+
+    async def scenario():
+        async with registry.lease("sk-unknown") as pipeline:
+            assert pipeline is None
+        async with registry.lease("sk-empty", create=True) as pipeline:
+            assert "sk-empty" in registry
+        assert "sk-empty" not in registry
+
+    asyncio.run(scenario())
+    assert registry.stats()["evictions"] == 0
+
+
+def test_empty_pipeline_estimate_includes_fixed_overhead(make_pipeline):
+    assert make_pipeline().estimate_memory_bytes() >= 4096
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from aimakerspace import RecursiveTokenTextSplitter
+
+PARAGRAPHS = [
+    "Apples grow in orchards across the valley.",
+    "Pears ripen later in the autumn season.",
+    "Plums are harvested at the end of summer.",
+]
+
+
+@pytest.fixture
+def pipeline(make_pipeline):
+    splitter = RecursiveTokenTextSplitter(chunk_size=10, chunk_overlap=0, length_function=lambda text: len(text.split()))
+    return make_pipeline(text_splitter=splitter)
+
+
+def ingest(pipeline, filename, paragraphs):
+    return asyncio.run(pipeline.add_text(filename, "\n\n".join(paragraphs)))
+
+
+def test_reupload_embeds_only_new_chunks(pipeline):
+    assert ingest(pipeline, "a.txt", PARAGRAPHS)["chunks_embedded"] == 3
+    result = ingest(pipeline, "a.txt", PARAGRAPHS[:2] + ["Cherries bloom early in the spring."])
+    assert result["chunks_created"] == 3
+    assert result["chunks_embedded"] == 1
+    assert result["stale_vectors_removed"] == 1
+    assert len(pipeline.vector_db) == 3
+
+
+def test_identical_reupload_embeds_nothing(pipeline):
+    ingest(pipeline, "a.txt", PARAGRAPHS)
+    result = ingest(pipeline, "a.txt", PARAGRAPHS)
+    assert result["chunks_embedded"] == 0 and result["stale_vectors_removed"] == 0
+
+
+def test_text_shared_across_files_is_stored_once(pipeline):
+    ingest(pipeline, "a.txt", PARAGRAPHS)
+    result = ingest(pipeline, "b.txt", [PARAGRAPHS[0], "Figs need a warm climate to thrive."])
+    assert result["chunks_embedded"] == 1
+    assert len(pipeline.vector_db) == 4
+    assert len(pipeline.chunk_store) == 5
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from aimakerspace import SemanticResponseCache
+
+
+class FakeChatClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"answer {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_question_over_same_chunks_hits():
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    cache.store(unit(1, 0, 0), ["k1", "k2"], "gpt", "cached")
+    assert cache.lookup(unit(1, 0.1, 0), ["k2", "k1"], "gpt") == "cached"
+    assert cache.lookup(unit(0, 1, 0), ["k1", "k2"], "gpt") is None       # different question
+    assert cache.lookup(unit(1, 0, 0), ["k1"], "gpt") is None             # different context
+    assert cache.lookup(unit(1, 0, 0), ["k1", "k2"], "other") is None     # different model
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_least_recently_used_answer_is_replaced():
+    cache = SemanticResponseCache(max_entries=2)
+    cache.store(unit(1, 0, 0), ["a"], "gpt", "first")
+    cache.store(unit(0, 1, 0), ["b"], "gpt", "second")
+    cache.lookup(unit(1, 0, 0), ["a"], "gpt")
+    cache.store(unit(0, 0, 1), ["c"], "gpt", "third")
+    assert cache.lookup(unit(0, 1, 0), ["b"], "gpt") is None
+    assert cache.lookup(unit(1, 0, 0), ["a"], "gpt") == "first"
+
+
+def test_answers_from_before_a_clear_are_not_stored():
+    cache = SemanticResponseCache()
+    generation = cache.generation
+    cache.clear()
+    cache.store(unit(1, 0, 0), ["a"], "gpt", "stale", generation=generation)
+    assert len(cache) == 0
+
+
+def test_pipeline_serves_repeat_questions_until_documents_change(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient()
+
+    async def ask():
+        retrieval = await pipeline.aretrieve("Which fruit grows in orchards?", k=2)
+        return await pipeline.agenerate_rag_response(retrieval.query, retrieval.chunks, retrieval=retrieval)
+
+    async def scenario():
+        await pipeline.add_text("fruit.txt", "Apples and pears grow in orchards.")
+        first, second = await ask(), await ask()
+        await pipeline.add_text("more.txt", "Plums grow in orchards too.")
+        return first, second, await ask()
+
+    first, second, third = asyncio.run(scenario())
+    assert first == second == "answer 1"
+    assert third == "answer 2" and client.calls == 2
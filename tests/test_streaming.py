@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeStream:
+    """Chat completion stream of ``pieces`` that records whether it was closed"""
+
+    def __init__(self, pieces):
+        self.pieces = list(pieces)
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.consumed == len(self.pieces):
+            raise StopAsyncIteration
+        piece = self.pieces[self.consumed]
+        self.consumed += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChatClient:
+    def __init__(self, pieces):
+        self.stream = FakeStream(pieces)
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        assert kwargs["stream"]
+        return self.stream
+
+
+def test_expansion_stream_is_closed_after_enough_queries(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient(["first\nsec", "ond\n", "third\nfourth\n", "fifth\n"])
+
+    async def collect():
+        return [query async for query in pipeline.aiter_expansions("original", num_queries=3)]
+
+    assert asyncio.run(collect()) == ["original", "first", "second"]
+    assert client.stream.closed
+    assert client.stream.consumed == 2
+
+
+def test_answer_stream_is_closed_when_the_consumer_stops(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient(["An", "swer", " text"])
+
+    async def first_token():
+        tokens = pipeline.astream_rag_response("question", ["context"])
+        token = await tokens.__anext__()
+        await tokens.aclose()
+        return token
+
+    assert asyncio.run(first_token()) == "An"
+    assert client.stream.closed
+
+
+def test_answer_stream_is_closed_when_complete(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient(["An", "swer"])
+
+    async def collect():
+        return "".join([token async for token in pipeline.astream_rag_response("question", ["context"])])
+
+    assert asyncio.run(collect()) == "Answer"
+    assert client.stream.closed
+
+
+def test_fusion_retrieves_streamed_reformulations(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient(["pears in the orchard\n", "moon rockets\n"])
+
+    async def scenario():
+        await pipeline.add_text("fruit.txt", "Pears ripen in the orchard.")
+        await pipeline.add_text("space.txt", "Rockets fly to the moon.")
+        return await pipeline.arag_fusion("what grows there", k=2, num_queries=3)
+
+    chunks = asyncio.run(scenario())
+    assert sorted(chunks) == ["Pears ripen in the orchard.", "Rockets fly to the moon."]
+    assert client.stream.closed
+
+
+def test_fusion_skips_expansion_on_a_strong_keyword_match(make_pipeline):
+    pipeline = make_pipeline()
+    client = pipeline.async_client = FakeChatClient(["never used\n"])
+
+    async def scenario():
+        for i in range(30):
+            await pipeline.add_text(f"doc{i}.txt", f"Routine maintenance note number {i}.")
+        await pipeline.add_text("pump.txt", "The XR-2000 pump is rated for 40 bar.")
+        return await pipeline.arag_fusion("XR-2000", k=1, num_queries=3)
+
+    assert asyncio.run(scenario()) == ["The XR-2000 pump is rated for 40 bar."]
+    assert client.stream.consumed == 0
+
+
+def test_fusion_embeds_every_query_in_one_request(make_pipeline):
+    pipeline = make_pipeline()
+    pipeline.async_client = FakeChatClient(["pears in the orchard\n", "moon rockets\n"])
+    calls = []
+    embed = pipeline.embedding_model.async_get_embeddings
+
+    async def recording_embed(texts):
+        calls.append(list(texts))
+        return await embed(texts)
+
+    async def scenario():
+        await pipeline.add_text("fruit.txt", "Pears ripen in the orchard.")
+        calls.clear()
+        pipeline.embedding_model.async_get_embeddings = recording_embed
+        return await pipeline.arag_fusion("what grows there", k=2, num_queries=3)
+
+    asyncio.run(scenario())
+    assert calls == [["what grows there", "pears in the orchard", "moon rockets"]]
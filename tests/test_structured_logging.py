@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+from aimakerspace import structured_logging
+from aimakerspace.structured_logging import configure_logging, get_logger, parse_sample_rates, shutdown_logging
+
+
+@pytest.fixture
+def output():
+    stream = io.StringIO()
+    yield stream
+    shutdown_logging()
+    structured_logging._sample_rates.clear()
+
+
+def lines(stream: io.StringIO):
+    shutdown_logging()  # flushes the background writer
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_parse_sample_rates_clamps_and_skips_junk():
+    assert parse_sample_rates("a=0.5, b=2,junk,=1,c=-1") == {"a": 0.5, "b": 1.0, "c": 0.0}
+
+
+def test_events_are_written_as_json_lines(output):
+    configure_logging(level="INFO", sample_rates={}, stream=output, loggers=("tests.logging",))
+    log = get_logger("tests.logging.events")
+    log.info("upload.done", files=2, tenant="abc")
+    log.debug("search.results", results=[1, 2])
+
+    [record] = lines(output)
+    assert record["event"] == "upload.done" and record["level"] == "info"
+    assert record["files"] == 2 and record["tenant"] == "abc"
+    assert record["logger"] == "tests.logging.events"
+
+
+def test_sampled_events_are_dropped_before_formatting(output):
+    configure_logging(level="DEBUG", sample_rates={"noisy": 0.0}, stream=output, loggers=("tests.logging",))
+    log = get_logger("tests.logging.sampling")
+    assert not log.enabled_for(10, "noisy")
+    for _ in range(5):
+        log.debug("noisy", value=1)
+    log.debug("quiet", value=2)
+
+    assert [record["event"] for record in lines(output)] == ["quiet"]
+
+
+def test_exceptions_carry_their_traceback(output):
+    configure_logging(level="INFO", sample_rates={}, stream=output, loggers=("tests.logging",))
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        get_logger("tests.logging.errors").exception("job.failed", job=7)
+
+    [record] = lines(output)
+    assert record["event"] == "job.failed" and "RuntimeError: boom" in record["exception"]
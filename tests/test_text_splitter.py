@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from aimakerspace import text_utils
+from aimakerspace.text_utils import RecursiveTokenTextSplitter, token_counter
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+PARAGRAPHS = [
+    "First paragraph has exactly six words.",
+    "Second one is short. It has two sentences.",
+    " ".join(f"word{i}" for i in range(30)),
+]
+TEXT = "\n\n".join(PARAGRAPHS)
+
+
+def test_chunks_respect_the_token_budget():
+    splitter = RecursiveTokenTextSplitter(chunk_size=12, chunk_overlap=0, length_function=count_words)
+    chunks = splitter.split(TEXT)
+    assert all(count_words(chunk) <= 12 for chunk in chunks)
+    assert " ".join(chunks).split() == TEXT.split()
+
+
+def test_paragraphs_and_sentences_are_preferred_boundaries():
+    splitter = RecursiveTokenTextSplitter(chunk_size=7, chunk_overlap=0, length_function=count_words)
+    chunks = splitter.split("\n\n".join(PARAGRAPHS[:2]))
+    assert chunks == ["First paragraph has exactly six words.", "Second one is short.", "It has two sentences."]
+
+
+def test_overlap_repeats_trailing_pieces():
+    text = " ".join(f"w{i}" for i in range(20))
+    splitter = RecursiveTokenTextSplitter(chunk_size=8, chunk_overlap=3, length_function=count_words)
+    chunks = splitter.split(text)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous.split()
+    assert chunks[-1].split()[-1] == "w19"
+
+
+def test_spans_point_into_the_text():
+    splitter = RecursiveTokenTextSplitter(chunk_size=10, chunk_overlap=2, length_function=count_words)
+    for (start, end), chunk in zip(splitter.iter_spans(TEXT), splitter.split(TEXT)):
+        assert TEXT[start:end] == chunk
+        assert chunk == chunk.strip()
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(AssertionError):
+        RecursiveTokenTextSplitter(chunk_size=4, chunk_overlap=4)
+
+
+def test_fallback_counter_is_logged_once(monkeypatch, caplog):
+    monkeypatch.setattr(text_utils, "TIKTOKEN_AVAILABLE", False)
+    monkeypatch.setattr(text_utils, "_fallback_logged", False)
+    with caplog.at_level(logging.WARNING, logger="aimakerspace.text"):
+        count = token_counter()
+        token_counter()
+    assert count("Hello, world!") == 4
+    events = [getattr(record, "event", None) for record in caplog.records]
+    assert events == ["tokenizer.fallback"]
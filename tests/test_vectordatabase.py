@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXTS = [
+    "I like to eat broccoli and bananas.",
+    "I ate a banana and spinach smoothie for breakfast.",
+    "Chinchillas and kittens are cute.",
+    "My sister adopted a kitten yesterday.",
+    "Look at this cute hamster munching on a piece of broccoli.",
+]
+
+
+def make_db(embedder, texts=TEXTS, **kwargs) -> VectorDatabase:
+    db = VectorDatabase(embedding_model=embedder, initial_capacity=2, **kwargs)
+    db.insert_many(texts, embedder.embed(texts))
+    return db
+
+
+def test_insert_and_search_ranks_by_cosine(embedder):
+    db = make_db(embedder)
+
+    assert len(db) == len(TEXTS)
+    assert db.dim == 64
+    results = db.search(embedder.embed(["cute kitten"])[0], k=2)
+    assert [key for key, _score in results][0] in TEXTS[2:4]
+    assert results[0][1] >= results[1][1]
+
+
+def test_exact_match_scores_one(embedder):
+    db = make_db(embedder)
+
+    key, score = db.search(embedder.embed([TEXTS[1]])[0], k=1)[0]
+    assert key == TEXTS[1]
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_reinserting_a_key_overwrites_its_row(embedder):
+    db = make_db(embedder)
+    replacement = embedder.embed(["kittens"])[0]
+
+    db.insert(TEXTS[0], replacement)
+
+    assert len(db) == len(TEXTS)
+    np.testing.assert_allclose(db.retrieve_from_key(TEXTS[0]), replacement, rtol=1e-6)
+
+
+def test_storage_grows_past_initial_capacity(embedder):
+    texts = [f"document number {i}" for i in range(50)]
+    db = make_db(embedder, texts)
+
+    assert len(db) == 50
+    assert db.matrix.shape == (50, 64)
+    assert db.search(embedder.embed(["document number 7"])[0], k=1)[0][0] == "document number 7"
+
+
+def test_dimension_mismatch_is_rejected(embedder):
+    db = make_db(embedder)
+
+    with pytest.raises(ValueError):
+        db.insert("wrong", np.ones(3))
+
+
+def test_vectors_view_behaves_like_a_dict(embedder):
+    db = make_db(embedder)
+
+    assert set(db.vectors) == set(TEXTS)
+    assert len(db.vectors) == len(TEXTS)
+    with pytest.raises(KeyError):
+        db.vectors["missing"]
+    assert db.retrieve_from_key("missing") is None
+
+
+def test_empty_database_returns_no_results(embedder):
+    db = VectorDatabase(embedding_model=embedder)
+
+    assert db.search(np.ones(64), k=3) == []
+
+
+def test_search_many_matches_single_searches(embedder):
+    db = make_db(embedder)
+    queries = embedder.embed(["bananas", "kitten", "hamster eating broccoli"])
+
+    batched = db.search_many(queries, k=3)
+
+    assert len(batched) == 3
+    for query, ranking in zip(queries, batched):
+        single = db.search(query, k=3)
+        assert [key for key, _ in ranking] == [key for key, _ in single]
+        np.testing.assert_allclose([s for _, s in ranking], [s for _, s in single], rtol=1e-5)
+
+
+def test_search_many_edge_cases(embedder):
+    db = make_db(embedder)
+
+    assert db.search_many([], k=3) == []
+    assert VectorDatabase(embedding_model=embedder).search_many(embedder.embed(["a", "b"]), k=3) == [[], []]
+    assert [len(ranking) for ranking in db.search_many(embedder.embed(["a"]), k=10)] == [len(TEXTS)]
+
+
+def test_search_by_texts_returns_keys(embedder):
+    db = make_db(embedder)
+
+    results = db.search_by_texts([TEXTS[0], TEXTS[3]], k=1, return_as_text=True)
+
+    assert results == [[TEXTS[0]], [TEXTS[3]]]